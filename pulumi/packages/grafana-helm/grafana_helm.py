@@ -1,10 +1,19 @@
 import pulumi
+import pulumi_command as command
 import pulumi_kubernetes as k8s
 from pulumi_kubernetes import helm
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
-import yaml
 import os
+import sys
+
+# Add the pulumi directory to the Python path for the shared utilities
+pulumi_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if pulumi_dir not in sys.path:
+    sys.path.append(pulumi_dir)
+
+from utilities import CommonUtilities, ConfigLoader, HelmUtilities
+from utilities.grafana_bundle import get_image_ref
 
 
 @dataclass
@@ -15,26 +24,50 @@ class GrafanaHelmConfig:
     admin_password: Optional[str] = "admin"
     persistence: Optional[Dict[str, Any]] = None
     service: Optional[Dict[str, Any]] = None
+    # High availability: Postgres and Redis backends shared by an autoscaled set of replicas
+    high_availability: Optional[bool] = False
+    min_replicas: Optional[int] = 2
+    max_replicas: Optional[int] = 6
+    target_cpu_utilization: Optional[int] = 70
+    database_storage: Optional[str] = "10Gi"
+    postgres_image: Optional[str] = "postgres:16-alpine"
+    redis_image: Optional[str] = "redis:7-alpine"
+    # Plugins and dashboards baked into a local image, copied in by an init container at pod start
+    bundle: Optional[bool] = False
+    bundle_plugins: Optional[List[str]] = None  # ID:VERSION
+    bundle_dashboards: Optional[str] = "dashboards"  # relative to this package
+    # Registered as the default data source when set; usually passed as GrafanaHelm's prometheus_url instead
+    prometheus_url: Optional[str] = None
+    prometheus_scrape_interval: Optional[str] = "30s"
+    # Read the deployed Service back after the release instead of trusting the values
+    verify_service: Optional[bool] = False
 
     @classmethod
     def from_environment(cls, environment: str) -> 'GrafanaHelmConfig':
         """Load configuration from environment-specific YAML file."""
-        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        config_file = os.path.join(package_dir, 'grafana-helm', 'configs', f'{environment}.yaml')
-        
-        if not os.path.exists(config_file):
-            raise FileNotFoundError(f"Configuration file not found: {config_file}")
-        
-        with open(config_file, 'r') as f:
-            config_data = yaml.safe_load(f)
-        
-        return cls(**config_data)
+        return ConfigLoader.load(cls, 'grafana-helm', environment)
 
 
 class GrafanaHelm(pulumi.ComponentResource):
-    def __init__(self, name: str, config: GrafanaHelmConfig, opts: Optional[pulumi.ResourceOptions] = None):
+    def __init__(self, name: str, config: GrafanaHelmConfig, opts: Optional[pulumi.ResourceOptions] = None,
+                 bundle_cluster: Optional[pulumi.Input[str]] = None, cluster_id: Optional[pulumi.Input[str]] = None,
+                 prometheus_url: Optional[pulumi.Input[str]] = None):
+        """Deploy Grafana.
+        
+        ``bundle_cluster`` (``kind:NAME`` or ``k3s:NAME``) is the stack's local
+        cluster the bundle image is side-loaded into. ``cluster_id`` identifies
+        that cluster's creation, e.g. its create resource's ID, so the image is
+        loaded again into a recreated cluster.
+
+        ``prometheus_url`` (e.g. ``PrometheusHelm.get_service_url()``) is
+        provisioned as the default data source; it overrides the config's.
+        """
         super().__init__("grafana:helm", name, {}, opts)
         
+        if config.bundle and bundle_cluster is None:
+            # The init container never pulls the bundle image, so it must be side-loaded into the cluster
+            raise ValueError("bundle requires bundle_cluster, the kind:NAME or k3s:NAME cluster to load the image into")
+        
         namespace = config.namespace or "grafana"
         admin_password = config.admin_password or "admin"
         
@@ -51,16 +84,17 @@ class GrafanaHelm(pulumi.ComponentResource):
             opts=pulumi.ResourceOptions(parent=self)
         )
         
-        # Default values for Grafana
+        # Chart defaults, then the environment's settings, then raw value overrides
         default_values = {
-            "adminPassword": admin_password,
             "persistence": {
-                "enabled": config.persistence.get("enabled", True) if config.persistence else True,
-                "size": config.persistence.get("size", "10Gi") if config.persistence else "10Gi",
+                "enabled": True,
+                "size": "10Gi",
+                # Kept by Helm if the release is ever renamed or uninstalled, so dashboards survive
+                "annotations": {"helm.sh/resource-policy": "keep"},
             },
             "service": {
-                "type": config.service.get("type", "ClusterIP") if config.service else "ClusterIP",
-                "port": config.service.get("port", 80) if config.service else 80,
+                "type": "ClusterIP",
+                "port": 80,
             },
             "resources": {
                 "requests": {
@@ -73,44 +107,356 @@ class GrafanaHelm(pulumi.ComponentResource):
                 },
             },
         }
-        
-        # Merge with user-provided values
-        values = {**default_values, **(config.values or {})}
-        
+        environment_values = {
+            "adminPassword": admin_password,
+            "persistence": config.persistence or {},
+            "service": config.service or {},
+        }
+        self.ha_backends = []
+        ha_values = self._create_ha_backends(name, namespace, config) if config.high_availability else {}
+        self.bundle = None
+        self.bundle_resources = []
+        bundle_values = self._create_bundle(name, namespace, config, bundle_cluster, cluster_id) if config.bundle else {}
+        values = HelmUtilities.merge_values(default_values, environment_values, ha_values, bundle_values,
+                                            self._get_datasource_values(config, prometheus_url or config.prometheus_url),
+                                            config.values)
+
         # Deploy Grafana using Helm
         self.release = helm.v3.Release(
             f"{name}-grafana",
-            chart="grafana",
-            version=config.chart_version,
-            repository_opts=helm.v3.RepositoryOptsArgs(
-                repo="https://grafana.github.io/helm-charts",
-            ),
+            **HelmUtilities.get_chart_args("https://grafana.github.io/helm-charts", "grafana", config.chart_version),
             namespace=namespace,
             values=values,
             create_namespace=False,  # We're creating the namespace separately
             opts=pulumi.ResourceOptions(
                 parent=self,
-                depends_on=[self.namespace],
+                depends_on=[self.namespace, *self.ha_backends, *self.bundle_resources],
             )
         )
         
+        self._namespace = namespace
         self.namespace_name = pulumi.Output.from_input(namespace)
         self.admin_password = pulumi.Output.from_input(admin_password)
         
-        # Get the service
-        self.service = self.release.status.apply(
-            lambda status: k8s.core.v1.Service.get(
+        # The Service as the chart renders it from our values. Objects are named after the release (its name
+        # contains the chart name), so existing releases keep their objects and volumes
+        if values.get("fullnameOverride"):
+            self.service_name = pulumi.Output.from_input(values["fullnameOverride"])
+        else:
+            self.service_name = self.release.name.apply(lambda release_name: release_name[:63].rstrip("-"))
+        self.service_type = values["service"].get("type", "ClusterIP")
+        self.service_port = int(values["service"].get("port", 80))
+        node_port = values["service"].get("nodePort")
+        self.node_port = int(node_port) if node_port and self.service_type == "NodePort" else None
+
+        # Optional read of the deployed Service, for checking the values against the cluster
+        self.service = None
+        if config.verify_service:
+            self.service = k8s.core.v1.Service.get(
                 f"{name}-service",
-                f"{namespace}/grafana",
-                opts=pulumi.ResourceOptions(parent=self)
+                self.service_name.apply(lambda service_name: f"{namespace}/{service_name}"),
+                opts=pulumi.ResourceOptions(parent=self, depends_on=[self.release])
             )
-        )
+        
+        self.register_outputs({
+            "namespace": self.namespace_name,
+        })
     
+    def _create_ha_backends(self, name: str, namespace: str, config: GrafanaHelmConfig) -> Dict[str, Any]:
+        """Create the Postgres database and Redis cache shared by the replicas; return the values wiring them up."""
+        min_replicas = max(2, config.min_replicas or 2)
+        max_replicas = max(min_replicas, config.max_replicas or min_replicas)
+        opts = pulumi.ResourceOptions(parent=self, depends_on=[self.namespace])
+
+        # Set with: pulumi config set --secret grafana_database_password <password>
+        database_password = pulumi.Config().require_secret("grafana_database_password")
+        self.database_secret = k8s.core.v1.Secret(
+            f"{name}-database-secret",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name="grafana-database", namespace=namespace),
+            string_data={"password": database_password},
+            opts=opts,
+        )
+        self.database_volume = k8s.core.v1.PersistentVolumeClaim(
+            f"{name}-postgres-data",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name="grafana-postgres-data", namespace=namespace),
+            spec=k8s.core.v1.PersistentVolumeClaimSpecArgs(
+                access_modes=["ReadWriteOnce"],
+                resources={"requests": {"storage": config.database_storage or "10Gi"}},
+            ),
+            opts=opts,
+        )
+        self.database = self._create_backend(
+            name, namespace, "postgres", config.postgres_image or "postgres:16-alpine", 5432,
+            env=[
+                k8s.core.v1.EnvVarArgs(name="POSTGRES_DB", value="grafana"),
+                k8s.core.v1.EnvVarArgs(name="POSTGRES_USER", value="grafana"),
+                k8s.core.v1.EnvVarArgs(
+                    name="POSTGRES_PASSWORD",
+                    value_from=k8s.core.v1.EnvVarSourceArgs(
+                        secret_key_ref=k8s.core.v1.SecretKeySelectorArgs(name="grafana-database", key="password"),
+                    ),
+                ),
+                k8s.core.v1.EnvVarArgs(name="PGDATA", value="/var/lib/postgresql/data/pgdata"),
+            ],
+            readiness_command=["pg_isready", "-U", "grafana", "-d", "grafana"],
+            volume=("/var/lib/postgresql/data", self.database_volume),
+            opts=pulumi.ResourceOptions(parent=self, depends_on=[self.database_secret]),
+        )
+        # Cache only: no persistence, least recently used keys are evicted
+        self.cache = self._create_backend(
+            name, namespace, "redis", config.redis_image or "redis:7-alpine", 6379,
+            args=["--save", "", "--appendonly", "no", "--maxmemory", "256mb", "--maxmemory-policy", "allkeys-lru"],
+            readiness_command=["redis-cli", "ping"],
+            opts=opts,
+        )
+        self.ha_backends = [self.database, self.cache]
+
+        return {
+            "replicas": min_replicas,
+            # Dashboards, users and sessions live in Postgres, so replicas need no volume of their own
+            "persistence": {"enabled": False},
+            "autoscaling": {
+                "enabled": True,
+                "minReplicas": min_replicas,
+                "maxReplicas": max_replicas,
+                "targetCPU": str(config.target_cpu_utilization or 70),
+            },
+            "podDisruptionBudget": {"minAvailable": 1},
+            "envValueFrom": {
+                "GF_DATABASE_PASSWORD": {"secretKeyRef": {"name": "grafana-database", "key": "password"}},
+            },
+            "grafana.ini": {
+                "database": {
+                    "type": "postgres",
+                    "host": "grafana-postgres:5432",
+                    "name": "grafana",
+                    "user": "grafana",
+                    "ssl_mode": "disable",
+                },
+                "remote_cache": {
+                    "type": "redis",
+                    "connstr": "addr=grafana-redis:6379,pool_size=100,db=0,ssl=false",
+                },
+                "unified_alerting": {"ha_redis_address": "grafana-redis:6379", "ha_redis_db": 2},
+            },
+        }
+
+    @staticmethod
+    def _get_datasource_values(config: GrafanaHelmConfig,
+                               prometheus_url: Optional[pulumi.Input[str]]) -> Dict[str, Any]:
+        """Get the provisioned data sources: Prometheus if configured, the metrics API with the bundle."""
+        datasources = []
+        if prometheus_url:
+            datasources.append({
+                "name": "Prometheus",
+                "uid": "prometheus",
+                "type": "prometheus",
+                "access": "proxy",
+                "url": prometheus_url,
+                "isDefault": True,
+                "jsonData": {"timeInterval": config.prometheus_scrape_interval or "30s"},
+            })
+        if config.bundle:
+            datasources.append({
+                "name": "Kubernetes Metrics",
+                "uid": "kubernetes-metrics",
+                "type": "yesoreyeram-infinity-datasource",
+                "access": "proxy",
+                "jsonData": {
+                    "auth_method": "bearerToken",
+                    "tlsSkipVerify": True,
+                    "allowedHosts": ["https://kubernetes.default.svc"],
+                },
+                "secureJsonData": {"bearerToken": "$METRICS_READER_TOKEN"},
+            })
+        if not datasources:
+            return {}
+        return {"datasources": {"datasources.yaml": {"apiVersion": 1, "datasources": datasources}}}
+
+    def _create_bundle(self, name: str, namespace: str, config: GrafanaHelmConfig,
+                       bundle_cluster: Optional[pulumi.Input[str]],
+                       cluster_id: Optional[pulumi.Input[str]]) -> Dict[str, Any]:
+        """Build and side-load the plugin/dashboard bundle image; return the values that install it."""
+        plugins = list(config.bundle_plugins or [])
+        dashboards_dir = None
+        if config.bundle_dashboards:
+            dashboards_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), config.bundle_dashboards)
+        self.bundle_image = get_image_ref(plugins, dashboards_dir)
+
+        build_args = ["grafana_bundle", "build"]
+        for plugin in plugins:
+            build_args += ["--plugin", plugin]
+        if dashboards_dir:
+            build_args += ["--dashboards", dashboards_dir]
+
+        def get_build_command(cluster: Optional[str]) -> str:
+            if not cluster:
+                return CommonUtilities.get_utility_command(*build_args)
+            cluster_type, _, cluster_name = cluster.partition(":")
+            if cluster_type not in ("kind", "k3s") or not cluster_name:
+                raise ValueError(f"bundle_cluster must be kind:NAME or k3s:NAME, got '{cluster}'")
+            return CommonUtilities.get_utility_command(*build_args, f"--{cluster_type}", cluster_name)
+
+        self.bundle = command.local.Command(
+            f"{name}-bundle",
+            create=pulumi.Output.from_input(bundle_cluster).apply(get_build_command),
+            dir=CommonUtilities.get_pulumi_root(),
+            triggers=[trigger for trigger in (self.bundle_image, bundle_cluster, cluster_id) if trigger is not None],
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+
+        # Read-only access to the metrics API for the provisioned cluster-resources dashboard
+        reader_opts = pulumi.ResourceOptions(parent=self, depends_on=[self.namespace])
+        metrics_reader = k8s.core.v1.ServiceAccount(
+            f"{name}-metrics-reader",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name="grafana-metrics-reader", namespace=namespace),
+            opts=reader_opts,
+        )
+        metrics_role = k8s.rbac.v1.ClusterRole(
+            f"{name}-metrics-reader-role",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=f"{namespace}-grafana-metrics-reader"),
+            rules=[k8s.rbac.v1.PolicyRuleArgs(
+                api_groups=["metrics.k8s.io"],
+                resources=["nodes", "pods"],
+                verbs=["get", "list"],
+            )],
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+        k8s.rbac.v1.ClusterRoleBinding(
+            f"{name}-metrics-reader-binding",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=f"{namespace}-grafana-metrics-reader"),
+            role_ref=k8s.rbac.v1.RoleRefArgs(
+                api_group="rbac.authorization.k8s.io",
+                kind="ClusterRole",
+                name=metrics_role.metadata["name"],
+            ),
+            subjects=[k8s.rbac.v1.SubjectArgs(kind="ServiceAccount", name="grafana-metrics-reader",
+                                              namespace=namespace)],
+            opts=pulumi.ResourceOptions(parent=self),
+        )
+        self.metrics_reader_token = k8s.core.v1.Secret(
+            f"{name}-metrics-reader-token",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name="grafana-metrics-reader-token",
+                namespace=namespace,
+                annotations={"kubernetes.io/service-account.name": "grafana-metrics-reader"},
+            ),
+            type="kubernetes.io/service-account-token",
+            opts=pulumi.ResourceOptions(parent=self, depends_on=[metrics_reader]),
+        )
+        self.bundle_resources = [self.bundle, self.metrics_reader_token]
+
+        return {
+            "extraEmptyDirMounts": [
+                {"name": "bundle-plugins", "mountPath": "/var/lib/grafana/plugins"},
+                {"name": "bundle-dashboards", "mountPath": "/var/lib/grafana/dashboards/bundle"},
+            ],
+            "extraInitContainers": [{
+                "name": "grafana-bundle",
+                "image": self.bundle_image,
+                # Side-loaded, never in a registry
+                "imagePullPolicy": "Never",
+                "command": ["sh", "-c", "for d in plugins dashboards; do "
+                                        "if [ -d /bundle/$d ]; then cp -a /bundle/$d/. /mnt/$d/; fi; done"],
+                "volumeMounts": [
+                    {"name": "bundle-plugins", "mountPath": "/mnt/plugins"},
+                    {"name": "bundle-dashboards", "mountPath": "/mnt/dashboards"},
+                ],
+            }],
+            "dashboardProviders": {
+                "dashboardproviders.yaml": {
+                    "apiVersion": 1,
+                    "providers": [{
+                        "name": "bundle",
+                        "orgId": 1,
+                        "type": "file",
+                        "disableDeletion": True,
+                        "options": {"path": "/var/lib/grafana/dashboards/bundle"},
+                    }],
+                },
+            },
+            "envValueFrom": {
+                "METRICS_READER_TOKEN": {"secretKeyRef": {"name": "grafana-metrics-reader-token", "key": "token"}},
+            },
+        }
+
+    def _create_backend(self, name: str, namespace: str, component: str, image: str, port: int,
+                        readiness_command: list, env: Optional[list] = None, args: Optional[list] = None,
+                        volume: Optional[tuple] = None,
+                        opts: Optional[pulumi.ResourceOptions] = None) -> k8s.apps.v1.Deployment:
+        """Create a single-replica backend Deployment and its Service, both named ``grafana-<component>``."""
+        labels = {
+            "app.kubernetes.io/name": f"grafana-{component}",
+            "app.kubernetes.io/instance": name,
+        }
+        volumes, volume_mounts = None, None
+        if volume:
+            mount_path, claim = volume
+            volumes = [k8s.core.v1.VolumeArgs(
+                name="data",
+                persistent_volume_claim=k8s.core.v1.PersistentVolumeClaimVolumeSourceArgs(
+                    claim_name=claim.metadata["name"],
+                ),
+            )]
+            volume_mounts = [k8s.core.v1.VolumeMountArgs(name="data", mount_path=mount_path)]
+
+        deployment = k8s.apps.v1.Deployment(
+            f"{name}-{component}",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=f"grafana-{component}", namespace=namespace, labels=labels),
+            spec=k8s.apps.v1.DeploymentSpecArgs(
+                replicas=1,
+                selector=k8s.meta.v1.LabelSelectorArgs(match_labels=labels),
+                # A volume can only be mounted by one pod at a time
+                strategy=k8s.apps.v1.DeploymentStrategyArgs(type="Recreate"),
+                template=k8s.core.v1.PodTemplateSpecArgs(
+                    metadata=k8s.meta.v1.ObjectMetaArgs(labels=labels),
+                    spec=k8s.core.v1.PodSpecArgs(
+                        volumes=volumes,
+                        containers=[
+                            k8s.core.v1.ContainerArgs(
+                                name=component,
+                                image=image,
+                                image_pull_policy="IfNotPresent",
+                                args=args,
+                                env=env,
+                                ports=[k8s.core.v1.ContainerPortArgs(name=component, container_port=port)],
+                                volume_mounts=volume_mounts,
+                                readiness_probe=k8s.core.v1.ProbeArgs(
+                                    exec_=k8s.core.v1.ExecActionArgs(command=readiness_command),
+                                    period_seconds=5,
+                                ),
+                                resources=k8s.core.v1.ResourceRequirementsArgs(
+                                    requests={"memory": "128Mi", "cpu": "100m"},
+                                    limits={"memory": "512Mi"},
+                                ),
+                            ),
+                        ],
+                    ),
+                ),
+            ),
+            opts=opts,
+        )
+        k8s.core.v1.Service(
+            f"{name}-{component}-service",
+            metadata=k8s.meta.v1.ObjectMetaArgs(name=f"grafana-{component}", namespace=namespace, labels=labels),
+            spec=k8s.core.v1.ServiceSpecArgs(
+                selector=labels,
+                ports=[k8s.core.v1.ServicePortArgs(name=component, port=port, target_port=component)],
+            ),
+            opts=opts,
+        )
+        return deployment
+
     def get_service_url(self) -> pulumi.Output[str]:
-        """Get the service URL for Grafana."""
-        def get_url(svc):
-            if svc.spec and svc.spec.type == "NodePort" and svc.spec.ports and svc.spec.ports[0].node_port:
-                return f"http://localhost:{svc.spec.ports[0].node_port}"
-            return f"http://{svc.metadata.name}.{self.namespace_name}.svc.cluster.local"
-        
-        return self.service.apply(get_url)
+        """Get the service URL for Grafana (from the deployed Service when ``verify_service`` is set)."""
+        def get_url(service_type: str, port: int, node_port: Optional[int]) -> pulumi.Output[str]:
+            if service_type == "NodePort" and node_port:
+                return pulumi.Output.from_input(f"http://localhost:{node_port}")
+            host = self.service_name.apply(lambda service_name: f"{service_name}.{self._namespace}.svc.cluster.local")
+            return host.apply(lambda host: f"http://{host}" if port == 80 else f"http://{host}:{port}")
+
+        if self.service is None:
+            return get_url(self.service_type, self.service_port, self.node_port)
+        return self.service.spec.apply(
+            lambda spec: get_url(spec.type, spec.ports[0].port, spec.ports[0].node_port)
+        )
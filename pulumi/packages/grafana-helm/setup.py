@@ -8,6 +8,7 @@ setup(
     install_requires=[
         "pulumi>=3.0.0",
         "pulumi-kubernetes>=4.0.0",
+        "pulumi-command>=0.9.0",
     ],
     python_requires=">=3.8",
     classifiers=[
@@ -4,12 +4,64 @@ import pulumi_command as command
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 import json
-import yaml
 import os
-import subprocess
-import shutil
 import sys
 
+# Add the pulumi directory to the Python path for the shared utilities
+pulumi_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if pulumi_dir not in sys.path:
+    sys.path.append(pulumi_dir)
+
+from utilities import (CommonUtilities, ConfigLoader, ContainerRuntime, KubeconfigCache, MetricsApiReadiness,
+                       NodeReadiness, ResourceSizingPolicy)
+from utilities.k3s_airgap import get_airgap_dir
+from utilities.k3s_nodes import DATASTORES, get_node_name
+from utilities.readiness import parse_duration
+from utilities.registry_mirror import get_k3s_registries_file
+
+
+# Footprint profiles: components to disable, server and kubelet tuning, and
+# CPUs per node. Measure them with utilities/scripts/k3s-profile-footprint.py.
+K3S_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Throwaway CI clusters: nothing but the API, scheduler, CoreDNS and flannel
+    "minimal-ci": {
+        "disable": ["traefik", "servicelb", "local-storage", "metrics-server"],
+        "server_args": [
+            "--disable-cloud-controller",
+            "--disable-helm-controller",
+            "--disable-network-policy",
+            "--kube-apiserver-arg=max-requests-inflight=100",
+            "--kube-apiserver-arg=max-mutating-requests-inflight=50",
+            "--kube-apiserver-arg=event-ttl=10m",
+            "--kube-controller-manager-arg=terminated-pod-gc-threshold=50",
+        ],
+        "kubelet_args": ["max-pods=30", "image-gc-high-threshold=95", "image-gc-low-threshold=90"],
+        "cpus": "1",
+    },
+    # Local development: storage and the bundled metrics-server stay, ingress and load balancer go
+    "dev": {
+        "disable": ["traefik", "servicelb"],
+        "server_args": [
+            "--disable-cloud-controller",
+            "--kube-apiserver-arg=max-requests-inflight=200",
+            "--kube-apiserver-arg=event-ttl=30m",
+        ],
+        "kubelet_args": ["max-pods=60"],
+        "cpus": "2",
+    },
+    # Close to a real cluster: K3s defaults plus kubelet reservations and eviction thresholds
+    "prod-like": {
+        "disable": [],
+        "server_args": [],
+        "kubelet_args": [
+            "system-reserved=cpu=250m,memory=256Mi",
+            "kube-reserved=cpu=250m,memory=256Mi",
+            "eviction-hard=memory.available<200Mi,nodefs.available<10%",
+        ],
+        "cpus": "2",
+    },
+}
+
 
 @dataclass
 class K3sClusterConfig:
@@ -29,6 +81,15 @@ class K3sClusterConfig:
     enable_components: Optional[List[str]] = None  # Components to enable
     podman_runtime: Optional[bool] = True  # Use Podman instead of Docker
     k3s_image: Optional[str] = None  # Custom K3s image
+    # Footprint profile: minimal-ci, dev or prod-like (see K3S_PROFILES); None keeps K3s defaults
+    profile: Optional[str] = None
+    node_cpus: Optional[str] = None  # CPUs per node, overriding the profile
+    registry_mirror: Optional[bool] = False  # Pull through local caching registries shared across clusters
+    # Airgap: nodes import system images from local tarballs, filled from the cache on first run
+    airgap: Optional[bool] = False
+    airgap_images: Optional[List[str]] = None  # Extra images added to the tarballs, e.g. for enabled addons
+    # Datastore: sqlite (single server), etcd (embedded), external-etcd or postgres (local containers)
+    datastore: Optional[str] = "sqlite"
     # Network configuration
     cluster_cidr: Optional[str] = "10.42.0.0/16"
     service_cidr: Optional[str] = "10.43.0.0/16"
@@ -37,20 +98,13 @@ class K3sClusterConfig:
     enable_metrics_server: Optional[bool] = True
     metrics_server_namespace: Optional[str] = "kube-system"
     metrics_server_replicas: Optional[int] = 1
+    metrics_server_resolution: Optional[str] = "15s"
+    metrics_server_high_availability: Optional[bool] = False  # PDB, spread and priority class; 2+ replicas
 
     @classmethod
     def from_environment(cls, environment: str) -> 'K3sClusterConfig':
         """Load configuration from environment-specific YAML file."""
-        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        config_file = os.path.join(package_dir, 'k3s-cluster', 'configs', f'{environment}.yaml')
-        
-        if not os.path.exists(config_file):
-            raise FileNotFoundError(f"Configuration file not found: {config_file}")
-        
-        with open(config_file, 'r') as f:
-            config_data = yaml.safe_load(f)
-        
-        return cls(**config_data)
+        return ConfigLoader.load(cls, 'k3s-cluster', environment)
 
 
 class K3sCluster(pulumi.ComponentResource):
@@ -60,41 +114,79 @@ class K3sCluster(pulumi.ComponentResource):
         self.cluster_name = pulumi.Output.from_input(config.cluster_name)
         self.kubernetes_version = pulumi.Output.from_input(config.kubernetes_version)
         
-        # Check if Podman is available
-        self.podman_available = self._check_podman_available()
+        if config.profile and config.profile not in K3S_PROFILES:
+            raise ValueError(f"Unknown profile '{config.profile}', expected one of {', '.join(K3S_PROFILES)}")
+        if config.datastore not in DATASTORES:
+            raise ValueError(f"Unknown datastore '{config.datastore}', expected one of {', '.join(DATASTORES)}")
+        if config.datastore == "sqlite" and (config.nodes or 0) > 1:
+            raise ValueError("The sqlite datastore supports a single server; use etcd, external-etcd or postgres")
+        
+        # The container runtime is detected by the apply-time commands, so preview works without one
+        self.runtime_environment = ContainerRuntime.get_preferred_environment("podman" if config.podman_runtime else None)
         
         # Create K3s cluster configuration
         k3s_config = self._create_k3s_config(config)
         
-        # Create K3s cluster using command provider
-        if config.podman_runtime and self.podman_available:
-            self.cluster = self._create_k3s_with_podman(name, config, k3s_config)
+        # Start the shared pull-through mirrors and write the registries.yaml K3s reads
+        if config.registry_mirror:
+            self.registry_mirror = command.local.Command(
+                f"{name}-registry-mirror",
+                create=CommonUtilities.get_utility_command(
+                    "registry_mirror", "ensure", "--k3s-registries", get_k3s_registries_file()
+                ),
+                dir=CommonUtilities.get_pulumi_root(),
+                environment=self.runtime_environment,
+                opts=pulumi.ResourceOptions(parent=self)
+            )
         else:
-            self.cluster = self._create_k3s_with_docker(name, config, k3s_config)
+            self.registry_mirror = None
         
-        # Wait for cluster to be ready
-        if config.wait_for_ready:
-            self.ready = command.local.Command(
-                f"{name}-ready",
-                create=f"kubectl wait --for=condition=Ready nodes --all --timeout={config.wait_for_ready_timeout}",
-                opts=pulumi.ResourceOptions(
-                    parent=self,
-                    depends_on=[self.cluster]
-                )
+        # Fill the airgap image directory the nodes import their system images from
+        if config.airgap:
+            airgap_args = ["k3s_airgap", "prepare", "--version", config.kubernetes_version,
+                           "--node-image", self.get_node_image(config)]
+            for image in config.airgap_images or []:
+                airgap_args += ["--image", image]
+            self.airgap_images = command.local.Command(
+                f"{name}-airgap-images",
+                create=CommonUtilities.get_utility_command(*airgap_args),
+                dir=CommonUtilities.get_pulumi_root(),
+                environment=self.runtime_environment,
+                opts=pulumi.ResourceOptions(parent=self)
             )
         else:
-            self.ready = self.cluster
+            self.airgap_images = None
+        
+        # Create the K3s node containers using command provider, one resource per node
+        self.nodes = self._create_k3s_nodes(name, config, k3s_config)
+        self.cluster = self.nodes[0]
         
-        # Get kubeconfig
+        # Get kubeconfig, from the kubeconfig cache while the server is unchanged
         self.kubeconfig = command.local.Command(
             f"{name}-kubeconfig",
-            create=f"k3s kubeconfig write {config.cluster_name}",
+            create=CommonUtilities.get_utility_command("kubeconfig_cache", "k3s", "--name", config.cluster_name),
+            dir=CommonUtilities.get_pulumi_root(),
+            environment=self.runtime_environment,
             opts=pulumi.ResourceOptions(
                 parent=self,
-                depends_on=[self.ready]
+                depends_on=[self.cluster]
             )
         )
         
+        # Wait for every node to be Ready, using the cluster's own kubeconfig
+        if config.wait_for_ready:
+            self.ready = NodeReadiness(
+                f"{name}-ready",
+                kubeconfig=self.kubeconfig.stdout,
+                expected_nodes=(config.nodes or 0) + (config.worker_nodes or 0),
+                timeout=config.wait_for_ready_timeout,
+                opts=pulumi.ResourceOptions(parent=self, depends_on=[self.kubeconfig, *self.nodes])
+            )
+            self.node_ready_seconds = self.ready.node_ready_seconds
+        else:
+            self.ready = self.kubeconfig
+            self.node_ready_seconds = pulumi.Output.from_input({})
+        
         # Create Kubernetes provider
         self.provider = k8s.Provider(
             f"{name}-provider",
@@ -102,49 +194,108 @@ class K3sCluster(pulumi.ComponentResource):
             opts=pulumi.ResourceOptions(parent=self, depends_on=[self.ready])
         )
         
-        # Deploy metrics server if enabled
+        # Deploy metrics server if enabled; metrics_ready passes once node metrics are served
         if config.enable_metrics_server:
             self.metrics_server = self._deploy_metrics_server(name, config)
+            self.metrics_ready = self.metrics_server.metrics_ready
+            self.time_to_first_metrics = self.metrics_server.time_to_first_metrics
         else:
             self.metrics_server = None
-    
-    def _check_podman_available(self) -> bool:
-        """Check if Podman is available on the system."""
-        try:
-            result = subprocess.run(['podman', '--version'], 
-                                  capture_output=True, text=True, timeout=10)
-            return result.returncode == 0
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            return False
-    
-    def _create_k3s_with_podman(self, name: str, config: K3sClusterConfig, k3s_config: str) -> command.local.Command:
-        """Create K3s cluster using Podman."""
-        # Set up Podman environment
-        env_vars = {
-            "CONTAINER_RUNTIME": "podman",
-            "K3S_RUNTIME": "podman"
-        }
+            self.metrics_ready = None
+            self.time_to_first_metrics = pulumi.Output.from_input(None)
         
-        # Create K3s cluster
-        return command.local.Command(
-            f"{name}-create-podman",
-            create=f"k3s server --cluster-init --write-kubeconfig-mode=644 --config=-",
-            stdin=k3s_config,
-            environment=env_vars,
-            opts=pulumi.ResourceOptions(parent=self)
-        )
+        self.register_outputs({
+            "node_ready_seconds": self.node_ready_seconds,
+            "time_to_first_metrics": self.time_to_first_metrics,
+        })
     
-    def _create_k3s_with_docker(self, name: str, config: K3sClusterConfig, k3s_config: str) -> command.local.Command:
-        """Create K3s cluster using Docker (fallback)."""
-        return command.local.Command(
-            f"{name}-create-docker",
-            create=f"k3s server --cluster-init --write-kubeconfig-mode=644 --config=-",
+    def _create_k3s_nodes(self, name: str, config: K3sClusterConfig, k3s_config: str) -> List[command.local.Command]:
+        """Create the K3s node containers with the detected container runtime.
+        
+        The first server initializes the cluster and its resource completes
+        once it serves the API; every other server and agent depends only on
+        it, so they join concurrently. Each node is its own resource, so a
+        node that fails to come up is retried alone on the next update.
+        """
+        registries_args = ["--registries", get_k3s_registries_file()] if config.registry_mirror else []
+        
+        # The cluster network and any external datastore, shared by every node
+        self.prepare = command.local.Command(
+            f"{name}-prepare",
+            create=CommonUtilities.get_utility_command(
+                "k3s_nodes", "prepare", "--name", config.cluster_name, *registries_args
+            ),
+            delete=CommonUtilities.get_utility_command("k3s_nodes", "delete", "--name", config.cluster_name),
+            dir=CommonUtilities.get_pulumi_root(),
             stdin=k3s_config,
-            opts=pulumi.ResourceOptions(parent=self)
+            environment=self.runtime_environment,
+            opts=pulumi.ResourceOptions(
+                parent=self,
+                depends_on=[r for r in (self.registry_mirror, self.airgap_images) if r]
+            )
         )
+        
+        wait_seconds = f"{parse_duration(config.wait_for_ready_timeout or '300s'):g}"
+        node_names = [get_node_name(config.cluster_name, "server", i) for i in range(config.nodes or 0)]
+        node_names += [get_node_name(config.cluster_name, "agent", i) for i in range(config.worker_nodes or 0)]
+        
+        nodes = []
+        for node_name in node_names:
+            create_args = ["k3s_nodes", "create-node", "--name", config.cluster_name, "--node", node_name,
+                           *registries_args]
+            if not nodes:
+                create_args += ["--wait", wait_seconds]
+            nodes.append(command.local.Command(
+                f"{name}-{node_name[len(config.cluster_name) + 1:]}",
+                create=CommonUtilities.get_utility_command(*create_args),
+                delete=CommonUtilities.get_utility_command(
+                    "k3s_nodes", "delete-node", "--name", config.cluster_name, "--node", node_name
+                ),
+                dir=CommonUtilities.get_pulumi_root(),
+                stdin=k3s_config,
+                environment=self.runtime_environment,
+                opts=pulumi.ResourceOptions(
+                    parent=self,
+                    depends_on=[self.prepare] if not nodes else [nodes[0]]
+                )
+            ))
+        return nodes
     
     def _create_k3s_config(self, config: K3sClusterConfig) -> str:
         """Create K3s cluster configuration YAML."""
+        return json.dumps(self.build_k3s_config(config), indent=2)
+    
+    @staticmethod
+    def get_node_image(config: K3sClusterConfig) -> str:
+        """Get the K3s image the nodes run."""
+        return config.k3s_image or f"rancher/k3s:{config.kubernetes_version}-k3s1"
+    
+    @staticmethod
+    def get_node_resources(config: K3sClusterConfig) -> Dict[str, Any]:
+        """Get the container limits for each node.
+        
+        Every node gets ``node_memory``, capped so that all nodes together
+        stay within ``total_memory_limit``.
+        """
+        node_count = max((config.nodes or 0) + (config.worker_nodes or 0), 1)
+        resources = {}
+        if config.node_memory:
+            memory = CommonUtilities.parse_memory(config.node_memory)
+            if config.total_memory_limit:
+                memory = min(memory, CommonUtilities.parse_memory(config.total_memory_limit) // node_count)
+            resources["memory"] = memory
+        cpus = config.node_cpus or K3S_PROFILES.get(config.profile or "", {}).get("cpus")
+        if cpus:
+            resources["cpus"] = str(cpus)
+        return resources
+    
+    @staticmethod
+    def build_k3s_config(config: K3sClusterConfig) -> Dict[str, Any]:
+        """Build the K3s cluster configuration."""
+        profile = K3S_PROFILES.get(config.profile or "", {})
+        disable = list(profile.get("disable", []))
+        disable += [c for c in config.disable_components or [] if c not in disable]
+        
         k3s_config = {
             "apiVersion": "k3s.cattle.io/v1",
             "kind": "Cluster",
@@ -156,10 +307,17 @@ class K3sCluster(pulumi.ComponentResource):
                 "clusterCIDR": config.cluster_cidr,
                 "serviceCIDR": config.service_cidr,
                 "clusterDNS": config.cluster_dns,
-                "disable": config.disable_components or [],
-                "enable": config.enable_components or []
+                "disable": disable,
+                "enable": config.enable_components or [],
+                "datastore": config.datastore or "sqlite",
+                "serverArgs": list(profile.get("server_args", [])),
+                "kubeletArgs": list(profile.get("kubelet_args", []))
             }
         }
+        resources = K3sCluster.get_node_resources(config)
+        
+        if config.airgap:
+            k3s_config["spec"]["airgapImagesDir"] = get_airgap_dir(config.kubernetes_version)
         
         # Add node configuration
         if config.nodes > 0 or config.worker_nodes > 0:
@@ -169,9 +327,15 @@ class K3sCluster(pulumi.ComponentResource):
             for i in range(config.nodes):
                 node = {
                     "role": "control-plane",
-                    "image": config.k3s_image or f"rancher/k3s:{config.kubernetes_version}-k3s1"
+                    "image": K3sCluster.get_node_image(config),
+                    **resources
                 }
                 
+                # Host ports can only be published once, so only the first server gets them
+                if i > 0:
+                    k3s_config["spec"]["nodes"].append(node)
+                    continue
+                
                 # Add port mappings if specified
                 if config.port_mappings:
                     node["extraPortMappings"] = config.port_mappings
@@ -187,18 +351,20 @@ class K3sCluster(pulumi.ComponentResource):
             for i in range(config.worker_nodes):
                 worker = {
                     "role": "worker",
-                    "image": config.k3s_image or f"rancher/k3s:{config.kubernetes_version}-k3s1"
+                    "image": K3sCluster.get_node_image(config),
+                    **resources
                 }
                 k3s_config["spec"]["nodes"].append(worker)
         
-        return json.dumps(k3s_config, indent=2)
+        return k3s_config
     
     def _deploy_metrics_server(self, name: str, config: K3sClusterConfig) -> pulumi.ComponentResource:
         """Deploy metrics server to the K3s cluster."""
-        # Add the packages directory to the Python path
+        # Add the metrics-server-simple package directory to the Python path
         packages_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'packages')
-        if packages_dir not in sys.path:
-            sys.path.append(packages_dir)
+        package_dir = os.path.join(packages_dir, 'metrics-server-simple')
+        if package_dir not in sys.path:
+            sys.path.append(package_dir)
         
         try:
             from metrics_server_simple import MetricsServerSimple, MetricsServerSimpleConfig
@@ -208,6 +374,10 @@ class K3sCluster(pulumi.ComponentResource):
                 namespace=config.metrics_server_namespace,
                 replicas=config.metrics_server_replicas,
                 kubelet_insecure_tls=True,  # K3s works well with this setting
+                metric_resolution=config.metrics_server_resolution,
+                high_availability=config.metrics_server_high_availability,
+                node_count=(config.nodes or 0) + (config.worker_nodes or 0),
+                readiness_timeout=config.wait_for_ready_timeout,
             )
             
             # Deploy metrics server
@@ -218,7 +388,8 @@ class K3sCluster(pulumi.ComponentResource):
                     parent=self,
                     provider=self.provider,
                     depends_on=[self.provider]
-                )
+                ),
+                kubeconfig=self.kubeconfig.stdout
             )
         except ImportError as e:
             pulumi.log.warn(f"Could not import metrics server package: {e}")
@@ -228,6 +399,7 @@ class K3sCluster(pulumi.ComponentResource):
     def _create_simple_metrics_server(self, name: str, config: K3sClusterConfig) -> pulumi.ComponentResource:
         """Create a simple metrics server deployment as fallback."""
         namespace = config.metrics_server_namespace or "kube-system"
+        resources = ResourceSizingPolicy().get_resources((config.nodes or 0) + (config.worker_nodes or 0))
         
         # Create ServiceAccount
         service_account = k8s.core.v1.ServiceAccount(
@@ -329,7 +501,7 @@ class K3sCluster(pulumi.ComponentResource):
                                     "--secure-port=4443",
                                     "--kubelet-preferred-address-types=InternalIP,ExternalIP,Hostname",
                                     "--kubelet-use-node-status-port",
-                                    "--metric-resolution=15s",
+                                    f"--metric-resolution={config.metrics_server_resolution or '15s'}",
                                     "--kubelet-insecure-tls",  # K3s specific
                                 ],
                                 ports=[
@@ -337,10 +509,7 @@ class K3sCluster(pulumi.ComponentResource):
                                         name="https", container_port=4443, protocol="TCP"
                                     ),
                                 ],
-                                resources=k8s.core.v1.ResourceRequirementsArgs(
-                                    requests={"cpu": "100m", "memory": "200Mi"},
-                                    limits={"cpu": "100m", "memory": "200Mi"},
-                                ),
+                                resources=k8s.core.v1.ResourceRequirementsArgs(**resources),
                             ),
                         ],
                     ),
@@ -379,14 +548,25 @@ class K3sCluster(pulumi.ComponentResource):
             )
         )
         
+        # Wait for the metrics API to serve node metrics rather than for a ready replica
+        metrics_ready = MetricsApiReadiness(
+            f"{name}-metrics-api-ready",
+            kubeconfig=self.kubeconfig.stdout,
+            min_nodes=(config.nodes or 0) + (config.worker_nodes or 0),
+            timeout=config.wait_for_ready_timeout,
+            opts=pulumi.ResourceOptions(parent=self, depends_on=[deployment, api_service])
+        )
+        
         # Create a simple component resource to represent the metrics server
         class SimpleMetricsServer(pulumi.ComponentResource):
             def __init__(self, name, opts=None):
                 super().__init__("metrics-server:simple", name, {}, opts)
                 self.namespace_name = pulumi.Output.from_input(namespace)
-                self.is_ready = deployment.status.apply(
-                    lambda status: status.ready_replicas > 0 if status and status.ready_replicas else False
-                )
+                self.metrics_ready = metrics_ready
+                self.time_to_first_metrics = metrics_ready.time_to_first_metrics
+            
+            def is_ready(self):
+                return self.metrics_ready.is_ready
         
         return SimpleMetricsServer(
             f"{name}-metrics-server",
@@ -397,7 +577,11 @@ class K3sCluster(pulumi.ComponentResource):
         """Delete the K3s cluster."""
         return command.local.Command(
             f"{self.cluster_name}-delete",
-            create=f"k3s server --cluster-reset",
+            create=self.cluster_name.apply(lambda cluster_name: CommonUtilities.get_utility_command(
+                "k3s_nodes", "delete", "--name", cluster_name
+            )),
+            dir=CommonUtilities.get_pulumi_root(),
+            environment=self.runtime_environment,
             opts=pulumi.ResourceOptions(parent=self)
         )
     
@@ -405,6 +589,15 @@ class K3sCluster(pulumi.ComponentResource):
         """Get the kubeconfig for the cluster."""
         return self.kubeconfig.stdout
     
+    @staticmethod
+    def get_cached_kubeconfig(cluster_name: str) -> str:
+        """Get a running cluster's kubeconfig from the kubeconfig cache.
+        
+        For downstream stacks that target an existing cluster: the lookup runs
+        at plan time and only refetches when the cluster was recreated.
+        """
+        return KubeconfigCache().get_k3s(cluster_name)
+    
     def get_cluster_info(self) -> pulumi.Output[Dict[str, Any]]:
         """Get cluster information."""
         return pulumi.Output.all(
@@ -418,6 +611,10 @@ class K3sCluster(pulumi.ComponentResource):
             "metrics_server_enabled": self.metrics_server is not None
         })
     
+    def get_node_ready_seconds(self) -> pulumi.Output[Dict[str, float]]:
+        """Get per-node time-to-ready in seconds (empty when wait_for_ready is off)."""
+        return self.node_ready_seconds
+    
     def get_metrics_server_info(self) -> pulumi.Output[Dict[str, Any]]:
         """Get metrics server information."""
         if self.metrics_server is None:
@@ -428,10 +625,12 @@ class K3sCluster(pulumi.ComponentResource):
         
         return pulumi.Output.all(
             namespace=self.metrics_server.namespace_name,
-            is_ready=self.metrics_server.is_ready
+            is_ready=self.metrics_server.is_ready(),
+            time_to_first_metrics=self.time_to_first_metrics
         ).apply(lambda args: {
             "enabled": True,
             "namespace": args["namespace"],
             "ready": args["is_ready"],
-            "status": "ready" if args["is_ready"] else "starting"
+            "status": "ready" if args["is_ready"] else "starting",
+            "time_to_first_metrics": args["time_to_first_metrics"]
         })
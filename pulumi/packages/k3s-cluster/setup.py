@@ -9,6 +9,7 @@ setup(
         "pulumi-kubernetes>=4.0.0",
         "pulumi-command>=0.9.0",
         "pyyaml>=6.0",
+        "kubernetes>=28.1.0",
     ],
     python_requires=">=3.8",
 )
@@ -4,8 +4,16 @@ import pulumi_command as command
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 import json
-import yaml
 import os
+import sys
+
+# Add the pulumi directory to the Python path for the shared utilities
+pulumi_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if pulumi_dir not in sys.path:
+    sys.path.append(pulumi_dir)
+
+from utilities import CommonUtilities, ConfigLoader, ContainerRuntime, KubeconfigCache, NodeReadiness
+from utilities.registry_mirror import get_kind_containerd_patches
 
 
 @dataclass
@@ -21,20 +29,25 @@ class KindClusterConfig:
     # Memory configuration
     node_memory: Optional[str] = "2Gi"  # Memory per node
     total_memory_limit: Optional[str] = "4Gi"  # Total cluster memory limit
+    # Large topologies: nodes is the control-plane count; node pools add labeled/tainted workers
+    node_pools: Optional[List[Dict[str, Any]]] = None  # [{name, count, labels, taints, kubelet_extra_args, image}]
+    kubelet_config: Optional[Dict[str, Any]] = None  # KubeletConfiguration fields, e.g. maxPods, evictionHard, kubeReserved
+    # Image preload cache
+    image_cache: Optional[bool] = False  # Load the node image from the local image cache
+    preload_images: Optional[List[str]] = None  # Images side-loaded into the nodes after creation
+    # Registry mirror: pull through local caching registries shared by every cluster on the host
+    registry_mirror: Optional[bool] = False
+    # Warm pool: lease a pre-created cluster of the same shape instead of creating one
+    use_pool: Optional[bool] = False
+    pool_size: Optional[int] = 1  # Idle clusters kept ready for this shape
+    # Snapshots: restore the cluster from a snapshot of the same config when one exists
+    snapshot: Optional[bool] = False
+    snapshot_addons: Optional[List[str]] = None  # Addons baked into the snapshot, e.g. "metrics-server:3.11.0"
 
     @classmethod
     def from_environment(cls, environment: str) -> 'KindClusterConfig':
         """Load configuration from environment-specific YAML file."""
-        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        config_file = os.path.join(package_dir, 'kind-cluster', 'configs', f'{environment}.yaml')
-        
-        if not os.path.exists(config_file):
-            raise FileNotFoundError(f"Configuration file not found: {config_file}")
-        
-        with open(config_file, 'r') as f:
-            config_data = yaml.safe_load(f)
-        
-        return cls(**config_data)
+        return ConfigLoader.load(cls, 'kind-cluster', environment)
 
 
 class KindCluster(pulumi.ComponentResource):
@@ -44,49 +57,163 @@ class KindCluster(pulumi.ComponentResource):
         self.cluster_name = pulumi.Output.from_input(config.cluster_name)
         self.kubernetes_version = pulumi.Output.from_input(config.kubernetes_version)
         
+        if config.use_pool and config.snapshot:
+            raise ValueError("use_pool and snapshot cannot be combined: snapshots restore a fixed cluster name")
+        
         # Create Kind cluster configuration
         kind_config = self._create_kind_config(config)
+        self.kind_config = kind_config
+        self.resource_name = name
+        self.snapshot = config.snapshot
+        self.snapshot_args = [
+            *[arg for image in config.preload_images or [] for arg in ("--preload", image)],
+            *[arg for addon in config.snapshot_addons or [] for arg in ("--addon", addon)],
+        ]
+        
+        # The container runtime is detected by the apply-time commands, so preview works without one
+        self.runtime_environment = ContainerRuntime.get_preferred_environment()
+        
+        # Make the node image available locally, from the image cache when it has it
+        create_depends_on = []
+        if config.image_cache:
+            self.node_image = command.local.Command(
+                f"{name}-node-image",
+                create=CommonUtilities.get_utility_command(
+                    "image_cache", "node-image", f"kindest/node:{config.kubernetes_version}"
+                ),
+                dir=CommonUtilities.get_pulumi_root(),
+                environment=self.runtime_environment,
+                opts=pulumi.ResourceOptions(parent=self)
+            )
+            create_depends_on.append(self.node_image)
+        
+        # Start the shared pull-through mirrors the nodes' containerd is pointed at
+        if config.registry_mirror:
+            self.registry_mirror = command.local.Command(
+                f"{name}-registry-mirror",
+                create=CommonUtilities.get_utility_command("registry_mirror", "ensure"),
+                dir=CommonUtilities.get_pulumi_root(),
+                environment=self.runtime_environment,
+                opts=pulumi.ResourceOptions(parent=self)
+            )
+            create_depends_on.append(self.registry_mirror)
         
         # Create Kind cluster using command provider
-        self.cluster = command.local.Command(
-            f"{name}-create",
-            create=f"kind create cluster --name {config.cluster_name} --config -",
-            stdin=kind_config,
-            opts=pulumi.ResourceOptions(parent=self)
-        )
+        if config.use_pool:
+            # The lease prints the pooled cluster's name; destroying returns it to the pool
+            self.cluster = command.local.Command(
+                f"{name}-lease",
+                create=CommonUtilities.get_utility_command(
+                    "kind_pool", "lease", "--holder", f"{pulumi.get_project()}/{pulumi.get_stack()}/{name}",
+                    "--size", str(config.pool_size or 1)
+                ),
+                delete=CommonUtilities.get_utility_command("kind_pool", "release"),
+                dir=CommonUtilities.get_pulumi_root(),
+                environment=self.runtime_environment,
+                stdin=kind_config,
+                opts=pulumi.ResourceOptions(parent=self, depends_on=create_depends_on)
+            )
+            self.cluster_name = self.cluster.stdout.apply(lambda stdout: stdout.strip())
+        elif config.snapshot:
+            self.cluster = command.local.Command(
+                f"{name}-create",
+                create=CommonUtilities.get_utility_command(
+                    "kind_snapshot", "restore-or-create", "--name", config.cluster_name, *self.snapshot_args
+                ),
+                dir=CommonUtilities.get_pulumi_root(),
+                environment=self.runtime_environment,
+                stdin=kind_config,
+                opts=pulumi.ResourceOptions(parent=self, depends_on=create_depends_on)
+            )
+        else:
+            self.cluster = command.local.Command(
+                f"{name}-create",
+                create=CommonUtilities.get_utility_command(
+                    "container_runtime", "kind", "create", "cluster", "--name", config.cluster_name, "--config", "-"
+                ),
+                dir=CommonUtilities.get_pulumi_root(),
+                stdin=kind_config,
+                environment=self.runtime_environment,
+                opts=pulumi.ResourceOptions(parent=self, depends_on=create_depends_on)
+            )
         
-        # Wait for cluster to be ready
-        if config.wait_for_ready:
-            self.ready = command.local.Command(
-                f"{name}-ready",
-                create=f"kubectl wait --for=condition=Ready nodes --all --timeout={config.wait_for_ready_timeout}",
-                opts=pulumi.ResourceOptions(
-                    parent=self,
-                    depends_on=[self.cluster]
-                )
+        # Side-load addon images so nothing is pulled from a registry inside the cluster
+        if config.preload_images:
+            self.preload = command.local.Command(
+                f"{name}-preload-images",
+                create=self.cluster_name.apply(lambda cluster_name: CommonUtilities.get_utility_command(
+                    "image_cache", "load", "--name", cluster_name, *config.preload_images
+                )),
+                dir=CommonUtilities.get_pulumi_root(),
+                environment=self.runtime_environment,
+                opts=pulumi.ResourceOptions(parent=self, depends_on=[self.cluster])
             )
         else:
-            self.ready = self.cluster
+            self.preload = self.cluster
         
-        # Get kubeconfig
+        # Get kubeconfig, from the kubeconfig cache while the control plane is unchanged
         self.kubeconfig = command.local.Command(
             f"{name}-kubeconfig",
-            create=f"kind get kubeconfig --name {config.cluster_name}",
+            create=self.cluster_name.apply(lambda cluster_name: CommonUtilities.get_utility_command(
+                "kubeconfig_cache", "kind", "--name", cluster_name
+            )),
+            dir=CommonUtilities.get_pulumi_root(),
+            environment=self.runtime_environment,
             opts=pulumi.ResourceOptions(
                 parent=self,
-                depends_on=[self.ready]
+                depends_on=[self.cluster]
             )
         )
         
+        # Wait for every node to be Ready, using the cluster's own kubeconfig
+        if config.wait_for_ready:
+            self.ready = NodeReadiness(
+                f"{name}-ready",
+                kubeconfig=self.kubeconfig.stdout,
+                expected_nodes=self.count_nodes(config),
+                timeout=config.wait_for_ready_timeout,
+                opts=pulumi.ResourceOptions(parent=self, depends_on=[self.kubeconfig])
+            )
+            self.node_ready_seconds = self.ready.node_ready_seconds
+        else:
+            self.ready = self.kubeconfig
+            self.node_ready_seconds = pulumi.Output.from_input({})
+        
         # Create Kubernetes provider
         self.provider = k8s.Provider(
             f"{name}-provider",
             kubeconfig=self.kubeconfig.stdout,
-            opts=pulumi.ResourceOptions(parent=self, depends_on=[self.ready])
+            opts=pulumi.ResourceOptions(parent=self, depends_on=[self.ready, self.preload])
         )
+        
+        self.register_outputs({
+            "node_ready_seconds": self.node_ready_seconds,
+        })
     
     def _create_kind_config(self, config: KindClusterConfig) -> str:
         """Create Kind cluster configuration YAML."""
+        return json.dumps(self.build_kind_config(config), indent=2)
+    
+    @staticmethod
+    def count_nodes(config: KindClusterConfig) -> int:
+        """Get the total number of nodes a config creates."""
+        return (
+            max(config.nodes or 1, 1)
+            + (config.worker_nodes or 0)
+            + sum(pool.get("count", 1) for pool in config.node_pools or [])
+        )
+    
+    @staticmethod
+    def build_kind_config(config: KindClusterConfig) -> Dict[str, Any]:
+        """Build the Kind cluster configuration.
+        
+        ``nodes`` control planes are created (Kind fronts several with a load
+        balancer), then ``worker_nodes`` plain workers and the workers of each
+        node pool. Pool labels, taints and kubelet flags, and the cluster-wide
+        ``kubelet_config``, are applied through kubeadm config patches;
+        ``registry_mirror`` through containerd config patches.
+        """
+        image = f"kindest/node:{config.kubernetes_version}"
         kind_config = {
             "kind": "Cluster",
             "apiVersion": "kind.x-k8s.io/v1alpha4",
@@ -94,48 +221,121 @@ class KindCluster(pulumi.ComponentResource):
             "nodes": []
         }
         
-        # Add control plane node
-        control_plane = {
-            "role": "control-plane",
-            "image": f"kindest/node:{config.kubernetes_version}",
-        }
-        
         # Memory configuration will be handled by Docker Desktop resource limits
-        # No need for kubelet patches that can cause startup issues
+        if config.kubelet_config:
+            kind_config["kubeadmConfigPatches"] = [
+                json.dumps({"kind": "KubeletConfiguration", **config.kubelet_config})
+            ]
         
-        # Add port mappings if specified
-        if config.port_mappings:
-            control_plane["extraPortMappings"] = config.port_mappings
+        if config.registry_mirror:
+            kind_config["containerdConfigPatches"] = get_kind_containerd_patches()
         
-        if config.extra_port_mappings:
-            if "extraPortMappings" not in control_plane:
-                control_plane["extraPortMappings"] = []
-            control_plane["extraPortMappings"].extend(config.extra_port_mappings)
-        
-        kind_config["nodes"].append(control_plane)
+        # Add control plane nodes; port mappings go on the first one only
+        for i in range(max(config.nodes or 1, 1)):
+            control_plane = {
+                "role": "control-plane",
+                "image": image,
+            }
+            
+            if i == 0 and config.port_mappings:
+                control_plane["extraPortMappings"] = list(config.port_mappings)
+            
+            if i == 0 and config.extra_port_mappings:
+                if "extraPortMappings" not in control_plane:
+                    control_plane["extraPortMappings"] = []
+                control_plane["extraPortMappings"].extend(config.extra_port_mappings)
+            
+            kind_config["nodes"].append(control_plane)
         
         # Add worker nodes
-        for i in range(config.worker_nodes):
+        for i in range(config.worker_nodes or 0):
             worker = {
                 "role": "worker",
-                "image": f"kindest/node:{config.kubernetes_version}",
+                "image": image,
             }
-            
-            # Memory configuration will be handled by Docker Desktop resource limits
-            # No need for kubelet patches that can cause startup issues
-            
             kind_config["nodes"].append(worker)
         
-        return json.dumps(kind_config, indent=2)
+        # Add node pool workers
+        for pool in config.node_pools or []:
+            node_registration = {}
+            labels = {"node-pool": pool["name"], **(pool.get("labels") or {})}
+            kubelet_extra_args = {
+                "node-labels": ",".join(f"{k}={v}" for k, v in labels.items()),
+                **{k: str(v) for k, v in (pool.get("kubelet_extra_args") or {}).items()},
+            }
+            node_registration["kubeletExtraArgs"] = kubelet_extra_args
+            if pool.get("taints"):
+                node_registration["taints"] = [KindCluster._parse_taint(t) for t in pool["taints"]]
+            
+            for i in range(pool.get("count", 1)):
+                kind_config["nodes"].append({
+                    "role": "worker",
+                    "image": pool.get("image") or image,
+                    "kubeadmConfigPatches": [
+                        json.dumps({"kind": "JoinConfiguration", "nodeRegistration": node_registration})
+                    ],
+                })
+        
+        return kind_config
+    
+    @staticmethod
+    def _parse_taint(taint: Any) -> Dict[str, str]:
+        """Parse a ``key=value:Effect`` taint string (or pass a taint dict through)."""
+        if isinstance(taint, dict):
+            return taint
+        key_value, _, effect = taint.partition(":")
+        key, _, value = key_value.partition("=")
+        parsed = {"key": key, "effect": effect or "NoSchedule"}
+        if value:
+            parsed["value"] = value
+        return parsed
     
     def delete_cluster(self) -> pulumi.Output[None]:
         """Delete the Kind cluster."""
         return command.local.Command(
             f"{self.cluster_name}-delete",
-            create=f"kind delete cluster --name {self.cluster_name}",
+            create=self.cluster_name.apply(lambda cluster_name: CommonUtilities.get_utility_command(
+                "container_runtime", "kind", "delete", "cluster", "--name", cluster_name
+            )),
+            dir=CommonUtilities.get_pulumi_root(),
+            environment=self.runtime_environment,
             opts=pulumi.ResourceOptions(parent=self)
         )
     
+    def snapshot_after(self, resources: List[pulumi.Resource]) -> Optional[command.local.Command]:
+        """Snapshot the cluster once ``resources`` (every addon listed in ``snapshot_addons``) are deployed.
+        
+        Only runs with ``snapshot`` enabled (returns None otherwise), after the
+        cluster, its preloaded images and ``resources``. Nothing is captured
+        when a snapshot of this config already exists, so later runs restore
+        the cluster with its addons.
+        """
+        if not self.snapshot:
+            return None
+        return command.local.Command(
+            f"{self.resource_name}-snapshot",
+            create=self.cluster_name.apply(lambda cluster_name: CommonUtilities.get_utility_command(
+                "kind_snapshot", "save", "--name", cluster_name, *self.snapshot_args
+            )),
+            dir=CommonUtilities.get_pulumi_root(),
+            environment=self.runtime_environment,
+            stdin=self.kind_config,
+            opts=pulumi.ResourceOptions(parent=self, depends_on=[self.ready, self.preload, self.provider, *resources])
+        )
+    
     def get_kubeconfig(self) -> pulumi.Output[str]:
         """Get the kubeconfig for the cluster."""
         return self.kubeconfig.stdout
+    
+    @staticmethod
+    def get_cached_kubeconfig(cluster_name: str) -> str:
+        """Get a running cluster's kubeconfig from the kubeconfig cache.
+        
+        For downstream stacks that target an existing cluster: the lookup runs
+        at plan time and only refetches when the cluster was recreated.
+        """
+        return KubeconfigCache().get_kind(cluster_name)
+    
+    def get_node_ready_seconds(self) -> pulumi.Output[Dict[str, float]]:
+        """Get per-node time-to-ready in seconds (empty when wait_for_ready is off)."""
+        return self.node_ready_seconds
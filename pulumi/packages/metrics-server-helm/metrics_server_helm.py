@@ -3,8 +3,15 @@ import pulumi_kubernetes as k8s
 from pulumi_kubernetes import helm
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
-import yaml
 import os
+import sys
+
+# Add the pulumi directory to the Python path for the shared utilities
+pulumi_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if pulumi_dir not in sys.path:
+    sys.path.append(pulumi_dir)
+
+from utilities import ConfigLoader
 
 
 @dataclass
@@ -22,16 +29,7 @@ class MetricsServerHelmConfig:
     @classmethod
     def from_environment(cls, environment: str) -> 'MetricsServerHelmConfig':
         """Load configuration from environment-specific YAML file."""
-        package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        config_file = os.path.join(package_dir, 'metrics-server-helm', 'configs', f'{environment}.yaml')
-        
-        if not os.path.exists(config_file):
-            raise FileNotFoundError(f"Configuration file not found: {config_file}")
-        
-        with open(config_file, 'r') as f:
-            config_data = yaml.safe_load(f)
-        
-        return cls(**config_data)
+        return ConfigLoader.load(cls, 'metrics-server-helm', environment)
 
 
 class MetricsServerHelm(pulumi.ComponentResource):
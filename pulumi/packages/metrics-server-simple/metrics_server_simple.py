@@ -2,6 +2,16 @@ import pulumi
 import pulumi_kubernetes as k8s
 from typing import Optional, Dict, Any
 from dataclasses import dataclass
+import os
+import sys
+
+# Add the pulumi directory to the Python path for the shared utilities
+pulumi_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if pulumi_dir not in sys.path:
+    sys.path.append(pulumi_dir)
+
+from utilities import MetricsApiReadiness, ResourceSizingPolicy
+from utilities.readiness import parse_duration
 
 
 @dataclass
@@ -11,14 +21,45 @@ class MetricsServerSimpleConfig:
     image: Optional[str] = "registry.k8s.io/metrics-server/metrics-server:v0.6.4"
     # Kind-specific configuration
     kubelet_insecure_tls: Optional[bool] = True
+    # Scraping: how often kubelets are scraped and how long one scrape may take
+    metric_resolution: Optional[str] = "15s"
+    kubelet_request_timeout: Optional[str] = None  # metrics-server default (10s) when unset
+    # Sizing: requests grow with the node count (addon-resizer style)
+    node_count: Optional[int] = 1
+    base_cpu: Optional[str] = "40m"
+    cpu_per_node: Optional[str] = "0.5m"
+    base_memory: Optional[str] = "40Mi"
+    memory_per_node: Optional[str] = "4Mi"
+    # High availability: two or more replicas spread across nodes, a PDB and a priority class
+    high_availability: Optional[bool] = False
+    priority_class_name: Optional[str] = "system-cluster-critical"
+    # How long to wait for the metrics API to serve node metrics (needs a kubeconfig)
+    readiness_timeout: Optional[str] = "300s"
+    
+    def get_resources(self) -> Dict[str, Dict[str, str]]:
+        """Get the metrics-server container resources for the configured node count."""
+        policy = ResourceSizingPolicy(base_cpu=self.base_cpu, cpu_per_node=self.cpu_per_node,
+                                      base_memory=self.base_memory, memory_per_node=self.memory_per_node)
+        return policy.get_resources(self.node_count or 1)
 
 
 class MetricsServerSimple(pulumi.ComponentResource):
-    def __init__(self, name: str, config: MetricsServerSimpleConfig, opts: Optional[pulumi.ResourceOptions] = None):
+    def __init__(self, name: str, config: MetricsServerSimpleConfig, opts: Optional[pulumi.ResourceOptions] = None,
+                 kubeconfig: Optional[pulumi.Input[str]] = None):
         super().__init__("metrics-server:simple", name, {}, opts)
         
         namespace = config.namespace or "kube-system"
         
+        resolution = parse_duration(config.metric_resolution or "15s")
+        if resolution < 10:
+            raise ValueError(f"metric_resolution must be at least 10s, got {config.metric_resolution}")
+        if config.kubelet_request_timeout and parse_duration(config.kubelet_request_timeout) >= resolution:
+            raise ValueError("kubelet_request_timeout must be shorter than metric_resolution")
+        
+        replicas = config.replicas or 1
+        if config.high_availability:
+            replicas = max(replicas, 2)
+        
         # Create ServiceAccount
         self.service_account = k8s.core.v1.ServiceAccount(
             f"{name}-service-account",
@@ -197,7 +238,7 @@ class MetricsServerSimple(pulumi.ComponentResource):
                 },
             ),
             spec=k8s.apps.v1.DeploymentSpecArgs(
-                replicas=config.replicas or 1,
+                replicas=replicas,
                 selector=k8s.meta.v1.LabelSelectorArgs(
                     match_labels={
                         "k8s-app": "metrics-server",
@@ -206,6 +247,7 @@ class MetricsServerSimple(pulumi.ComponentResource):
                 strategy=k8s.apps.v1.DeploymentStrategyArgs(
                     rolling_update=k8s.apps.v1.RollingUpdateDeploymentArgs(
                         max_unavailable=0,
+                        max_surge=1,
                     ),
                 ),
                 template=k8s.core.v1.PodTemplateSpecArgs(
@@ -217,6 +259,7 @@ class MetricsServerSimple(pulumi.ComponentResource):
                     ),
                     spec=k8s.core.v1.PodSpecArgs(
                         service_account_name=self.service_account.metadata["name"],
+                        **self._get_ha_pod_args(config),
                         volumes=[
                             k8s.core.v1.VolumeArgs(
                                 name="tmp-dir",
@@ -242,9 +285,19 @@ class MetricsServerSimple(pulumi.ComponentResource):
                                         port="https",
                                         scheme="HTTPS",
                                     ),
-                                    period_seconds=10,
-                                    failure_threshold=3,
+                                    # With a startup probe guarding the first scrape, readiness can react fast
+                                    period_seconds=5 if config.high_availability else 10,
+                                    failure_threshold=2 if config.high_availability else 3,
                                 ),
+                                startup_probe=k8s.core.v1.ProbeArgs(
+                                    http_get=k8s.core.v1.HTTPGetActionArgs(
+                                        path="/livez",
+                                        port="https",
+                                        scheme="HTTPS",
+                                    ),
+                                    period_seconds=5,
+                                    failure_threshold=24,
+                                ) if config.high_availability else None,
                                 liveness_probe=k8s.core.v1.ProbeArgs(
                                     http_get=k8s.core.v1.HTTPGetActionArgs(
                                         path="/livez",
@@ -261,14 +314,7 @@ class MetricsServerSimple(pulumi.ComponentResource):
                                     ),
                                 ],
                                 resources=k8s.core.v1.ResourceRequirementsArgs(
-                                    requests={
-                                        "cpu": "100m",
-                                        "memory": "200Mi",
-                                    },
-                                    limits={
-                                        "cpu": "100m",
-                                        "memory": "200Mi",
-                                    },
+                                    **config.get_resources()
                                 ),
                             ),
                         ],
@@ -303,6 +349,30 @@ class MetricsServerSimple(pulumi.ComponentResource):
             )
         )
         
+        # Keep one replica serving metrics.k8s.io through node drains
+        if config.high_availability:
+            self.pod_disruption_budget = k8s.policy.v1.PodDisruptionBudget(
+                f"{name}-pdb",
+                metadata=k8s.meta.v1.ObjectMetaArgs(
+                    name="metrics-server",
+                    namespace=namespace,
+                    labels={
+                        "k8s-app": "metrics-server",
+                    },
+                ),
+                spec=k8s.policy.v1.PodDisruptionBudgetSpecArgs(
+                    min_available=1,
+                    selector=k8s.meta.v1.LabelSelectorArgs(
+                        match_labels={
+                            "k8s-app": "metrics-server",
+                        },
+                    ),
+                ),
+                opts=pulumi.ResourceOptions(parent=self)
+            )
+        else:
+            self.pod_disruption_budget = None
+        
         # Create APIService for metrics.k8s.io
         self.api_service = k8s.apiregistration.v1.APIService(
             f"{name}-api-service",
@@ -332,16 +402,70 @@ class MetricsServerSimple(pulumi.ComponentResource):
         
         self.namespace_name = pulumi.Output.from_input(namespace)
         
-    def _get_container_args(self, config: MetricsServerSimpleConfig) -> list[str]:
+        # With the cluster's kubeconfig, readiness means node metrics are actually served
+        if kubeconfig is not None:
+            self.metrics_ready = MetricsApiReadiness(
+                f"{name}-metrics-api-ready",
+                kubeconfig=kubeconfig,
+                min_nodes=config.node_count or 1,
+                timeout=config.readiness_timeout or "300s",
+                opts=pulumi.ResourceOptions(parent=self, depends_on=[self.deployment, self.api_service])
+            )
+            self.time_to_first_metrics = self.metrics_ready.time_to_first_metrics
+            # The readiness wait only passes once the APIService reported Available
+            self.api_available = self.metrics_ready.api_available_seconds.apply(lambda seconds: seconds is not None)
+        else:
+            self.metrics_ready = None
+            self.time_to_first_metrics = pulumi.Output.from_input(None)
+            self.api_available = pulumi.Output.from_input(None)
+        
+    def _get_ha_pod_args(self, config: MetricsServerSimpleConfig) -> Dict[str, Any]:
+        """Get the pod spec settings that spread replicas over nodes in HA mode."""
+        if not config.high_availability:
+            return {}
+        
+        selector = k8s.meta.v1.LabelSelectorArgs(match_labels={"k8s-app": "metrics-server"})
+        return {
+            "priority_class_name": config.priority_class_name,
+            # Preferred rather than required, so clusters with fewer nodes than replicas still schedule
+            "affinity": k8s.core.v1.AffinityArgs(
+                pod_anti_affinity=k8s.core.v1.PodAntiAffinityArgs(
+                    preferred_during_scheduling_ignored_during_execution=[
+                        k8s.core.v1.WeightedPodAffinityTermArgs(
+                            weight=100,
+                            pod_affinity_term=k8s.core.v1.PodAffinityTermArgs(
+                                label_selector=selector,
+                                topology_key="kubernetes.io/hostname",
+                            ),
+                        ),
+                    ],
+                ),
+            ),
+            "topology_spread_constraints": [
+                k8s.core.v1.TopologySpreadConstraintArgs(
+                    max_skew=1,
+                    topology_key=topology_key,
+                    when_unsatisfiable="ScheduleAnyway",
+                    label_selector=selector,
+                )
+                for topology_key in ("kubernetes.io/hostname", "topology.kubernetes.io/zone")
+            ],
+        }
+    
+    @staticmethod
+    def _get_container_args(config: MetricsServerSimpleConfig) -> list[str]:
         """Get container arguments based on configuration."""
         args = [
             "--cert-dir=/tmp",
             "--secure-port=4443",
             "--kubelet-preferred-address-types=InternalIP,ExternalIP,Hostname",
             "--kubelet-use-node-status-port",
-            "--metric-resolution=15s",
+            f"--metric-resolution={config.metric_resolution or '15s'}",
         ]
         
+        if config.kubelet_request_timeout:
+            args.append(f"--kubelet-request-timeout={config.kubelet_request_timeout}")
+        
         # Add Kind-specific flag if enabled
         if config.kubelet_insecure_tls:
             args.append("--kubelet-insecure-tls")
@@ -349,10 +473,21 @@ class MetricsServerSimple(pulumi.ComponentResource):
         return args
         
     def is_ready(self) -> pulumi.Output[bool]:
-        """Check if the metrics server is ready."""
+        """Check if the metrics server is ready.
+        
+        With a kubeconfig this is the metrics API readiness gate; without one,
+        a ready replica.
+        """
+        if self.metrics_ready is not None:
+            return self.metrics_ready.is_ready
+        
         def check_ready(status):
             if status and status.ready_replicas and status.ready_replicas > 0:
                 return True
             return False
         
-        return self.deployment.status.apply(check_ready)
\ No newline at end of file
+        return self.deployment.status.apply(check_ready)
+    
+    def is_api_available(self) -> pulumi.Output[Optional[bool]]:
+        """Check if the metrics.k8s.io APIService reported Available (None without a kubeconfig)."""
+        return self.api_available
\ No newline at end of file
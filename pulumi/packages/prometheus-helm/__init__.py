@@ -0,0 +1,3 @@
+from .prometheus_helm import PrometheusHelm, PrometheusHelmConfig
+
+__all__ = ["PrometheusHelm", "PrometheusHelmConfig"]
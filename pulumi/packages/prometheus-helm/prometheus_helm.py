@@ -0,0 +1,188 @@
+import pulumi
+import pulumi_kubernetes as k8s
+from pulumi_kubernetes import helm
+from typing import Optional, Dict, Any
+from dataclasses import dataclass
+import os
+import sys
+
+# Add the pulumi directory to the Python path for the shared utilities
+pulumi_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if pulumi_dir not in sys.path:
+    sys.path.append(pulumi_dir)
+
+from utilities import CommonUtilities, ConfigLoader, HelmUtilities
+
+
+# Cluster utilization, precomputed so dashboards read a handful of series instead of every raw one
+RECORDING_RULES = {
+    "groups": [
+        {
+            "name": "node-utilization",
+            "rules": [
+                {
+                    "record": "instance:node_cpu_utilisation:rate5m",
+                    "expr": '1 - avg without (cpu) (sum without (mode) '
+                            '(rate(node_cpu_seconds_total{mode=~"idle|iowait|steal"}[5m])))',
+                },
+                {
+                    "record": "instance:node_memory_utilisation:ratio",
+                    "expr": "1 - node_memory_MemAvailable_bytes / node_memory_MemTotal_bytes",
+                },
+            ],
+        },
+        {
+            "name": "cluster-utilization",
+            "rules": [
+                {
+                    "record": "cluster:node_cpu_utilisation:ratio",
+                    "expr": "avg(instance:node_cpu_utilisation:rate5m)",
+                },
+                {
+                    "record": "cluster:node_memory_utilisation:ratio",
+                    "expr": "1 - sum(node_memory_MemAvailable_bytes) / sum(node_memory_MemTotal_bytes)",
+                },
+                {
+                    "record": "namespace:container_cpu_usage_seconds:sum_rate5m",
+                    "expr": 'sum by (namespace) (rate(container_cpu_usage_seconds_total{container!="", image!=""}[5m]))',
+                },
+                {
+                    "record": "namespace:container_memory_working_set_bytes:sum",
+                    "expr": 'sum by (namespace) (container_memory_working_set_bytes{container!="", image!=""})',
+                },
+                {
+                    "record": "cluster:cpu_requests:ratio",
+                    "expr": 'sum(kube_pod_container_resource_requests{resource="cpu"}) '
+                            '/ sum(kube_node_status_allocatable{resource="cpu"})',
+                },
+                {
+                    "record": "cluster:memory_requests:ratio",
+                    "expr": 'sum(kube_pod_container_resource_requests{resource="memory"}) '
+                            '/ sum(kube_node_status_allocatable{resource="memory"})',
+                },
+            ],
+        },
+    ],
+}
+
+
+@dataclass
+class PrometheusHelmConfig:
+    namespace: Optional[str] = "monitoring"
+    chart_version: Optional[str] = "25.8.0"
+    image_tag: Optional[str] = "v2.48.0"
+    values: Optional[Dict[str, Any]] = None
+    # Storage: blocks are deleted by age or once the TSDB exceeds the size, whichever comes first
+    retention: Optional[str] = "15d"
+    retention_size: Optional[str] = None
+    storage_size: Optional[str] = "10Gi"
+    wal_compression: Optional[bool] = True
+    max_block_duration: Optional[str] = None  # Smaller blocks keep compaction memory spikes down
+    scrape_interval: Optional[str] = "30s"
+    # Resources; GOMEMLIMIT is set just below the memory limit so the Go GC works before the OOM killer does
+    memory_request: Optional[str] = "512Mi"
+    memory_limit: Optional[str] = "1Gi"
+    cpu_request: Optional[str] = "250m"
+    recording_rules: Optional[bool] = True
+
+    @classmethod
+    def from_environment(cls, environment: str) -> 'PrometheusHelmConfig':
+        """Load configuration from environment-specific YAML file."""
+        return ConfigLoader.load(cls, 'prometheus-helm', environment)
+
+
+class PrometheusHelm(pulumi.ComponentResource):
+    def __init__(self, name: str, config: PrometheusHelmConfig, opts: Optional[pulumi.ResourceOptions] = None):
+        super().__init__("prometheus:helm", name, {}, opts)
+
+        namespace = config.namespace or "monitoring"
+
+        # Create namespace
+        self.namespace = k8s.core.v1.Namespace(
+            f"{name}-namespace",
+            metadata=k8s.meta.v1.ObjectMetaArgs(
+                name=namespace,
+                labels={
+                    "app.kubernetes.io/name": "prometheus",
+                    "app.kubernetes.io/instance": name,
+                },
+            ),
+            opts=pulumi.ResourceOptions(parent=self)
+        )
+
+        # Chart defaults, then the environment's settings, then raw value overrides
+        default_values = {
+            "alertmanager": {"enabled": False},
+            "prometheus-pushgateway": {"enabled": False},
+            "kube-state-metrics": {"enabled": True},
+            "prometheus-node-exporter": {"enabled": True},
+            "server": {
+                # Fixed object names: the chart would otherwise derive them from the generated release name
+                "fullnameOverride": "prometheus-server",
+                "service": {"type": "ClusterIP", "servicePort": 80},
+            },
+        }
+        values = HelmUtilities.merge_values(default_values, self._get_environment_values(config), config.values)
+
+        # Deploy Prometheus using Helm
+        self.release = helm.v3.Release(
+            f"{name}-prometheus",
+            **HelmUtilities.get_chart_args("https://prometheus-community.github.io/helm-charts", "prometheus",
+                                           config.chart_version),
+            namespace=namespace,
+            values=values,
+            create_namespace=False,  # We're creating the namespace separately
+            opts=pulumi.ResourceOptions(
+                parent=self,
+                depends_on=[self.namespace],
+            )
+        )
+
+        self.namespace_name = pulumi.Output.from_input(namespace)
+        self.service_name = values["server"]["fullnameOverride"]
+        self.service_port = int(values["server"]["service"]["servicePort"])
+        self.url = f"http://{self.service_name}.{namespace}.svc.cluster.local"
+        if self.service_port != 80:
+            self.url += f":{self.service_port}"
+
+        self.register_outputs({
+            "namespace": self.namespace_name,
+            "url": self.url,
+        })
+
+    @staticmethod
+    def _get_environment_values(config: PrometheusHelmConfig) -> Dict[str, Any]:
+        """Get the server values for the configured retention, storage and resources."""
+        flags = ["web.enable-lifecycle"]
+        flags.append("storage.tsdb.wal-compression" if config.wal_compression else "no-storage.tsdb.wal-compression")
+        if config.max_block_duration:
+            flags.append(f"storage.tsdb.max-block-duration={config.max_block_duration}")
+
+        server = {
+            "image": {"tag": config.image_tag},
+            "retention": config.retention or "15d",
+            "extraFlags": flags,
+            "global": {
+                "scrape_interval": config.scrape_interval or "30s",
+                "evaluation_interval": config.scrape_interval or "30s",
+            },
+            "persistentVolume": {"enabled": True, "size": config.storage_size or "10Gi"},
+            "resources": {
+                "requests": {"cpu": config.cpu_request or "250m", "memory": config.memory_request or "512Mi"},
+                "limits": {"memory": config.memory_limit or "1Gi"},
+            },
+        }
+        if config.retention_size:
+            server["retentionSize"] = config.retention_size
+        if config.memory_limit:
+            gomemlimit = int(CommonUtilities.parse_memory(config.memory_limit) * 0.9)
+            server["env"] = [{"name": "GOMEMLIMIT", "value": str(gomemlimit)}]
+
+        values = {"server": server}
+        if config.recording_rules:
+            values["serverFiles"] = {"recording_rules.yml": RECORDING_RULES}
+        return values
+
+    def get_service_url(self) -> pulumi.Output[str]:
+        """Get the in-cluster URL of the Prometheus server (the Grafana data source URL)."""
+        return pulumi.Output.from_input(self.url)
@@ -1,11 +1,37 @@
 from .common_utilities import CommonUtilities, CommonLabels, EnvironmentConfig
 from .minikube_utilities import MinikubeUtilities
 from .helm_utilities import HelmUtilities
+from .config_loader import ConfigLoader, ConfigValidationError
+from .container_runtime import ContainerRuntime
+from .readiness import MetricsApiReadiness, NodeReadiness
+from .image_cache import ImageCache
+from .chart_cache import ChartCache
+from .grafana_bundle import GrafanaBundle
+from .kind_pool import KindClusterPool
+from .kind_snapshot import KindSnapshot
+from .kubeconfig_cache import KubeconfigCache
+from .k3s_nodes import K3sNodes
+from .registry_mirror import RegistryMirror
+from .resource_sizing import ResourceSizingPolicy
 
 __all__ = [
     "CommonUtilities",
     "CommonLabels", 
     "EnvironmentConfig",
     "MinikubeUtilities",
-    "HelmUtilities"
+    "HelmUtilities",
+    "ConfigLoader",
+    "ConfigValidationError",
+    "ContainerRuntime",
+    "NodeReadiness",
+    "MetricsApiReadiness",
+    "ImageCache",
+    "ChartCache",
+    "GrafanaBundle",
+    "KindClusterPool",
+    "KindSnapshot",
+    "KubeconfigCache",
+    "K3sNodes",
+    "RegistryMirror",
+    "ResourceSizingPolicy",
 ]
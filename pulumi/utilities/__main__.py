@@ -0,0 +1,24 @@
+"""
+Run a utilities module's command line: ``python -m utilities <module> [args...]``.
+
+Pulumi programs use this (through ``CommonUtilities.get_utility_command``) to
+run cache and readiness helpers at apply time instead of at plan time.
+"""
+
+import importlib
+import sys
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m utilities <module> [args...]")
+        sys.exit(1)
+
+    module_name = sys.argv[1]
+    sys.argv = [f"utilities {module_name}", *sys.argv[2:]]
+    module = importlib.import_module(f"utilities.{module_name}")
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Local Helm chart cache.
+
+Chart archives are downloaded once per repository, chart and version, checked
+against the sha256 digest published in the repository's ``index.yaml`` and
+kept under the shared cache directory. Helm releases then install from the
+local archive instead of resolving the repository index and downloading the
+chart on every preview and update, so deployments are deterministic and work
+offline once the cache is warm.
+
+Cached archives are checked against their recorded digest whenever they are
+used; a corrupted archive is downloaded again.
+
+Releases do not point into the cache itself, whose location differs between
+machines: ``link`` places the archive at ``<repo-hash>/<chart>-<version>.tgz``
+under a project directory, so the path a release installs from only depends
+on the repository, chart and version.
+
+Run it as ``python -m utilities chart_cache``:
+
+    ensure --repo URL --chart NAME --version V   cache a chart and print its archive path
+    link --repo URL --chart NAME --version V --dir DIR
+                                                 cache a chart, link it under DIR and print the link
+    list                                         show cached charts
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import urllib.parse
+import urllib.request
+from typing import Dict, Any, Optional
+
+import yaml
+
+from .common_utilities import CommonUtilities
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_key(repo: str, chart: str, version: str) -> str:
+    """Get the cache key of a chart version, e.g. ``https://grafana.github.io/helm-charts grafana 7.0.0``."""
+    return f"{repo.rstrip('/')} {chart} {version}"
+
+
+def get_archive_name(repo: str, chart: str, version: str) -> str:
+    """Get the relative archive path of a chart version, ``<repo-hash>/<chart>-<version>.tgz``."""
+    repo_dir = hashlib.sha256(repo.rstrip("/").encode()).hexdigest()[:16]
+    return os.path.join(repo_dir, f"{chart}-{version}.tgz")
+
+
+class ChartCache:
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or CommonUtilities.get_cache_dir("charts")
+        self.index_file = os.path.join(self.cache_dir, "index.json")
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.index_file):
+            return {}
+        with open(self.index_file, "r") as f:
+            return json.load(f)
+
+    def _write_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+    def list_entries(self) -> Dict[str, Dict[str, Any]]:
+        """Get the cached charts keyed by ``repo chart version``."""
+        return self._read_index()
+
+    def get_archive(self, repo: str, chart: str, version: str) -> Optional[str]:
+        """Get the verified cached archive of a chart version, if any."""
+        entry = self._read_index().get(get_key(repo, chart, version))
+        if entry:
+            archive = os.path.join(self.cache_dir, entry["archive"])
+            if os.path.exists(archive) and _sha256(archive) == entry["digest"]:
+                return archive
+        return None
+
+    def _resolve(self, repo: str, chart: str, version: str) -> Dict[str, Any]:
+        """Find a chart version's download URL and digest in the repository index."""
+        index_url = f"{repo.rstrip('/')}/index.yaml"
+        try:
+            with urllib.request.urlopen(index_url, timeout=60) as response:
+                index = yaml.safe_load(response)
+        except OSError as e:
+            raise RuntimeError(f"Failed to fetch {index_url}: {e}") from e
+
+        for entry in (index.get("entries") or {}).get(chart) or []:
+            if str(entry.get("version")) == version:
+                if not entry.get("urls"):
+                    break
+                return {"url": urllib.parse.urljoin(f"{repo.rstrip('/')}/", entry["urls"][0]),
+                        "digest": entry.get("digest")}
+        raise RuntimeError(f"Chart {chart} {version} not found in {repo}")
+
+    def ensure(self, repo: str, chart: str, version: str) -> str:
+        """Get the archive of a chart version, downloading and verifying it on first use."""
+        archive = self.get_archive(repo, chart, version)
+        if archive:
+            return archive
+
+        with CommonUtilities.file_lock(os.path.join(self.cache_dir, ".lock")):
+            # Another process may have filled the cache while we waited
+            archive = self.get_archive(repo, chart, version)
+            if archive:
+                return archive
+
+            resolved = self._resolve(repo, chart, version)
+            archive_name = get_archive_name(repo, chart, version)
+            archive = os.path.join(self.cache_dir, archive_name)
+            os.makedirs(os.path.dirname(archive), exist_ok=True)
+
+            print(f"Downloading chart {chart} {version} into the chart cache", file=sys.stderr)
+            tmp_file = f"{archive}.{os.getpid()}.tmp"
+            try:
+                with urllib.request.urlopen(resolved["url"], timeout=60) as response, open(tmp_file, "wb") as f:
+                    shutil.copyfileobj(response, f, length=1024 * 1024)
+            except OSError as e:
+                if os.path.exists(tmp_file):
+                    os.unlink(tmp_file)
+                raise RuntimeError(f"Failed to download {resolved['url']}: {e}") from e
+
+            digest = _sha256(tmp_file)
+            if resolved["digest"] and digest != resolved["digest"]:
+                os.unlink(tmp_file)
+                raise RuntimeError(f"Chart {chart} {version} digest mismatch: "
+                                   f"expected {resolved['digest']}, got {digest}")
+            os.replace(tmp_file, archive)
+
+            index = self._read_index()
+            index[get_key(repo, chart, version)] = {
+                "archive": archive_name, "digest": digest, "url": resolved["url"], "cached_at": int(time.time())
+            }
+            self._write_index(index)
+        return archive
+
+    def link(self, repo: str, chart: str, version: str, target_dir: str) -> str:
+        """Cache a chart version and place its archive under ``target_dir``; returns the linked path."""
+        archive = self.ensure(repo, chart, version)
+        target = os.path.join(target_dir, get_archive_name(repo, chart, version))
+        if os.path.exists(target) and _sha256(target) == _sha256(archive):
+            return target
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_file = f"{target}.{os.getpid()}.tmp"
+        try:
+            os.link(archive, tmp_file)
+        except OSError:
+            # Different filesystem, or no hard links: copy instead
+            shutil.copyfile(archive, tmp_file)
+        os.replace(tmp_file, target)
+        return target
+
+
+def main():
+    """Manage the chart cache from the command line."""
+    parser = argparse.ArgumentParser(description="Local Helm chart cache")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    ensure_parser = subparsers.add_parser("ensure", help="Cache a chart version")
+    ensure_parser.add_argument("--repo", required=True)
+    ensure_parser.add_argument("--chart", required=True)
+    ensure_parser.add_argument("--version", required=True)
+    link_parser = subparsers.add_parser("link", help="Cache a chart version and link it under a directory")
+    link_parser.add_argument("--repo", required=True)
+    link_parser.add_argument("--chart", required=True)
+    link_parser.add_argument("--version", required=True)
+    link_parser.add_argument("--dir", required=True)
+    subparsers.add_parser("list", help="List cached charts")
+    args = parser.parse_args()
+
+    cache = ChartCache()
+    try:
+        if args.action == "ensure":
+            print(cache.ensure(args.repo, args.chart, args.version))
+        elif args.action == "link":
+            print(cache.link(args.repo, args.chart, args.version, args.dir))
+        else:
+            for key, entry in sorted(cache.list_entries().items()):
+                print(f"{key}\t{entry['digest']}\t{entry['archive']}")
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
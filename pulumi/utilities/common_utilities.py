@@ -1,6 +1,9 @@
 import pulumi
 import pulumi_kubernetes as k8s
-from typing import Dict, Optional, Any
+from typing import Dict, Optional, Any, Iterator
+from contextlib import contextmanager
+import os
+import shlex
 from dataclasses import dataclass
 
 
@@ -54,6 +57,62 @@ class CommonUtilities:
         
         return configs.get(environment, configs["nonprod"])
     
+    @staticmethod
+    def get_pulumi_root() -> str:
+        """Get the Pulumi root directory (the one containing ``utilities``)."""
+        return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    
+    @staticmethod
+    def get_utility_command(module: str, *args: str) -> str:
+        """Get a shell command that runs a utilities module with ``python`` from ``PATH``.
+        
+        The interpreter is resolved when the command runs instead of being
+        embedded, so the command (a Pulumi input) is the same on every machine,
+        virtualenv and Python version. Run the command from
+        ``get_pulumi_root()`` so the module resolves.
+        """
+        parts = ["python", "-m", "utilities", module, *args]
+        return " ".join(shlex.quote(part) for part in parts)
+    
+    @staticmethod
+    def parse_memory(value: str) -> int:
+        """Parse a memory quantity such as ``512Mi``, ``2Gi``, ``1G`` or ``1048576`` into bytes."""
+        value = str(value).strip()
+        units = {"Ki": 2**10, "Mi": 2**20, "Gi": 2**30, "Ti": 2**40,
+                 "k": 10**3, "K": 10**3, "M": 10**6, "G": 10**9, "T": 10**12}
+        for suffix in sorted(units, key=len, reverse=True):
+            if value.endswith(suffix):
+                return int(float(value[:-len(suffix)]) * units[suffix])
+        return int(float(value))
+    
+    @staticmethod
+    def get_cache_dir(subdir: str = "") -> str:
+        """Get (and create) the local cache directory shared by the utilities.
+        
+        Defaults to ``~/.cache/iac-mono-repo``; set ``IAC_CACHE_DIR`` to move it.
+        """
+        root = os.environ.get("IAC_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "iac-mono-repo")
+        path = os.path.join(root, subdir) if subdir else root
+        os.makedirs(path, exist_ok=True)
+        return path
+    
+    @staticmethod
+    @contextmanager
+    def file_lock(path: str) -> Iterator[None]:
+        """Hold an exclusive lock on ``path`` so concurrent runs on one host serialize."""
+        with open(path, "a") as f:
+            try:
+                import fcntl
+            except ImportError:
+                # No advisory locks on Windows; runs there are not serialized
+                yield
+                return
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
     @staticmethod
     def create_namespace(
         name: str,
@@ -0,0 +1,114 @@
+import copy
+import dataclasses
+import functools
+import os
+import typing
+from typing import Any, Dict, Tuple, Type, TypeVar
+
+import yaml
+
+
+T = TypeVar("T")
+
+# Parsed and validated config data keyed by file path, tagged with the file's mtime
+_config_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+
+class ConfigValidationError(ValueError):
+    """Raised when an environment config does not match its dataclass."""
+
+
+@functools.lru_cache(maxsize=None)
+def _get_schema(cls: type) -> Dict[str, Tuple[Any, bool]]:
+    """Get ``{field: (type, required)}`` for a config dataclass, built once per class."""
+    hints = typing.get_type_hints(cls)
+    schema = {}
+    for field in dataclasses.fields(cls):
+        required = field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+        schema[field.name] = (hints.get(field.name, Any), required)
+    return schema
+
+
+def _check_type(value: Any, hint: Any) -> bool:
+    """Check a value against a type hint, looking only at the outer container type."""
+    if hint is Any:
+        return True
+    origin = typing.get_origin(hint)
+    if origin is typing.Union:
+        return any(_check_type(value, arg) for arg in typing.get_args(hint))
+    if hint is type(None):
+        return value is None
+    if origin is not None:
+        return isinstance(value, origin)
+    if hint is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if hint is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, hint)
+
+
+class ConfigLoader:
+    @staticmethod
+    def get_config_dir(package: str) -> str:
+        """Get the configs directory of a package under ``pulumi/packages``."""
+        pulumi_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return os.path.join(pulumi_root, "packages", package, "configs")
+
+    @staticmethod
+    def validate(cls: Type[T], data: Dict[str, Any], source: str = "config") -> None:
+        """Validate config data against a dataclass's fields and type hints."""
+        if not isinstance(data, dict):
+            raise ConfigValidationError(f"{source}: expected a mapping, got {type(data).__name__}")
+
+        schema = _get_schema(cls)
+        errors = []
+        for key in sorted(set(data) - set(schema)):
+            errors.append(f"unknown field '{key}'")
+        for key, (hint, required) in schema.items():
+            if key not in data:
+                if required:
+                    errors.append(f"missing required field '{key}'")
+            elif not _check_type(data[key], hint):
+                errors.append(f"field '{key}' should be {hint}, got {type(data[key]).__name__}")
+
+        if errors:
+            raise ConfigValidationError(f"{source}: " + "; ".join(errors))
+
+    @staticmethod
+    def load_file(cls: Type[T], config_file: str) -> T:
+        """Load a config dataclass from a YAML file, reusing the parse while the file is unchanged."""
+        if not os.path.exists(config_file):
+            raise FileNotFoundError(f"Configuration file not found: {config_file}")
+
+        mtime = os.stat(config_file).st_mtime_ns
+        cached = _config_cache.get(config_file)
+        if cached is None or cached[0] != mtime:
+            with open(config_file, 'r') as f:
+                config_data = yaml.safe_load(f) or {}
+            ConfigLoader.validate(cls, config_data, config_file)
+            _config_cache[config_file] = (mtime, config_data)
+            cached = _config_cache[config_file]
+
+        # Configs are mutable dataclasses, so every caller gets its own copy
+        return cls(**copy.deepcopy(cached[1]))
+
+    @staticmethod
+    def load(cls: Type[T], package: str, environment: str) -> T:
+        """Load a package's config for an environment."""
+        config_file = os.path.join(ConfigLoader.get_config_dir(package), f"{environment}.yaml")
+        return ConfigLoader.load_file(cls, config_file)
+
+    @staticmethod
+    def preload(cls: Type[T], package: str) -> Dict[str, T]:
+        """Load every environment config of a package in one pass, keyed by environment."""
+        config_dir = ConfigLoader.get_config_dir(package)
+        configs = {}
+        for entry in sorted(os.scandir(config_dir), key=lambda e: e.name):
+            if entry.is_file() and entry.name.endswith(".yaml"):
+                configs[entry.name[:-len(".yaml")]] = ConfigLoader.load_file(cls, entry.path)
+        return configs
+
+    @staticmethod
+    def clear_cache() -> None:
+        """Forget every parsed config."""
+        _config_cache.clear()
@@ -0,0 +1,252 @@
+"""
+Container runtime shared by the Kind and K3s tooling.
+
+The runtime (docker or podman) is detected once per process along with the
+capabilities that change how clusters must be run: rootless mode, cgroup
+version and storage driver. ``CONTAINER_RUNTIME``, or else
+``KIND_EXPERIMENTAL_PROVIDER`` as for kind, selects the runtime; without
+either docker is preferred when present. Pulumi programs never detect the
+runtime themselves, so they preview on hosts without one: their apply-time
+commands detect it, with ``ContainerRuntime.get_preferred_environment()``
+passing on a runtime the program asks for.
+
+Container create/exec/inspect/delete are available one at a time or as async
+batches that run concurrently, so multi-node clusters are handled with one
+round of parallel runtime calls instead of one call after another.
+
+Run it as ``python -m utilities container_runtime`` to print the detected
+runtime, or as ``python -m utilities container_runtime kind ARGS...`` to run
+kind against it.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class RuntimeInfo:
+    name: str  # "docker" or "podman"
+    version: str = ""
+    rootless: bool = False
+    cgroup_version: int = 2
+    storage_driver: str = ""
+
+
+# docker reports binary units (MiB), podman decimal ones (MB)
+SIZE_UNITS = {"b": 1, "kb": 10**3, "mb": 10**6, "gb": 10**9, "kib": 2**10, "mib": 2**20, "gib": 2**30}
+
+
+def parse_size(value: str) -> float:
+    """Parse a size as printed by ``stats``, e.g. ``123.4MiB`` or ``1.2GB``, into bytes."""
+    match = re.match(r"\s*([\d.]+)\s*([a-zA-Z]*)", value)
+    if not match:
+        return 0.0
+    return float(match.group(1)) * SIZE_UNITS.get(match.group(2).lower() or "b", 1)
+
+
+@dataclass
+class ContainerSpec:
+    name: str
+    image: str
+    options: List[str] = field(default_factory=list)  # Extra ``run`` flags
+    command: List[str] = field(default_factory=list)
+
+
+def _host_cgroup_version() -> int:
+    return 2 if os.path.exists("/sys/fs/cgroup/cgroup.controllers") else 1
+
+
+def _parse_info(name: str, info: Dict[str, Any]) -> RuntimeInfo:
+    """Build a ``RuntimeInfo`` from ``<runtime> info`` JSON output."""
+    if name == "podman":
+        host = info.get("host") or {}
+        return RuntimeInfo(
+            name=name,
+            version=(info.get("version") or {}).get("Version", ""),
+            rootless=bool((host.get("security") or {}).get("rootless")),
+            cgroup_version=2 if host.get("cgroupVersion") == "v2" else 1,
+            storage_driver=(info.get("store") or {}).get("graphDriverName", ""),
+        )
+    return RuntimeInfo(
+        name=name,
+        version=info.get("ServerVersion", ""),
+        rootless=any("rootless" in opt for opt in info.get("SecurityOptions") or []),
+        cgroup_version=int(info.get("CgroupVersion") or _host_cgroup_version()),
+        storage_driver=info.get("Driver", ""),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def detect_runtime(preferred: Optional[str] = None) -> RuntimeInfo:
+    """Detect the container runtime and its capabilities, once per process.
+
+    ``preferred`` wins when that runtime is installed; otherwise
+    ``CONTAINER_RUNTIME``, ``KIND_EXPERIMENTAL_PROVIDER``, then docker, then podman.
+    """
+    candidates = [preferred, os.environ.get("CONTAINER_RUNTIME"), os.environ.get("KIND_EXPERIMENTAL_PROVIDER"),
+                  "docker", "podman"]
+    name = next((c for c in candidates if c and shutil.which(c)), None)
+    if name is None:
+        raise RuntimeError("No container runtime found: install docker or podman")
+
+    try:
+        result = subprocess.run([name, "info", "--format", "{{json .}}"],
+                                capture_output=True, text=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        result = None
+    if result is None or result.returncode != 0:
+        # The daemon is down or unreachable; later calls will report the real error
+        return RuntimeInfo(name=name, cgroup_version=_host_cgroup_version())
+    return _parse_info(name, json.loads(result.stdout))
+
+
+class ContainerRuntime:
+    def __init__(self, info: Optional[RuntimeInfo] = None, concurrency: int = 8):
+        self._info = info
+        self.concurrency = concurrency
+
+    @property
+    def info(self) -> RuntimeInfo:
+        """The runtime's capabilities, detected on first use."""
+        if self._info is None:
+            self._info = detect_runtime()
+        return self._info
+
+    @property
+    def name(self) -> str:
+        return self.info.name
+
+    def run(self, *args: str, input: Optional[str] = None, stdin=None, stdout=None,
+            check: bool = False) -> subprocess.CompletedProcess:
+        """Run a runtime subcommand, capturing its output.
+
+        ``stdin``/``stdout`` take open binary files for streaming archives;
+        otherwise output is captured as text.
+        """
+        if stdin is not None or stdout is not None:
+            result = subprocess.run([self.name, *args], stdin=stdin, stdout=stdout or subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+            stderr = result.stderr.decode()
+        else:
+            result = subprocess.run([self.name, *args], input=input, capture_output=True, text=True)
+            stderr = result.stderr
+        if check and result.returncode != 0:
+            raise RuntimeError(f"{self.name} {' '.join(args[:2])} failed: {stderr.strip()}")
+        return result
+
+    async def run_async(self, *args: str, check: bool = True) -> Tuple[int, str, str]:
+        """Run a runtime subcommand without blocking the event loop."""
+        process = await asyncio.create_subprocess_exec(
+            self.name, *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        if check and process.returncode != 0:
+            raise RuntimeError(f"{self.name} {' '.join(args[:2])} failed: {stderr.decode().strip()}")
+        return process.returncode, stdout.decode(), stderr.decode()
+
+    async def create(self, spec: ContainerSpec) -> str:
+        """Start a detached container; returns its ID."""
+        _, stdout, _ = await self.run_async("run", "--detach", "--name", spec.name, *spec.options,
+                                            spec.image, *spec.command)
+        return stdout.strip()
+
+    async def exec(self, name: str, command: Sequence[str]) -> str:
+        """Run a command in a container; returns its stdout."""
+        _, stdout, _ = await self.run_async("exec", name, *command)
+        return stdout
+
+    async def inspect(self, name: str) -> Optional[Dict[str, Any]]:
+        """Inspect a container, or get None when it does not exist."""
+        returncode, stdout, _ = await self.run_async("inspect", name, check=False)
+        return json.loads(stdout)[0] if returncode == 0 else None
+
+    async def delete(self, name: str) -> None:
+        """Remove a container and its anonymous volumes; missing containers are ignored."""
+        await self.run_async("rm", "--force", "--volumes", name, check=False)
+
+    def _gather(self, coroutines) -> List[Any]:
+        async def gather():
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def limited(coroutine):
+                async with semaphore:
+                    return await coroutine
+
+            return await asyncio.gather(*(limited(c) for c in coroutines))
+
+        return asyncio.run(gather())
+
+    def create_many(self, specs: Sequence[ContainerSpec]) -> List[str]:
+        """Create containers concurrently; returns their IDs."""
+        return self._gather([self.create(spec) for spec in specs])
+
+    def exec_many(self, commands: Sequence[Tuple[str, Sequence[str]]]) -> List[str]:
+        """Run ``(container, command)`` pairs concurrently; returns their stdout."""
+        return self._gather([self.exec(name, command) for name, command in commands])
+
+    def inspect_many(self, names: Sequence[str]) -> List[Optional[Dict[str, Any]]]:
+        """Inspect containers concurrently."""
+        return self._gather([self.inspect(name) for name in names])
+
+    def delete_many(self, names: Sequence[str]) -> None:
+        """Remove containers concurrently."""
+        self._gather([self.delete(name) for name in names])
+
+    def list_containers(self, label: str) -> List[str]:
+        """Get the names of all containers (running or not) carrying a label filter."""
+        result = self.run("ps", "-a", "--filter", f"label={label}", "--format", "{{.Names}}", check=True)
+        return sorted(result.stdout.split())
+
+    def stats(self, names: Sequence[str]) -> Dict[str, Dict[str, float]]:
+        """Get current memory (bytes) and CPU (percent of one core) per container."""
+        result = self.run("stats", "--no-stream", "--format", "{{json .}}", *names, check=True)
+        stats = {}
+        for line in result.stdout.splitlines():
+            entry = json.loads(line)
+            name = entry.get("Name") or entry.get("name")
+            stats[name] = {
+                "memory_bytes": parse_size(str(entry.get("MemUsage", "0")).split("/")[0]),
+                "cpu_percent": float(str(entry.get("CPUPerc", "0")).rstrip("%") or 0),
+            }
+        return stats
+
+    @staticmethod
+    def get_preferred_environment(preferred: Optional[str] = None) -> Dict[str, str]:
+        """Get the environment for apply-time commands, which detect the runtime themselves (``preferred`` first)."""
+        return {"CONTAINER_RUNTIME": preferred} if preferred else {}
+
+    def get_environment(self) -> Dict[str, str]:
+        """Get the environment that makes utilities and kind use this runtime."""
+        return {"CONTAINER_RUNTIME": self.name, "KIND_EXPERIMENTAL_PROVIDER": self.name}
+
+    def run_kind(self, *args: str, input: Optional[str] = None, check: bool = False) -> subprocess.CompletedProcess:
+        """Run a kind subcommand against this runtime, capturing its output."""
+        result = subprocess.run(["kind", *args], input=input, capture_output=True, text=True,
+                                env={**os.environ, **self.get_environment()})
+        if check and result.returncode != 0:
+            raise RuntimeError(f"kind {' '.join(args[:2])} failed: {result.stderr.strip()}")
+        return result
+
+
+def main():
+    """Print the detected container runtime, or run kind against it."""
+    try:
+        if sys.argv[1:2] == ["kind"]:
+            result = subprocess.run(["kind", *sys.argv[2:]], env={**os.environ, **ContainerRuntime().get_environment()})
+            sys.exit(result.returncode)
+        print(json.dumps(asdict(detect_runtime()), indent=2))
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Pre-built Grafana plugin and dashboard bundles.
+
+Grafana normally downloads its plugins when a pod starts, so every new
+replica depends on grafana.com and starts slower the more plugins it has. A
+bundle holds the plugins (unpacked) and the dashboard JSON files in a small
+local image, ``localhost/grafana-bundle:<hash>``, that an init container
+copies into the Grafana pod. The tag is a content hash of the plugin list and
+the dashboards, so a changed bundle rolls the pods and an unchanged one is
+never rebuilt. Plugin archives are downloaded once per architecture (the
+host's, which the local cluster nodes share) into the shared cache; after that
+bundles build offline.
+
+The image is never pulled from a registry: it is side-loaded into local Kind
+or K3s clusters through the image cache.
+
+Run it at apply time as ``python -m utilities grafana_bundle``:
+
+    build [--plugin ID:VERSION...] [--dashboards DIR] [--kind NAME | --k3s NAME]
+                                                      build the bundle image (and side-load it), print its reference
+    list                                              show cached plugin archives
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import urllib.request
+import zipfile
+from typing import List, Optional
+
+from .common_utilities import CommonUtilities
+from .container_runtime import ContainerRuntime
+from .image_cache import ImageCache
+from .k3s_airgap import get_arch
+from .k3s_nodes import K3sNodes
+
+
+BUNDLE_IMAGE = "localhost/grafana-bundle"
+BASE_IMAGE = "busybox:1.36"
+PLUGIN_URL = "https://grafana.com/api/plugins/{plugin_id}/versions/{version}/download?os=linux&arch={arch}"
+
+
+def parse_plugin(plugin: str) -> tuple:
+    """Split ``ID:VERSION`` into its parts."""
+    plugin_id, _, version = plugin.partition(":")
+    if not plugin_id or not version:
+        raise ValueError(f"Plugin must be given as ID:VERSION, got '{plugin}'")
+    return plugin_id, version
+
+
+def get_dashboard_files(dashboards_dir: Optional[str]) -> List[str]:
+    """Get the dashboard JSON files of a directory, sorted by name."""
+    if not dashboards_dir or not os.path.isdir(dashboards_dir):
+        return []
+    return sorted(os.path.join(dashboards_dir, name) for name in os.listdir(dashboards_dir) if name.endswith(".json"))
+
+
+def get_image_ref(plugins: List[str], dashboards_dir: Optional[str], arch: Optional[str] = None) -> str:
+    """Get the bundle image reference, tagged with the content hash of its plugins, dashboards and architecture."""
+    digest = hashlib.sha256()
+    digest.update(f"arch {arch or get_arch()}\n".encode())
+    for plugin in sorted(plugins):
+        digest.update(f"plugin {plugin}\n".encode())
+    for path in get_dashboard_files(dashboards_dir):
+        digest.update(f"dashboard {os.path.basename(path)}\n".encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return f"{BUNDLE_IMAGE}:{digest.hexdigest()[:16]}"
+
+
+class GrafanaBundle:
+    def __init__(self, cache_dir: Optional[str] = None, runtime: Optional[ContainerRuntime] = None,
+                 arch: Optional[str] = None):
+        self.cache_dir = cache_dir or CommonUtilities.get_cache_dir("grafana-plugins")
+        self.runtime = runtime or ContainerRuntime()
+        self.arch = arch or get_arch()
+
+    def list_plugins(self) -> List[str]:
+        """Get the cached plugin archives as ``ID:VERSION (ARCH)``."""
+        plugins = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".zip"):
+                plugin_id, version, arch = name[:-len(".zip")].split("@")
+                plugins.append(f"{plugin_id}:{version} ({arch})")
+        return sorted(plugins)
+
+    def get_plugin(self, plugin: str) -> str:
+        """Get a plugin's zip archive for this architecture, downloading it on first use."""
+        plugin_id, version = parse_plugin(plugin)
+        archive = os.path.join(self.cache_dir, f"{plugin_id}@{version}@{self.arch}.zip")
+        if os.path.exists(archive):
+            return archive
+
+        with CommonUtilities.file_lock(os.path.join(self.cache_dir, ".lock")):
+            if os.path.exists(archive):
+                return archive
+            url = PLUGIN_URL.format(plugin_id=plugin_id, version=version, arch=self.arch)
+            print(f"Downloading Grafana plugin {plugin} into the plugin cache", file=sys.stderr)
+            tmp_file = f"{archive}.{os.getpid()}.tmp"
+            try:
+                with urllib.request.urlopen(url, timeout=120) as response, open(tmp_file, "wb") as f:
+                    shutil.copyfileobj(response, f, length=1024 * 1024)
+            except OSError as e:
+                if os.path.exists(tmp_file):
+                    os.unlink(tmp_file)
+                raise RuntimeError(f"Failed to download {url}: {e}") from e
+            if not zipfile.is_zipfile(tmp_file):
+                os.unlink(tmp_file)
+                raise RuntimeError(f"Download of Grafana plugin {plugin} is not a zip archive")
+            os.replace(tmp_file, archive)
+        return archive
+
+    def build(self, plugins: List[str], dashboards_dir: Optional[str] = None) -> str:
+        """Build the bundle image unless the runtime already has it; returns its reference."""
+        ref = get_image_ref(plugins, dashboards_dir, self.arch)
+        if self.runtime.run("image", "inspect", ref).returncode == 0:
+            return ref
+
+        archives = [self.get_plugin(plugin) for plugin in plugins]
+        with tempfile.TemporaryDirectory(prefix="grafana-bundle-") as context:
+            with tarfile.open(os.path.join(context, "bundle.tar"), "w") as bundle:
+                for archive in archives:
+                    # Plugin zips hold a single top-level directory named after the plugin
+                    with zipfile.ZipFile(archive) as plugin_zip:
+                        plugin_zip.extractall(os.path.join(context, "plugins"))
+                if archives:
+                    bundle.add(os.path.join(context, "plugins"), arcname="plugins")
+                for path in get_dashboard_files(dashboards_dir):
+                    bundle.add(path, arcname=f"dashboards/{os.path.basename(path)}")
+            with open(os.path.join(context, "Dockerfile"), "w") as f:
+                f.write(f"FROM {BASE_IMAGE}\nADD bundle.tar /bundle/\n")
+            with open(os.path.join(context, ".dockerignore"), "w") as f:
+                f.write("plugins\n")
+            print(f"Building {ref}", file=sys.stderr)
+            result = self.runtime.run("build", "-t", ref, context)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to build {ref}: {result.stderr.strip()}")
+        return ref
+
+
+def main():
+    """Build Grafana bundles from the command line."""
+    parser = argparse.ArgumentParser(description="Pre-built Grafana plugin and dashboard bundles")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    build_parser = subparsers.add_parser("build", help="Build the bundle image and print its reference")
+    build_parser.add_argument("--plugin", action="append", default=[], help="ID:VERSION (repeatable)")
+    build_parser.add_argument("--dashboards", help="Directory of dashboard JSON files")
+    target = build_parser.add_mutually_exclusive_group()
+    target.add_argument("--kind", help="Side-load the image into this Kind cluster")
+    target.add_argument("--k3s", help="Side-load the image into this K3s cluster")
+    subparsers.add_parser("list", help="List cached plugin archives")
+    args = parser.parse_args()
+
+    bundle = GrafanaBundle()
+    try:
+        if args.action == "build":
+            ref = bundle.build(args.plugin, args.dashboards)
+            if args.kind or args.k3s:
+                image_cache = ImageCache(runtime=bundle.runtime)
+                if args.kind:
+                    image_cache.load_into_kind(args.kind, [ref])
+                else:
+                    K3sNodes(bundle.runtime).load_image_archive(args.k3s, image_cache.ensure(ref))
+                    print(f"Loaded {ref} into {args.k3s}", file=sys.stderr)
+            print(ref)
+        else:
+            for plugin in bundle.list_plugins():
+                print(plugin)
+    except (RuntimeError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
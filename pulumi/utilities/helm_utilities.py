@@ -1,4 +1,7 @@
-from typing import Dict, Any, List
+import os
+from typing import Dict, Any, List, Optional
+
+from .common_utilities import CommonUtilities
 
 
 class HelmUtilities:
@@ -20,7 +23,8 @@ class HelmUtilities:
         if environment == "prod":
             return {
                 **base_values,
-                "replicas": 2,
+                # One replica: SQLite on a PVC cannot be shared (GrafanaHelm's high_availability scales out)
+                "replicas": 1,
                 "resources": {
                     "requests": {
                         "memory": "512Mi",
@@ -49,3 +53,42 @@ class HelmUtilities:
             "hostNetwork": False,
             "replicas": 2 if environment == "prod" else 1,
         }
+
+    @staticmethod
+    def get_chart_args(repo: str, chart: str, version: str) -> Dict[str, Any]:
+        """Get the Release chart arguments, installing from the local chart cache.
+
+        The archive is linked into ``.charts`` under the Pulumi root and passed
+        relative to the program directory, so the ``chart`` input depends only
+        on the repository, chart and version and is the same on every machine.
+        Helm reads the chart during preview, so the first preview fills the
+        cache. A chart that cannot be cached fails the deployment rather than
+        switching the release to the remote repository.
+        """
+        from .chart_cache import ChartCache
+
+        charts_dir = os.path.join(CommonUtilities.get_pulumi_root(), ".charts")
+        try:
+            archive = ChartCache().link(repo, chart, version, charts_dir)
+        except RuntimeError as e:
+            raise RuntimeError(f"Chart {chart} {version} from {repo} is not in the chart cache and could not be "
+                               f"downloaded: {e}") from e
+        try:
+            return {"chart": os.path.relpath(archive).replace(os.sep, "/")}
+        except ValueError:
+            # Program and Pulumi root on different Windows drives
+            return {"chart": archive}
+
+    @staticmethod
+    def merge_values(*layers: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Deep-merge Helm values layers; later layers win and lists are replaced, not merged."""
+        merged: Dict[str, Any] = {}
+        for layer in layers:
+            for key, value in (layer or {}).items():
+                if isinstance(value, dict) and isinstance(merged.get(key), dict):
+                    merged[key] = HelmUtilities.merge_values(merged[key], value)
+                elif isinstance(value, dict):
+                    merged[key] = HelmUtilities.merge_values(value)
+                else:
+                    merged[key] = value
+        return merged
@@ -0,0 +1,212 @@
+"""
+Local image-archive cache for cluster bootstrap.
+
+Images are saved once as ``docker save`` archives keyed by image reference
+and digest, and side-loaded into clusters from there the way
+``kind load image-archive`` does. The cache fills itself on first use, so only
+the first run on a host talks to a registry; after that cluster bring-up works
+on air-gapped build hosts.
+
+Tags are mutable, so a cached tag is rechecked against the registry's current
+digest (at most once per ``RECHECK_SECONDS``) and pulled again when it moved.
+Digest-pinned references are never rechecked; an unreachable registry keeps
+the cached archive.
+
+Run it at apply time as ``python -m utilities image_cache``:
+
+    node-image REF              make REF available to the runtime (load or pull)
+    load --name CLUSTER REF...  side-load REFs into every node of a Kind cluster
+    list                        show cached images
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from .common_utilities import CommonUtilities
+from .container_runtime import ContainerRuntime
+
+
+RECHECK_SECONDS = 3600
+
+
+class ImageCache:
+    def __init__(self, cache_dir: Optional[str] = None, runtime: Optional[ContainerRuntime] = None):
+        self.cache_dir = cache_dir or CommonUtilities.get_cache_dir("images")
+        self.runtime = runtime or ContainerRuntime()
+        self.index_file = os.path.join(self.cache_dir, "index.json")
+
+    def _read_index(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.index_file):
+            return {}
+        with open(self.index_file, "r") as f:
+            return json.load(f)
+
+    def _write_index(self, index: Dict[str, Dict[str, Any]]) -> None:
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.index_file)
+
+    def list_entries(self) -> Dict[str, Dict[str, Any]]:
+        """Get the cached images keyed by reference."""
+        return self._read_index()
+
+    def has_local_image(self, ref: str) -> bool:
+        """Check whether the container runtime already has the image."""
+        return self.runtime.run("image", "inspect", ref).returncode == 0
+
+    def _inspect_digests(self, ref: str) -> tuple:
+        """Get a local image's registry digest (None for local builds) and image ID."""
+        result = self.runtime.run("image", "inspect", "--format", "{{json .RepoDigests}}|{{.Id}}", ref)
+        if result.returncode != 0:
+            raise RuntimeError(f"Image not found locally: {ref}: {result.stderr.strip()}")
+        repo_digests, image_id = result.stdout.strip().rsplit("|", 1)
+        digests = json.loads(repo_digests) or []
+        return (digests[0].split("@", 1)[1] if digests else None), image_id
+
+    def get_digest(self, ref: str) -> str:
+        """Get the registry digest of a local image, falling back to its image ID."""
+        repo_digest, image_id = self._inspect_digests(ref)
+        return repo_digest or image_id
+
+    def get_archive(self, ref: str) -> Optional[str]:
+        """Get the cached archive for an image reference, if any."""
+        entry = self._read_index().get(ref)
+        if entry:
+            archive = os.path.join(self.cache_dir, entry["archive"])
+            if os.path.exists(archive):
+                return archive
+        return None
+
+    def get_remote_digest(self, ref: str) -> Optional[str]:
+        """Get the digest a tag currently resolves to in its registry, or None if it cannot be checked."""
+        if shutil.which("skopeo"):
+            result = subprocess.run(["skopeo", "inspect", "--raw", f"docker://{ref}"], capture_output=True)
+            if result.returncode == 0 and result.stdout:
+                return f"sha256:{hashlib.sha256(result.stdout).hexdigest()}"
+        result = self.runtime.run("buildx", "imagetools", "inspect", "--format", "{{json .Manifest}}", ref)
+        if result.returncode == 0:
+            try:
+                return json.loads(result.stdout).get("digest")
+            except ValueError:
+                pass
+        return None
+
+    def _is_current(self, ref: str, entry: Dict[str, Any]) -> bool:
+        """Check that a cached tag still points at the digest it was saved with."""
+        # Digest-pinned refs cannot move; image IDs (local builds) have no registry digest to compare
+        if "@sha256:" in ref or entry.get("local"):
+            return True
+        if time.time() - entry.get("checked_at", entry["cached_at"]) < RECHECK_SECONDS:
+            return True
+        remote_digest = self.get_remote_digest(ref)
+        if remote_digest is None:
+            return True  # Offline: keep serving the cached archive
+        if remote_digest != entry["digest"]:
+            print(f"{ref} moved from {entry['digest']} to {remote_digest}, refreshing the image cache",
+                  file=sys.stderr)
+            return False
+        with CommonUtilities.file_lock(os.path.join(self.cache_dir, ".lock")):
+            index = self._read_index()
+            if ref in index:
+                index[ref]["checked_at"] = int(time.time())
+                self._write_index(index)
+        return True
+
+    def ensure(self, ref: str) -> str:
+        """Get the archive for an image, pulling and saving it on first use or when its tag moved."""
+        archive = self.get_archive(ref)
+        if archive and self._is_current(ref, self._read_index()[ref]):
+            return archive
+
+        if archive or not self.has_local_image(ref):
+            print(f"Pulling {ref} into the image cache", file=sys.stderr)
+            result = self.runtime.run("pull", ref)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to pull {ref}: {result.stderr.strip()}")
+
+        repo_digest, image_id = self._inspect_digests(ref)
+        digest = repo_digest or image_id
+        archive_name = f"{hashlib.sha256(f'{ref}@{digest}'.encode()).hexdigest()[:32]}.tar"
+        archive = os.path.join(self.cache_dir, archive_name)
+
+        if not os.path.exists(archive):
+            tmp_archive = f"{archive}.{os.getpid()}.tmp"
+            result = self.runtime.run("save", "-o", tmp_archive, ref)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to save {ref}: {result.stderr.strip()}")
+            os.replace(tmp_archive, archive)
+
+        with CommonUtilities.file_lock(os.path.join(self.cache_dir, ".lock")):
+            index = self._read_index()
+            now = int(time.time())
+            index[ref] = {"digest": digest, "archive": archive_name, "cached_at": now, "checked_at": now,
+                          "local": repo_digest is None}
+            self._write_index(index)
+
+        return archive
+
+    def ensure_local(self, ref: str) -> None:
+        """Make an image available to the runtime, loading it from the cache if possible."""
+        if self.has_local_image(ref):
+            self.ensure(ref)
+            return
+
+        archive = self.get_archive(ref)
+        if archive:
+            result = self.runtime.run("load", "-i", archive)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to load {ref} from {archive}: {result.stderr.strip()}")
+            return
+
+        self.ensure(ref)
+
+    def load_into_kind(self, cluster_name: str, refs: List[str], workers: int = 4) -> None:
+        """Side-load images into every node of a Kind cluster."""
+        def load(ref: str) -> None:
+            archive = self.ensure(ref)
+            result = self.runtime.run_kind("load", "image-archive", archive, "--name", cluster_name)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to load {ref} into {cluster_name}: {result.stderr.strip()}")
+            print(f"Loaded {ref} into {cluster_name}", file=sys.stderr)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(refs)))) as executor:
+            list(executor.map(load, refs))
+
+
+def main():
+    """Manage the image cache from the command line."""
+    parser = argparse.ArgumentParser(description="Local image-archive cache")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    node_image_parser = subparsers.add_parser("node-image", help="Make an image available to the runtime")
+    node_image_parser.add_argument("ref")
+    load_parser = subparsers.add_parser("load", help="Side-load images into a Kind cluster")
+    load_parser.add_argument("--name", required=True)
+    load_parser.add_argument("refs", nargs="+")
+    subparsers.add_parser("list", help="List cached images")
+    args = parser.parse_args()
+
+    cache = ImageCache()
+    try:
+        if args.action == "node-image":
+            cache.ensure_local(args.ref)
+        elif args.action == "load":
+            cache.load_into_kind(args.name, args.refs)
+        else:
+            for ref, entry in sorted(cache.list_entries().items()):
+                print(f"{ref}\t{entry['digest']}\t{entry['archive']}")
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Air-gapped K3s bootstrap from local image tarballs.
+
+K3s imports every tarball in ``/var/lib/rancher/k3s/agent/images`` into
+containerd before it starts system pods. An airgap directory per K3s version
+and architecture holds the release's ``k3s-airgap-images`` tarball (coredns,
+local-path-provisioner, metrics-server, pause, ...) plus archives of any
+extra images from the image cache. ``K3sNodes`` mounts it into every node, so
+system pods start without registry access. Clusters of the same version share
+the directory, so it holds the union of their extra images.
+
+The directory fills itself on first use: the release tarball is downloaded
+once and kept under the shared cache directory, next to the image cache.
+
+Run it at apply time as ``python -m utilities k3s_airgap``:
+
+    prepare --version V [--node-image REF] [--image REF...]   fill the airgap directory, print its path
+    list                                                      show prepared airgap directories
+"""
+
+import argparse
+import os
+import platform
+import shutil
+import sys
+import urllib.parse
+import urllib.request
+from typing import List, Optional
+
+from .common_utilities import CommonUtilities
+from .image_cache import ImageCache
+
+
+RELEASE_URL = "https://github.com/k3s-io/k3s/releases/download/{release}/k3s-airgap-images-{arch}.tar.zst"
+ARCHITECTURES = {"x86_64": "amd64", "amd64": "amd64", "aarch64": "arm64", "arm64": "arm64"}
+
+
+def get_arch() -> str:
+    """Get the release architecture (``amd64`` or ``arm64``) of this host, as K3s and Grafana name it."""
+    machine = platform.machine().lower()
+    if machine not in ARCHITECTURES:
+        raise RuntimeError(f"Unsupported host architecture {machine}")
+    return ARCHITECTURES[machine]
+
+
+def get_release(kubernetes_version: str) -> str:
+    """Get the K3s release for a Kubernetes version, e.g. ``v1.28.0`` -> ``v1.28.0+k3s1``."""
+    return kubernetes_version if "+k3s" in kubernetes_version else f"{kubernetes_version}+k3s1"
+
+
+def get_airgap_dir(kubernetes_version: str, arch: Optional[str] = None) -> str:
+    """Get the airgap image directory for a Kubernetes version."""
+    release = get_release(kubernetes_version).replace("+", "-")
+    return CommonUtilities.get_cache_dir(os.path.join("k3s-airgap", f"{release}-{arch or get_arch()}"))
+
+
+class K3sAirgap:
+    def __init__(self, image_cache: Optional[ImageCache] = None):
+        self.image_cache = image_cache or ImageCache()
+
+    def _download_release_images(self, kubernetes_version: str, arch: str, airgap_dir: str) -> str:
+        release = get_release(kubernetes_version)
+        url = RELEASE_URL.format(release=urllib.parse.quote(release), arch=arch)
+        target = os.path.join(airgap_dir, os.path.basename(url))
+        if os.path.exists(target):
+            return target
+
+        print(f"Downloading K3s {release} airgap images into the cache", file=sys.stderr)
+        tmp_file = f"{target}.{os.getpid()}.tmp"
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response, open(tmp_file, "wb") as f:
+                shutil.copyfileobj(response, f, length=1024 * 1024)
+        except OSError as e:
+            if os.path.exists(tmp_file):
+                os.unlink(tmp_file)
+            raise RuntimeError(f"Failed to download {url}: {e}") from e
+        os.replace(tmp_file, target)
+        return target
+
+    def prepare(self, kubernetes_version: str, images: Optional[List[str]] = None,
+                node_image: Optional[str] = None, arch: Optional[str] = None) -> str:
+        """Fill the airgap directory for a version and get its path.
+
+        ``images`` are added from the image cache; ``node_image`` (the
+        ``rancher/k3s`` image the nodes run) is made available to the runtime
+        the same way.
+        """
+        arch = arch or get_arch()
+        airgap_dir = get_airgap_dir(kubernetes_version, arch)
+        # The lock lives next to the directory: K3s would try to import anything inside it
+        with CommonUtilities.file_lock(f"{airgap_dir}.lock"):
+            self._download_release_images(kubernetes_version, arch, airgap_dir)
+
+            for ref in images or []:
+                archive = self.image_cache.ensure(ref)
+                target = os.path.join(airgap_dir, os.path.basename(archive))
+                if not os.path.exists(target):
+                    try:
+                        os.link(archive, target)
+                    except OSError:
+                        shutil.copyfile(archive, target)
+
+        if node_image:
+            self.image_cache.ensure_local(node_image)
+        return airgap_dir
+
+    def list_dirs(self) -> List[str]:
+        """Get the prepared airgap directories."""
+        root = CommonUtilities.get_cache_dir("k3s-airgap")
+        return sorted(entry.path for entry in os.scandir(root) if entry.is_dir())
+
+
+def main():
+    """Prepare K3s airgap images from the command line."""
+    parser = argparse.ArgumentParser(description="Air-gapped K3s image tarballs")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    prepare_parser = subparsers.add_parser("prepare", help="Fill the airgap directory for a version")
+    prepare_parser.add_argument("--version", required=True, help="Kubernetes version, e.g. v1.28.0")
+    prepare_parser.add_argument("--node-image", help="K3s node image to make available to the runtime")
+    prepare_parser.add_argument("--image", action="append", default=[], help="Extra image to include")
+    subparsers.add_parser("list", help="List prepared airgap directories")
+    args = parser.parse_args()
+
+    airgap = K3sAirgap()
+    try:
+        if args.action == "prepare":
+            print(airgap.prepare(args.version, args.image, args.node_image))
+        else:
+            for airgap_dir in airgap.list_dirs():
+                print(f"{airgap_dir}\t{len(os.listdir(airgap_dir))} tarball(s)")
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Containerized K3s cluster nodes.
+
+Every node of a K3s cluster runs as a ``rancher/k3s`` container on a network
+of its own: servers run ``k3s server`` and agents ``k3s agent``, joining the
+first server by container name with a token generated once per cluster.
+Nodes are created either all in one concurrent batch through the shared
+container runtime (joining nodes retry until the first server is up) or one
+at a time, so ``K3sCluster`` can track and retry each node as its own
+resource.
+
+The cluster spec is the ``spec`` of the JSON document built by
+``K3sCluster``: network CIDRs, disabled components and the node list, plus
+``airgapImagesDir`` when the nodes should import their images from local
+tarballs (see ``k3s_airgap``) instead of pulling them.
+
+``serverArgs`` and ``kubeletArgs`` tune the K3s servers and every node's
+kubelet, and a node's ``memory`` (bytes) and ``cpus`` become container
+limits, so a cluster cannot grow past its share of the host. Changed limits
+are applied to existing nodes in place; any other change to a node (image,
+server args, datastore) recreates its container, keeping its data volume.
+
+``datastore`` selects where the servers keep cluster state:
+
+- ``sqlite``: K3s's embedded SQLite (the K3s default); a single server only.
+- ``etcd``: embedded etcd, initialized by the first server; needed for
+  multi-server clusters without an external store.
+- ``external-etcd`` / ``postgres``: an etcd or Postgres container on the
+  cluster network that every server connects to.
+
+Run it at apply time as ``python -m utilities k3s_nodes``:
+
+    create --name CLUSTER < cluster-spec                  create every node of the cluster
+    prepare --name CLUSTER < cluster-spec                 create the network and any external datastore
+    create-node --name CLUSTER --node NODE [--wait S] < cluster-spec
+                                                          create one node (and wait for its API)
+    delete-node --name CLUSTER --node NODE                remove one node and its volume
+    delete --name CLUSTER                                 remove the nodes, their volumes and the network
+    kubeconfig --name CLUSTER                             print the kubeconfig, pointed at the published API port
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import os
+import secrets
+import sys
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from .common_utilities import CommonUtilities
+from .container_runtime import ContainerRuntime, ContainerSpec
+from .image_cache import ImageCache
+
+
+CLUSTER_LABEL = "io.iac-mono-repo.k3s.cluster"
+ROLE_LABEL = "io.iac-mono-repo.k3s.role"
+SPEC_LABEL = "io.iac-mono-repo.k3s.spec"
+LIMIT_OPTIONS = ("--memory", "--memory-swap", "--cpus")
+KUBECONFIG_PATH = "/etc/rancher/k3s/k3s.yaml"
+REGISTRIES_PATH = "/etc/rancher/k3s/registries.yaml"
+AIRGAP_IMAGES_PATH = "/var/lib/rancher/k3s/agent/images"
+DATASTORES = ("sqlite", "etcd", "external-etcd", "postgres")
+ETCD_IMAGE = "quay.io/coreos/etcd:v3.5.9"
+POSTGRES_IMAGE = "postgres:15-alpine"
+
+
+def get_network_name(cluster_name: str) -> str:
+    return f"k3s-{cluster_name}"
+
+
+def _split_limits(options: List[str]) -> Tuple[List[str], List[str]]:
+    """Split ``run`` flags into the limits ``update`` can change in place and the rest (minus the spec label)."""
+    rest, limits = [], []
+    i = 0
+    while i < len(options):
+        if options[i] in LIMIT_OPTIONS:
+            limits += options[i:i + 2]
+            i += 2
+        elif options[i] == "--label" and options[i + 1].startswith(f"{SPEC_LABEL}="):
+            i += 2
+        else:
+            rest.append(options[i])
+            i += 1
+    return rest, limits
+
+
+def get_spec_hash(container: ContainerSpec) -> str:
+    """Hash what only recreating a container can change: everything but the limit values."""
+    rest, limits = _split_limits(container.options)
+    spec = [container.image, rest, limits[::2], container.command]
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+
+def _with_spec_label(container: ContainerSpec) -> ContainerSpec:
+    label = f"{SPEC_LABEL}={get_spec_hash(container)}"
+    return dataclasses.replace(container, options=container.options + ["--label", label])
+
+
+def get_node_name(cluster_name: str, role: str, index: int) -> str:
+    """Get a node container name, e.g. ``dev-server-0`` or ``dev-agent-1`` for cluster ``dev``."""
+    return f"{cluster_name}-{role}-{index}"
+
+
+def get_token(cluster_name: str) -> str:
+    """Get the cluster join token, generating it on first use."""
+    token_file = os.path.join(CommonUtilities.get_cache_dir(os.path.join("k3s", cluster_name)), "token")
+    with CommonUtilities.file_lock(f"{token_file}.lock"):
+        if not os.path.exists(token_file):
+            fd = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as f:
+                f.write(secrets.token_hex(32))
+        with open(token_file, "r") as f:
+            return f.read().strip()
+
+
+class K3sNodes:
+    def __init__(self, runtime: Optional[ContainerRuntime] = None):
+        self.runtime = runtime or ContainerRuntime()
+
+    def _server_args(self, spec: Dict[str, Any]) -> List[str]:
+        """Get the ``k3s server`` flags shared by every server."""
+        args = [
+            "--tls-san", "127.0.0.1",
+            "--write-kubeconfig-mode", "644",
+            "--cluster-cidr", spec["clusterCIDR"],
+            "--service-cidr", spec["serviceCIDR"],
+            "--cluster-dns", spec["clusterDNS"],
+        ]
+        for component in spec.get("disable") or []:
+            args += ["--disable", component]
+        return args + list(spec.get("serverArgs") or [])
+
+    def get_datastore_spec(self, spec: Dict[str, Any]) -> Optional[ContainerSpec]:
+        """Get the external datastore container, if the datastore is external."""
+        cluster_name = spec["name"]
+        datastore = spec.get("datastore") or "sqlite"
+        name = get_node_name(cluster_name, "datastore", 0)
+        options = [
+            "--restart=unless-stopped", "--hostname", name, "--network", get_network_name(cluster_name),
+            "--label", f"{CLUSTER_LABEL}={cluster_name}", "--label", f"{ROLE_LABEL}=datastore",
+        ]
+        if datastore == "external-etcd":
+            container = ContainerSpec(name=name, image=ETCD_IMAGE, options=options + ["-v", f"{name}-data:/etcd-data"],
+                                      command=["etcd", "--data-dir", "/etcd-data",
+                                               "--listen-client-urls", "http://0.0.0.0:2379",
+                                               "--advertise-client-urls", f"http://{name}:2379"])
+        elif datastore == "postgres":
+            container = ContainerSpec(name=name, image=POSTGRES_IMAGE,
+                                      options=options + ["-v", f"{name}-data:/var/lib/postgresql/data",
+                                                         "-e", f"POSTGRES_PASSWORD={get_token(cluster_name)[:32]}",
+                                                         "-e", "POSTGRES_DB=k3s"])
+        else:
+            return None
+        return _with_spec_label(container)
+
+    def _datastore_args(self, spec: Dict[str, Any], index: int) -> List[str]:
+        """Get the ``k3s server`` datastore flags for the server at ``index``."""
+        cluster_name = spec["name"]
+        datastore = spec.get("datastore") or "sqlite"
+        host = get_node_name(cluster_name, "datastore", 0)
+        if datastore == "external-etcd":
+            return ["--datastore-endpoint", f"http://{host}:2379"]
+        if datastore == "postgres":
+            password = get_token(cluster_name)[:32]
+            return ["--datastore-endpoint", f"postgres://postgres:{password}@{host}:5432/k3s?sslmode=disable"]
+        if index > 0:
+            return ["--server", f"https://{get_node_name(cluster_name, 'server', 0)}:6443"]
+        return ["--cluster-init"] if datastore == "etcd" else []
+
+    def get_container_specs(self, spec: Dict[str, Any], registries_file: Optional[str] = None) -> List[ContainerSpec]:
+        """Get the containers for every node of a cluster spec."""
+        cluster_name = spec["name"]
+        first_server = get_node_name(cluster_name, "server", 0)
+        token = get_token(cluster_name)
+        counters = {"server": 0, "agent": 0}
+
+        containers = []
+        for node in spec.get("nodes") or []:
+            role = "server" if node["role"] == "control-plane" else "agent"
+            index = counters[role]
+            counters[role] += 1
+            name = get_node_name(cluster_name, role, index)
+
+            options = [
+                "--privileged", "--restart=unless-stopped",
+                "--hostname", name, "--network", get_network_name(cluster_name),
+                "--tmpfs", "/run", "--tmpfs", "/var/run",
+                "-v", f"{name}-data:/var/lib/rancher/k3s",
+                "-e", f"K3S_TOKEN={token}",
+                "--label", f"{CLUSTER_LABEL}={cluster_name}", "--label", f"{ROLE_LABEL}={role}",
+            ]
+            if registries_file:
+                options += ["-v", f"{registries_file}:{REGISTRIES_PATH}:ro"]
+            if spec.get("airgapImagesDir"):
+                options += ["-v", f"{spec['airgapImagesDir']}:{AIRGAP_IMAGES_PATH}:ro"]
+
+            kubelet_args = [f"--kubelet-arg={arg}" for arg in spec.get("kubeletArgs") or []]
+            if self.runtime.info.rootless:
+                # Rootless runtimes run the node in a user namespace the kubelet must know about
+                kubelet_args.append("--kubelet-arg=feature-gates=KubeletInUserNamespace=true")
+
+            # Rootless runtimes can only enforce limits through cgroup v2 delegation
+            if not self.runtime.info.rootless or self.runtime.info.cgroup_version == 2:
+                if node.get("memory"):
+                    # Equal swap and memory limits keep the node from swapping past its budget
+                    options += ["--memory", str(node["memory"]), "--memory-swap", str(node["memory"])]
+                if node.get("cpus"):
+                    options += ["--cpus", str(node["cpus"])]
+
+            if role == "server":
+                options += ["--publish", "127.0.0.1::6443"]
+                for mapping in node.get("extraPortMappings") or []:
+                    protocol = mapping.get("protocol", "TCP").lower()
+                    options += ["--publish", f"{mapping['hostPort']}:{mapping['containerPort']}/{protocol}"]
+                command = ["server", *self._server_args(spec), *self._datastore_args(spec, index)]
+            else:
+                options += ["-e", f"K3S_URL=https://{first_server}:6443"]
+                command = ["agent"]
+
+            containers.append(_with_spec_label(ContainerSpec(name=name, image=node["image"], options=options,
+                                                             command=command + kubelet_args)))
+        return containers
+
+    def _ensure_running(self, container: ContainerSpec) -> None:
+        """Bring a container in line with its spec, creating it only when it does not exist.
+
+        Existing containers keep their data volume: a stopped server or
+        datastore still holds the cluster state, so it is started again,
+        and a changed one is recreated on the same volume.
+        """
+        existing = self.runtime.inspect_many([container.name])[0]
+        if existing is not None:
+            labels = existing.get("Config", {}).get("Labels") or {}
+            if labels.get(SPEC_LABEL) != get_spec_hash(container):
+                print(f"Recreating {container.name} for its changed spec", file=sys.stderr)
+                self.runtime.delete_many([container.name])
+                existing = None
+        if existing is None:
+            self.runtime.create_many([container])
+            return
+
+        if not existing.get("State", {}).get("Running"):
+            self.runtime.run("start", container.name, check=True)
+        _, limits = _split_limits(container.options)
+        if limits:
+            self.runtime.run("update", *limits, container.name, check=True)
+
+    def prepare(self, spec: Dict[str, Any], registries_file: Optional[str] = None) -> None:
+        """Create what the nodes share: the cluster network and any external datastore."""
+        cluster_name = spec["name"]
+        network = get_network_name(cluster_name)
+        if self.runtime.run("network", "inspect", network).returncode != 0:
+            self.runtime.run("network", "create", "--label", f"{CLUSTER_LABEL}={cluster_name}", network, check=True)
+
+        if registries_file:
+            # The mirrors are reached by container name, so they join the cluster network
+            from .registry_mirror import RegistryMirror
+            RegistryMirror(runtime=self.runtime).connect(network)
+
+        # The datastore starts first; servers retry until it accepts connections
+        datastore = self.get_datastore_spec(spec)
+        if datastore:
+            ImageCache(runtime=self.runtime).ensure_local(datastore.image)
+            self._ensure_running(datastore)
+
+    def create_node(self, spec: Dict[str, Any], node_name: str, registries_file: Optional[str] = None,
+                    wait_timeout: Optional[float] = None) -> None:
+        """Create one node of a cluster, or start, update or recreate an existing one to match the spec.
+
+        With ``wait_timeout`` the call returns only once the node serves the
+        API, which is how the first server signals that the cluster is
+        initialized and ready for the other nodes to join.
+        """
+        containers = {c.name: c for c in self.get_container_specs(spec, registries_file)}
+        if node_name not in containers:
+            raise RuntimeError(f"Node {node_name} is not part of cluster {spec['name']}")
+
+        self._ensure_running(containers[node_name])
+
+        if wait_timeout:
+            self.get_kubeconfig(spec["name"], wait_timeout, server=node_name)
+
+    def delete_node(self, cluster_name: str, node_name: str) -> None:
+        """Remove one node of a cluster and its data volume."""
+        self.runtime.delete_many([node_name])
+        self.runtime.run("volume", "rm", "-f", f"{node_name}-data")
+
+    def create(self, spec: Dict[str, Any], registries_file: Optional[str] = None) -> List[str]:
+        """Create every node of a cluster in one batch; returns the node container names."""
+        self.prepare(spec, registries_file)
+        containers = self.get_container_specs(spec, registries_file)
+        self.runtime.create_many(containers)
+        return [container.name for container in containers]
+
+    def delete(self, cluster_name: str) -> None:
+        """Remove every node of a cluster, their data volumes and the cluster network."""
+        nodes = self.runtime.list_containers(f"{CLUSTER_LABEL}={cluster_name}")
+        self.runtime.delete_many(nodes)
+        if nodes:
+            self.runtime.run("volume", "rm", "-f", *[f"{node}-data" for node in nodes])
+        self.runtime.run("network", "rm", get_network_name(cluster_name))
+
+    def load_image_archive(self, cluster_name: str, archive: str) -> None:
+        """Import an image archive (``docker save`` format) into the containerd of every node."""
+        datastore = get_node_name(cluster_name, "datastore", 0)
+        nodes = [node for node in self.runtime.list_containers(f"{CLUSTER_LABEL}={cluster_name}") if node != datastore]
+        if not nodes:
+            raise RuntimeError(f"K3s cluster {cluster_name} not found")
+        for node in nodes:
+            with open(archive, "rb") as f:
+                result = self.runtime.run("exec", "-i", node, "ctr", "-n", "k8s.io", "images", "import", "-", stdin=f)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to import {archive} into {node}: {result.stderr.decode().strip()}")
+
+    def get_server_id(self, cluster_name: str) -> str:
+        """Get the first server's container ID, which changes whenever the cluster is recreated."""
+        result = self.runtime.run("inspect", "--format", "{{.Id}}", get_node_name(cluster_name, "server", 0))
+        if result.returncode != 0:
+            raise RuntimeError(f"K3s cluster {cluster_name} not found: {result.stderr.strip()}")
+        return result.stdout.strip()
+
+    def get_kubeconfig(self, cluster_name: str, timeout: float = 120, server: Optional[str] = None) -> str:
+        """Get the kubeconfig, waiting for the server (the first one by default) to write it."""
+        server = server or get_node_name(cluster_name, "server", 0)
+        deadline = time.monotonic() + timeout
+        while True:
+            result = self.runtime.run("exec", server, "cat", KUBECONFIG_PATH)
+            if result.returncode == 0 and result.stdout.strip():
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"K3s server {server} did not write a kubeconfig within {timeout:.0f}s")
+            time.sleep(2)
+
+        port = self.runtime.run("port", server, "6443/tcp", check=True).stdout.split()[0]
+        return result.stdout.replace("https://127.0.0.1:6443", f"https://{port}")
+
+
+def main():
+    """Manage containerized K3s nodes from the command line."""
+    parser = argparse.ArgumentParser(description="Containerized K3s cluster nodes")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    for action, help in (("create", "Create every node of the cluster spec on stdin"),
+                         ("prepare", "Create the network and datastore for the cluster spec on stdin"),
+                         ("create-node", "Create one node of the cluster spec on stdin")):
+        action_parser = subparsers.add_parser(action, help=help)
+        action_parser.add_argument("--name", required=True)
+        action_parser.add_argument("--registries", help="registries.yaml to mount into every node")
+    subparsers.choices["create-node"].add_argument("--node", required=True)
+    subparsers.choices["create-node"].add_argument("--wait", type=float, help="Seconds to wait for the node's API")
+    delete_node_parser = subparsers.add_parser("delete-node", help="Remove one node")
+    delete_node_parser.add_argument("--name", required=True)
+    delete_node_parser.add_argument("--node", required=True)
+    for action in ("delete", "kubeconfig"):
+        action_parser = subparsers.add_parser(action)
+        action_parser.add_argument("--name", required=True)
+    args = parser.parse_args()
+
+    nodes = K3sNodes()
+    try:
+        if args.action in ("create", "prepare", "create-node"):
+            spec = json.load(sys.stdin)["spec"]
+            spec["name"] = args.name
+            if args.action == "create":
+                for name in nodes.create(spec, args.registries):
+                    print(f"Created {name}", file=sys.stderr)
+            elif args.action == "prepare":
+                nodes.prepare(spec, args.registries)
+            else:
+                nodes.create_node(spec, args.node, args.registries, args.wait)
+                print(args.node)
+        elif args.action == "delete-node":
+            nodes.delete_node(args.name, args.node)
+        elif args.action == "delete":
+            nodes.delete(args.name)
+        else:
+            print(nodes.get_kubeconfig(args.name), end="")
+    except (RuntimeError, TimeoutError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,424 @@
+"""
+Warm pool of pre-provisioned Kind clusters.
+
+Clusters are grouped by shape: the Kind config minus its name, so the
+Kubernetes version, node layout and port mappings all have to match. A stack
+leases a ready cluster of its shape, gets it back reset to a clean baseline
+on release, and the pool refills itself in the background.
+
+Reset is checked against a baseline inventory recorded right after the
+cluster was created: every namespaced object in the system namespaces and
+every cluster-scoped object (ClusterRoles and bindings, APIServices, CRDs,
+PVs, PriorityClasses, namespaces, ...). Anything a lessee added is deleted; a
+cluster whose baseline objects were removed, or that cannot be brought back
+to its baseline, is deleted and recreated instead of handed out again.
+
+Every pool entry records the pid, host and time of the process that last
+changed it, so clusters left "creating" or "resetting" by a process that died
+are reclaimed instead of waited on forever.
+
+Two clusters cannot bind the same host ports, so a shape with fixed host
+ports holds at most one cluster. That cluster is reset and handed out again
+on the next lease rather than pre-created alongside another.
+
+Run it at apply time as ``python -m utilities kind_pool``:
+
+    lease --holder ID [--size N] < kind-config   print the leased cluster name
+    release [NAME]                               reset NAME and return it to the pool
+    refill [--shape KEY]                         create clusters up to each shape's size
+    status                                       show pool clusters
+    drain                                        delete every idle pool cluster
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+from .common_utilities import CommonUtilities
+from .container_runtime import ContainerRuntime
+
+
+BASELINE_NAMESPACES = {"default", "kube-system", "kube-public", "kube-node-lease", "local-path-storage"}
+# Kept up to date by the cluster itself, so they are neither part of the baseline nor deleted
+UNTRACKED_KINDS = {
+    "Event", "Lease", "Endpoints", "EndpointSlice", "Node", "CSINode", "CertificateSigningRequest",
+}
+# Entries of a live process that take longer than this are reclaimed anyway
+STALE_SECONDS = 3600
+
+
+def _is_warm(cluster: Dict[str, Any]) -> bool:
+    """Check whether a cluster is idle or being created for the pool rather than for a lease."""
+    return cluster["state"] == "available" or (cluster["state"] == "creating" and not cluster.get("holder"))
+
+
+def _owner() -> Dict[str, Any]:
+    """Get the owner fields stored with every pool entry change."""
+    return {"pid": os.getpid(), "host": socket.gethostname(), "since": int(time.time())}
+
+
+def _owner_alive(cluster: Dict[str, Any]) -> bool:
+    """Check whether the process that put an entry in its state can still finish the job."""
+    if time.time() - cluster.get("since", 0) > STALE_SECONDS:
+        return False
+    if not cluster.get("pid") or cluster.get("host") != socket.gethostname():
+        return True  # Cannot check another host's processes; the age limit applies
+    try:
+        os.kill(cluster["pid"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_shape_key(kind_config: Dict[str, Any]) -> str:
+    """Get the pool shape key for a Kind config."""
+    shape = {k: v for k, v in kind_config.items() if k != "name"}
+    return hashlib.sha256(json.dumps(shape, sort_keys=True).encode()).hexdigest()[:10]
+
+
+def _has_host_ports(kind_config: Dict[str, Any]) -> bool:
+    return any(
+        mapping.get("hostPort")
+        for node in kind_config.get("nodes", [])
+        for mapping in node.get("extraPortMappings", [])
+    )
+
+
+class KindClusterPool:
+    def __init__(self, state_dir: Optional[str] = None, runtime: Optional[ContainerRuntime] = None):
+        self.state_dir = state_dir or CommonUtilities.get_cache_dir("kind-pool")
+        self.runtime = runtime or ContainerRuntime()
+        self.state_file = os.path.join(self.state_dir, "pool.json")
+        self.lock_file = os.path.join(self.state_dir, ".lock")
+
+    def _run(self, *args: str, input: Optional[str] = None) -> subprocess.CompletedProcess:
+        return subprocess.run(list(args), capture_output=True, text=True, input=input)
+
+    def _read_state(self) -> Dict[str, Any]:
+        if not os.path.exists(self.state_file):
+            return {"shapes": {}}
+        with open(self.state_file, "r") as f:
+            return json.load(f)
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, self.state_file)
+
+    def _update(self, fn):
+        """Apply ``fn`` to the pool state under the lock and return its result."""
+        with CommonUtilities.file_lock(self.lock_file):
+            state = self._read_state()
+            result = fn(state)
+            self._write_state(state)
+            return result
+
+    def _find(self, state: Dict[str, Any], name: str) -> Optional[Dict[str, Any]]:
+        for shape in state["shapes"].values():
+            if name in shape["clusters"]:
+                return shape
+        return None
+
+    def _create(self, name: str, kind_config: Dict[str, Any]) -> bool:
+        result = self.runtime.run_kind("create", "cluster", "--name", name, "--config", "-",
+                                       input=json.dumps(kind_config))
+        if result.returncode != 0:
+            print(f"Failed to create pool cluster {name}: {result.stderr.strip()}", file=sys.stderr)
+        return result.returncode == 0
+
+    def _delete(self, name: str) -> None:
+        self.runtime.run_kind("delete", "cluster", "--name", name)
+        if os.path.exists(self._baseline_file(name)):
+            os.unlink(self._baseline_file(name))
+
+    def _baseline_file(self, name: str) -> str:
+        return os.path.join(self.state_dir, "baselines", f"{name}.json")
+
+    @contextmanager
+    def _kubeconfig(self, name: str) -> Iterator[Optional[str]]:
+        """Yield a temporary kubeconfig file for a pool cluster (None if it cannot be fetched)."""
+        result = self.runtime.run_kind("get", "kubeconfig", "--name", name)
+        if result.returncode != 0:
+            yield None
+            return
+        with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+            f.write(result.stdout)
+        try:
+            yield f.name
+        finally:
+            os.unlink(f.name)
+
+    def _inventory(self, kubeconfig: str) -> Optional[Set[str]]:
+        """Get the tracked objects of a cluster as ``type/namespace/name`` (namespace empty when cluster-scoped).
+
+        Objects with an owner are left out: the garbage collector removes them with their owner.
+        Namespaced objects outside the baseline namespaces are left out too; deleting the namespace removes them.
+        """
+        result = self._run("kubectl", "--kubeconfig", kubeconfig, "api-resources", "--verbs=list,delete", "-o", "name")
+        if result.returncode != 0:
+            return None
+        resources = ",".join(result.stdout.split())
+        result = self._run("kubectl", "--kubeconfig", kubeconfig, "get", resources, "--all-namespaces", "-o", "json")
+        if result.returncode != 0:
+            return None
+
+        objects = set()
+        for item in json.loads(result.stdout).get("items", []):
+            metadata = item.get("metadata", {})
+            namespace = metadata.get("namespace", "")
+            if item["kind"] in UNTRACKED_KINDS or metadata.get("ownerReferences"):
+                continue
+            if namespace and namespace not in BASELINE_NAMESPACES:
+                continue
+            group, _, version = item["apiVersion"].rpartition("/")
+            kind = item["kind"].lower()
+            resource_type = f"{kind}.{version}.{group}" if group else kind
+            objects.add(f"{resource_type}/{namespace}/{metadata['name']}")
+        return objects
+
+    def _record_baseline(self, name: str) -> bool:
+        """Record a freshly created cluster's inventory as the state every reset returns to."""
+        with self._kubeconfig(name) as kubeconfig:
+            objects = self._inventory(kubeconfig) if kubeconfig else None
+        if objects is None:
+            print(f"Could not record the baseline of pool cluster {name}", file=sys.stderr)
+            return False
+        os.makedirs(os.path.dirname(self._baseline_file(name)), exist_ok=True)
+        with open(self._baseline_file(name), "w") as f:
+            json.dump(sorted(objects), f, indent=2)
+        return True
+
+    def _reset(self, name: str) -> bool:
+        """Reset a cluster to its recorded baseline; False if it cannot get back there."""
+        if not os.path.exists(self._baseline_file(name)):
+            return False
+        with open(self._baseline_file(name), "r") as f:
+            baseline = set(json.load(f))
+
+        with self._kubeconfig(name) as kubeconfig:
+            if not kubeconfig:
+                return False
+            current = self._inventory(kubeconfig)
+            if current is None or not baseline <= current:
+                return False  # A lessee removed or broke part of the baseline
+
+            # Namespaced objects first, then cluster-scoped ones (namespaces, CRDs, ClusterRoles, APIServices, PVs, ...)
+            added = sorted(current - baseline, key=lambda obj: (obj.split("/")[1] == "", obj))
+            for obj in added:
+                resource_type, namespace, obj_name = obj.split("/", 2)
+                args = ["kubectl", "--kubeconfig", kubeconfig, "delete", f"{resource_type}/{obj_name}",
+                        "--ignore-not-found", "--wait=true", "--timeout=120s"]
+                if namespace:
+                    args += ["--namespace", namespace]
+                if self._run(*args).returncode != 0:
+                    return False
+
+            current = self._inventory(kubeconfig)
+            return current == baseline
+
+    def _reclaim(self) -> None:
+        """Drop entries left creating or resetting by a process that is gone, and delete their clusters."""
+        def take_orphans(state):
+            orphans = []
+            for shape in state["shapes"].values():
+                for name, cluster in list(shape["clusters"].items()):
+                    if cluster["state"] in ("creating", "resetting") and not _owner_alive(cluster):
+                        shape["clusters"].pop(name)
+                        orphans.append(name)
+            return orphans
+
+        for name in self._update(take_orphans):
+            print(f"Reclaiming pool cluster {name}: its owner is gone", file=sys.stderr)
+            self._delete(name)
+
+    def lease(self, kind_config: Dict[str, Any], holder: str, size: int = 1, wait_timeout: float = 600) -> str:
+        """Lease a ready cluster of this shape.
+
+        An idle cluster is handed out immediately. Otherwise the lease waits for
+        one the pool is already creating or resetting, and only creates a new
+        cluster itself when nothing is on the way.
+        """
+        key = get_shape_key(kind_config)
+        fixed_ports = _has_host_ports(kind_config)
+        if fixed_ports:
+            size = 1
+
+        def take(state):
+            shape = state["shapes"].setdefault(key, {"config": kind_config, "size": size, "next": 0, "clusters": {}})
+            shape["size"] = max(shape["size"], size)
+            for name, cluster in sorted(shape["clusters"].items()):
+                if cluster["state"] == "available":
+                    cluster.update(state="leased", holder=holder, **_owner())
+                    return name, False
+            # Clusters being created for another lease are not on the way for this one
+            if any(c["state"] == "resetting" or (c["state"] == "creating" and not c.get("holder"))
+                   for c in shape["clusters"].values()):
+                return None, False
+            if fixed_ports and shape["clusters"]:
+                raise RuntimeError(f"Pool shape {key} binds fixed host ports and its cluster is already leased")
+            name = f"pool-{key}-{shape['next']}"
+            shape["next"] += 1
+            shape["clusters"][name] = {"state": "creating", "holder": holder, **_owner()}
+            return name, True
+
+        deadline = time.monotonic() + wait_timeout
+        self._reclaim()
+        name, needs_create = self._update(take)
+        while name is None:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Timed out waiting for a pool cluster of shape {key}")
+            time.sleep(5)
+            self._reclaim()
+            name, needs_create = self._update(take)
+
+        if needs_create:
+            if not self._create(name, {**kind_config, "name": name}):
+                self._update(lambda state: state["shapes"][key]["clusters"].pop(name, None))
+                raise RuntimeError(f"Failed to create pool cluster {name}")
+            # Without a baseline the cluster still works; its release recreates it instead of resetting
+            self._record_baseline(name)
+            self._update(lambda state: state["shapes"][key]["clusters"][name].update(state="leased", **_owner()))
+
+        self.refill_in_background(key)
+        return name
+
+    def release(self, name: str) -> None:
+        """Reset a leased cluster and return it to the pool.
+
+        The cluster is deleted instead if the reset fails or the pool already
+        has enough idle clusters of its shape.
+        """
+        if self._update(lambda state: self._find(state, name)) is None:
+            raise RuntimeError(f"Not a pool cluster: {name}")
+
+        def make_available(state):
+            shape = self._find(state, name)
+            idle = [c for c in shape["clusters"].values() if _is_warm(c)]
+            if len(idle) >= shape["size"]:
+                shape["clusters"].pop(name)
+                return False
+            shape["clusters"][name].update(state="available", holder=None, **_owner())
+            return True
+
+        self._update(lambda state: self._find(state, name)["clusters"][name].update(state="resetting", **_owner()))
+        if not self._reset(name):
+            print(f"Reset of {name} to its baseline failed, recreating it", file=sys.stderr)
+            self._update(lambda state: self._find(state, name)["clusters"].pop(name))
+            self._delete(name)
+            self.refill_in_background()
+        elif not self._update(make_available):
+            # The pool is already full for this shape
+            self._delete(name)
+
+    def refill(self, shape_key: Optional[str] = None) -> None:
+        """Create clusters until every shape has ``size`` idle or creating clusters."""
+        def plan(state):
+            todo = []
+            for key, shape in state["shapes"].items():
+                if shape_key and key != shape_key:
+                    continue
+                if _has_host_ports(shape["config"]) and shape["clusters"]:
+                    continue
+                warm = [c for c in shape["clusters"].values() if _is_warm(c)]
+                for _ in range(shape["size"] - len(warm)):
+                    name = f"pool-{key}-{shape['next']}"
+                    shape["next"] += 1
+                    shape["clusters"][name] = {"state": "creating", "holder": None, **_owner()}
+                    todo.append((key, name, shape["config"]))
+            return todo
+
+        self._reclaim()
+        for key, name, kind_config in self._update(plan):
+            if self._create(name, {**kind_config, "name": name}) and self._record_baseline(name):
+                self._update(lambda state: state["shapes"][key]["clusters"][name].update(
+                    state="available", **_owner()))
+            else:
+                self._update(lambda state: state["shapes"][key]["clusters"].pop(name, None))
+                self._delete(name)
+
+    def refill_in_background(self, shape_key: Optional[str] = None) -> None:
+        """Refill the pool from a detached process so the caller doesn't wait."""
+        args = [sys.executable, "-m", "utilities", "kind_pool", "refill"]
+        if shape_key:
+            args += ["--shape", shape_key]
+        subprocess.Popen(
+            args,
+            cwd=CommonUtilities.get_pulumi_root(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+    def drain(self) -> List[str]:
+        """Delete every idle pool cluster and return their names."""
+        def take_idle(state):
+            names = []
+            for shape in state["shapes"].values():
+                shape["size"] = 0
+                for name, cluster in list(shape["clusters"].items()):
+                    if cluster["state"] == "available":
+                        shape["clusters"].pop(name)
+                        names.append(name)
+            return names
+
+        names = self._update(take_idle)
+        for name in names:
+            self._delete(name)
+        return names
+
+    def status(self) -> Dict[str, Any]:
+        """Get the pool state."""
+        return self._read_state()
+
+
+def main():
+    """Manage the Kind cluster pool from the command line."""
+    parser = argparse.ArgumentParser(description="Warm pool of Kind clusters")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    lease_parser = subparsers.add_parser("lease", help="Lease a cluster for the Kind config on stdin")
+    lease_parser.add_argument("--holder", required=True)
+    lease_parser.add_argument("--size", type=int, default=1)
+    release_parser = subparsers.add_parser("release", help="Reset a cluster and return it to the pool")
+    release_parser.add_argument("name", nargs="?", default=os.environ.get("PULUMI_COMMAND_STDOUT", "").strip())
+    refill_parser = subparsers.add_parser("refill", help="Create clusters up to each shape's size")
+    refill_parser.add_argument("--shape")
+    subparsers.add_parser("status", help="Show pool clusters")
+    subparsers.add_parser("drain", help="Delete every idle pool cluster")
+    args = parser.parse_args()
+
+    pool = KindClusterPool()
+    try:
+        if args.action == "lease":
+            print(pool.lease(json.load(sys.stdin), args.holder, args.size))
+        elif args.action == "release":
+            pool.release(args.name)
+        elif args.action == "refill":
+            pool.refill(args.shape)
+        elif args.action == "drain":
+            for name in pool.drain():
+                print(f"Deleted {name}")
+        else:
+            for key, shape in sorted(pool.status()["shapes"].items()):
+                print(f"shape {key} (size {shape['size']})")
+                for name, cluster in sorted(shape["clusters"].items()):
+                    holder = f" by {cluster['holder']}" if cluster.get("holder") else ""
+                    print(f"  {name}\t{cluster['state']}{holder}")
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
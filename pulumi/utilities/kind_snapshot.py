@@ -0,0 +1,279 @@
+"""
+Snapshot and restore of fully bootstrapped Kind clusters.
+
+A snapshot captures every node container of a cluster after bootstrap (and
+after addons, when taken from ``KindCluster.snapshot_after``): the container
+filesystem is committed to an image and the node's ``/var`` volume, which
+holds etcd and the containerd image store, is saved as a tarball. Restoring
+recreates the node containers with the same names, addresses and port
+bindings, so the cluster comes back with its certificates and kubeconfig
+still valid and skips kubeadm init, node joins and addon rollout.
+
+Snapshots are keyed by a hash of everything baked into them: the full Kind
+config, cluster name included (a restored cluster must keep the name its
+certificates were issued for), the image ID behind each node image tag, the
+preloaded images and the addons deployed before the snapshot was taken.
+Changing any of them misses the snapshot and creates the cluster cold.
+
+Run it at apply time as ``python -m utilities kind_snapshot``:
+
+    restore-or-create --name CLUSTER [--preload IMAGE...] [--addon ID...] < kind-config
+                                                     restore if a snapshot exists, else create
+    save --name CLUSTER [--preload IMAGE...] [--addon ID...] < kind-config
+                                                     snapshot the cluster unless one exists
+    list                                             show snapshots
+    delete KEY                                       remove a snapshot
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+
+from .common_utilities import CommonUtilities
+from .container_runtime import ContainerRuntime, ContainerSpec
+
+
+CLUSTER_LABEL = "io.x-k8s.kind.cluster"
+
+
+def get_snapshot_key(kind_config: Dict[str, Any], preload_images: Optional[List[str]] = None,
+                     addons: Optional[List[str]] = None, node_images: Optional[Dict[str, str]] = None) -> str:
+    """Get the snapshot key for a Kind config, its preloaded images, addons and node image IDs."""
+    content = {
+        "config": kind_config,
+        "preload_images": sorted(preload_images or []),
+        "addons": sorted(addons or []),
+        "node_images": node_images or {},
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class KindSnapshot:
+    def __init__(self, snapshot_dir: Optional[str] = None, runtime: Optional[ContainerRuntime] = None):
+        self.snapshot_dir = snapshot_dir or CommonUtilities.get_cache_dir("kind-snapshots")
+        self.runtime = runtime or ContainerRuntime()
+
+    def _path(self, key: str, *parts: str) -> str:
+        return os.path.join(self.snapshot_dir, key, *parts)
+
+    def has(self, key: str) -> bool:
+        """Check whether a complete snapshot exists for ``key``."""
+        return os.path.exists(self._path(key, "snapshot.json"))
+
+    def get_key(self, kind_config: Dict[str, Any], preload_images: Optional[List[str]] = None,
+                addons: Optional[List[str]] = None) -> str:
+        """Get the snapshot key, resolving each node image tag to the image ID it currently points at."""
+        node_images = {}
+        for image in sorted({node.get("image", "") for node in kind_config.get("nodes", [])} - {""}):
+            result = self.runtime.run("image", "inspect", "--format", "{{.Id}}", image)
+            # Not pulled yet: kind pulls it on create, and the snapshot taken afterwards is keyed by its ID
+            node_images[image] = result.stdout.strip() if result.returncode == 0 else ""
+        return get_snapshot_key(kind_config, preload_images, addons, node_images)
+
+    def get_nodes(self, cluster_name: str) -> List[str]:
+        """Get the node container names of a cluster."""
+        return self.runtime.list_containers(f"{CLUSTER_LABEL}={cluster_name}")
+
+    def save(self, cluster_name: str, key: str) -> Dict[str, Any]:
+        """Snapshot every node of a cluster.
+
+        Nodes are stopped while their state is captured so etcd and containerd
+        are consistent on disk, then started again.
+        """
+        nodes = self.get_nodes(cluster_name)
+        if not nodes:
+            raise RuntimeError(f"No nodes found for Kind cluster {cluster_name}")
+
+        inspect = self.runtime.inspect_many(nodes)
+        tmp_dir = self._path(f"{key}.{os.getpid()}.tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        start = time.monotonic()
+        self.runtime.run("stop", *nodes, check=True)
+        try:
+            def capture(node: Dict[str, Any]) -> Dict[str, Any]:
+                name = node["Name"].lstrip("/")
+                image = f"kind-snapshot/{key}:{name}"
+                self.runtime.run("commit", name, image, check=True)
+                with open(os.path.join(tmp_dir, f"{name}-var.tar"), "wb") as f:
+                    self.runtime.run("run", "--rm", "--volumes-from", name, "--entrypoint", "tar",
+                                     image, "-C", "/var", "-cf", "-", ".", stdout=f, check=True)
+                return self._node_spec(node, image)
+
+            with ThreadPoolExecutor(max_workers=len(inspect)) as executor:
+                specs = list(executor.map(capture, inspect))
+        finally:
+            self.runtime.run("start", *nodes, check=True)
+
+        snapshot = {
+            "key": key,
+            "cluster_name": cluster_name,
+            "created": int(time.time()),
+            "capture_seconds": round(time.monotonic() - start, 3),
+            "nodes": specs,
+        }
+        with open(os.path.join(tmp_dir, "snapshot.json"), "w") as f:
+            json.dump(snapshot, f, indent=2)
+
+        shutil.rmtree(self._path(key), ignore_errors=True)
+        os.replace(tmp_dir, self._path(key))
+        return snapshot
+
+    def _node_spec(self, node: Dict[str, Any], image: str) -> Dict[str, Any]:
+        """Extract what is needed to recreate a node container from ``inspect`` output."""
+        host_config = node["HostConfig"]
+        network, settings = next(iter(node["NetworkSettings"]["Networks"].items()))
+        return {
+            "name": node["Name"].lstrip("/"),
+            "image": image,
+            "hostname": node["Config"]["Hostname"],
+            "labels": node["Config"]["Labels"],
+            "env": node["Config"].get("Env") or [],
+            "privileged": host_config.get("Privileged", True),
+            "security_opt": host_config.get("SecurityOpt") or [],
+            "tmpfs": sorted((host_config.get("Tmpfs") or {}).keys()),
+            "binds": host_config.get("Binds") or [],
+            "port_bindings": host_config.get("PortBindings") or {},
+            "cgroupns": host_config.get("CgroupnsMode") or "",
+            "network": network,
+            "ip": settings.get("IPAddress") or "",
+            "ipv6": settings.get("GlobalIPv6Address") or "",
+        }
+
+    def restore(self, key: str, timeout: float = 300) -> Dict[str, Any]:
+        """Recreate a cluster's nodes from a snapshot and wait for every node to report Ready."""
+        with open(self._path(key, "snapshot.json"), "r") as f:
+            snapshot = json.load(f)
+
+        start = time.monotonic()
+        since = datetime.now(timezone.utc)
+
+        # Clear any previous incarnation of the cluster; its containers hold the names and volumes reused here
+        self.runtime.run_kind("delete", "cluster", "--name", snapshot["cluster_name"])
+        leftovers = self.get_nodes(snapshot["cluster_name"])
+        if leftovers:
+            self.runtime.run("rm", "-f", "-v", *leftovers, check=True)
+
+        def restore_volume(spec: Dict[str, Any]) -> None:
+            volume = f"{spec['name']}-var"
+            # kind only removes anonymous volumes, so clear one left by an earlier restore
+            result = self.runtime.run("volume", "rm", "-f", volume)
+            if result.returncode != 0:
+                raise RuntimeError(f"Failed to remove volume {volume}: {result.stderr.strip()}")
+            self.runtime.run("volume", "create", "--label", f"{CLUSTER_LABEL}={snapshot['cluster_name']}", volume,
+                             check=True)
+            with open(self._path(key, f"{spec['name']}-var.tar"), "rb") as f:
+                self.runtime.run("run", "--rm", "-i", "-v", f"{volume}:/var", "--entrypoint", "tar",
+                                 spec["image"], "-C", "/var", "-xf", "-", stdin=f, check=True)
+
+        with ThreadPoolExecutor(max_workers=len(snapshot["nodes"])) as executor:
+            list(executor.map(restore_volume, snapshot["nodes"]))
+        self.runtime.create_many([self._container_spec(spec) for spec in snapshot["nodes"]])
+
+        from .readiness import wait_for_nodes_ready
+        kubeconfig = self.runtime.run_kind("get", "kubeconfig", "--name", snapshot["cluster_name"], check=True).stdout
+        wait_for_nodes_ready(kubeconfig, timeout, expected_nodes=len(snapshot["nodes"]), since=since)
+
+        return {"cluster_name": snapshot["cluster_name"], "restore_seconds": round(time.monotonic() - start, 3)}
+
+    def _container_spec(self, spec: Dict[str, Any]) -> ContainerSpec:
+        """Get the container that recreates a snapshotted node."""
+        options = ["--tty", "--hostname", spec["hostname"], "--network", spec["network"],
+                   "--restart=on-failure:1", "--init=false", "-v", f"{spec['name']}-var:/var"]
+        if spec["ip"]:
+            options += ["--ip", spec["ip"]]
+        if spec["ipv6"]:
+            options += ["--ip6", spec["ipv6"]]
+        if spec["privileged"]:
+            options.append("--privileged")
+        if spec["cgroupns"]:
+            options.append(f"--cgroupns={spec['cgroupns']}")
+        for opt in spec["security_opt"]:
+            options += ["--security-opt", opt]
+        for path in spec["tmpfs"]:
+            options += ["--tmpfs", path]
+        for bind in spec["binds"]:
+            options += ["-v", bind]
+        for env in spec["env"]:
+            options += ["-e", env]
+        for label, value in spec["labels"].items():
+            options += ["--label", f"{label}={value}"]
+        for container_port, bindings in spec["port_bindings"].items():
+            for binding in bindings or []:
+                host_ip = f"{binding['HostIp']}:" if binding.get("HostIp") else ""
+                options += ["--publish", f"{host_ip}{binding['HostPort']}:{container_port}"]
+        return ContainerSpec(name=spec["name"], image=spec["image"], options=options)
+
+    def delete(self, key: str) -> None:
+        """Remove a snapshot and its images."""
+        if self.has(key):
+            with open(self._path(key, "snapshot.json"), "r") as f:
+                snapshot = json.load(f)
+            images = [spec["image"] for spec in snapshot["nodes"]]
+            self.runtime.run("rmi", *images)
+        shutil.rmtree(self._path(key), ignore_errors=True)
+
+    def list_snapshots(self) -> List[Dict[str, Any]]:
+        """Get every complete snapshot."""
+        snapshots = []
+        for key in sorted(os.listdir(self.snapshot_dir)):
+            if self.has(key):
+                with open(self._path(key, "snapshot.json"), "r") as f:
+                    snapshots.append(json.load(f))
+        return snapshots
+
+
+def main():
+    """Manage Kind cluster snapshots from the command line."""
+    parser = argparse.ArgumentParser(description="Snapshot and restore Kind clusters")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    restore_parser = subparsers.add_parser("restore-or-create", help="Restore the cluster for the Kind config on stdin")
+    restore_parser.add_argument("--name", required=True)
+    restore_parser.add_argument("--timeout", type=float, default=300)
+    save_parser = subparsers.add_parser("save", help="Snapshot the cluster for the Kind config on stdin")
+    save_parser.add_argument("--name", required=True)
+    for subparser in (restore_parser, save_parser):
+        subparser.add_argument("--preload", action="append", default=[], help="Image preloaded into the nodes")
+        subparser.add_argument("--addon", action="append", default=[], help="Addon identity, e.g. NAME:VERSION")
+    subparsers.add_parser("list", help="List snapshots")
+    delete_parser = subparsers.add_parser("delete", help="Remove a snapshot")
+    delete_parser.add_argument("key")
+    args = parser.parse_args()
+
+    snapshots = KindSnapshot()
+    try:
+        if args.action in ("restore-or-create", "save"):
+            kind_config = json.load(sys.stdin)
+            key = snapshots.get_key(kind_config, args.preload, args.addon)
+            if args.action == "save":
+                if snapshots.has(key):
+                    print(f"Snapshot {key} already exists", file=sys.stderr)
+                else:
+                    snapshot = snapshots.save(args.name, key)
+                    print(f"Saved snapshot {key} of {args.name} in {snapshot['capture_seconds']:.1f}s", file=sys.stderr)
+            elif snapshots.has(key):
+                result = snapshots.restore(key, args.timeout)
+                print(f"Restored {args.name} from snapshot {key} in {result['restore_seconds']:.1f}s", file=sys.stderr)
+            else:
+                snapshots.runtime.run_kind("create", "cluster", "--name", args.name, "--config", "-",
+                                           input=json.dumps(kind_config), check=True)
+        elif args.action == "delete":
+            snapshots.delete(args.key)
+        else:
+            for snapshot in snapshots.list_snapshots():
+                print(f"{snapshot['key']}\t{snapshot['cluster_name']}\t{len(snapshot['nodes'])} node(s)")
+    except (RuntimeError, subprocess.CalledProcessError, TimeoutError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
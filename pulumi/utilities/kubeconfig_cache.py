@@ -0,0 +1,109 @@
+"""
+On-disk kubeconfig cache keyed by cluster identity.
+
+Fetching a kubeconfig costs a process spawn plus a container exec
+(``kind get kubeconfig``). The cache keys each kubeconfig by cluster name and
+an identity that changes whenever the cluster is recreated, so a lookup costs
+one cheap identity probe and a file read:
+
+- Kind: the control-plane container ID.
+- K3s: the first server's container ID.
+
+Run it at apply time as ``python -m utilities kubeconfig_cache``:
+
+    kind --name CLUSTER   print the Kind cluster's kubeconfig
+    k3s --name CLUSTER    print the K3s cluster's kubeconfig
+    clear [--name NAME]   forget cached kubeconfigs
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from typing import Callable, Optional
+
+from .common_utilities import CommonUtilities
+from .container_runtime import ContainerRuntime
+from .k3s_nodes import K3sNodes
+
+
+class KubeconfigCache:
+    def __init__(self, cache_dir: Optional[str] = None, runtime: Optional[ContainerRuntime] = None):
+        self.cache_dir = cache_dir or CommonUtilities.get_cache_dir("kubeconfigs")
+        self.runtime = runtime or ContainerRuntime()
+
+    def _cluster_dir(self, cluster_name: str) -> str:
+        return os.path.join(self.cache_dir, cluster_name)
+
+    def get(self, cluster_name: str, identity: str, fetch: Callable[[], str]) -> str:
+        """Get a kubeconfig, calling ``fetch`` only when ``identity`` has no cached entry.
+
+        Entries for any other identity of the same cluster are stale (the
+        cluster was recreated) and are removed.
+        """
+        cluster_dir = self._cluster_dir(cluster_name)
+        cache_file = os.path.join(cluster_dir, f"{identity[:16]}.yaml")
+        if os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                return f.read()
+
+        kubeconfig = fetch()
+        shutil.rmtree(cluster_dir, ignore_errors=True)
+        os.makedirs(cluster_dir, mode=0o700, exist_ok=True)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(kubeconfig)
+        os.replace(tmp_file, cache_file)
+        return kubeconfig
+
+    def get_kind(self, cluster_name: str) -> str:
+        """Get a Kind cluster's kubeconfig."""
+        result = self.runtime.run("inspect", "--format", "{{.Id}}", f"{cluster_name}-control-plane")
+        if result.returncode != 0:
+            raise RuntimeError(f"Kind cluster {cluster_name} not found: {result.stderr.strip()}")
+
+        def fetch() -> str:
+            return self.runtime.run_kind("get", "kubeconfig", "--name", cluster_name, check=True).stdout
+
+        return self.get(cluster_name, result.stdout.strip(), fetch)
+
+    def get_k3s(self, cluster_name: str) -> str:
+        """Get a containerized K3s cluster's kubeconfig."""
+        nodes = K3sNodes(self.runtime)
+        return self.get(cluster_name, nodes.get_server_id(cluster_name), lambda: nodes.get_kubeconfig(cluster_name))
+
+    def clear(self, cluster_name: Optional[str] = None) -> None:
+        """Forget the cached kubeconfigs of one cluster, or of all clusters."""
+        if cluster_name:
+            shutil.rmtree(self._cluster_dir(cluster_name), ignore_errors=True)
+        else:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def main():
+    """Print a cached kubeconfig from the command line."""
+    parser = argparse.ArgumentParser(description="Kubeconfig cache keyed by cluster identity")
+    subparsers = parser.add_subparsers(dest="distribution", required=True)
+    for distribution in ("kind", "k3s"):
+        distribution_parser = subparsers.add_parser(distribution, help=f"Print a {distribution} cluster's kubeconfig")
+        distribution_parser.add_argument("--name", required=True)
+    clear_parser = subparsers.add_parser("clear", help="Forget cached kubeconfigs")
+    clear_parser.add_argument("--name")
+    args = parser.parse_args()
+
+    cache = KubeconfigCache()
+    try:
+        if args.distribution == "kind":
+            print(cache.get_kind(args.name), end="")
+        elif args.distribution == "k3s":
+            print(cache.get_k3s(args.name), end="")
+        else:
+            cache.clear(args.name)
+    except (RuntimeError, TimeoutError, OSError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
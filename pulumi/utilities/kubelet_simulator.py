@@ -0,0 +1,237 @@
+"""
+Simulated kubelets for load-testing metrics-server without a large cluster.
+
+metrics-server scrapes ``/metrics/resource`` from the kubelet of every Node
+it lists, at the Node's address and kubelet port. The simulator serves that
+endpoint for thousands of synthetic nodes from one process, one TLS port per
+node (``base_port + index``), with CPU counters that advance in real time and
+a configurable number of pods and containers per node. Registering the
+synthetic Node objects in a real API server (a throwaway K3s cluster) points
+metrics-server at them; the nodes carry a NoSchedule taint so nothing else
+lands on them.
+
+The certificate is self-signed, so metrics-server must run with
+``--kubelet-insecure-tls``. Creating it needs the ``openssl`` command.
+
+Run it as ``python -m utilities kubelet_simulator``:
+
+    serve --nodes N [--pods-per-node P] [--base-port PORT] [--latency-ms MS]
+          [--kubeconfig FILE --address IP]   serve, registering the nodes while serving
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import ssl
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .common_utilities import CommonUtilities
+
+
+NODE_PREFIX = "sim-node"
+NAMESPACE = "kubelet-simulator"
+SIMULATED_TAINT = "kubelet-simulator/simulated"
+
+
+def get_certificate() -> Tuple[str, str]:
+    """Get the simulator's self-signed certificate and key, creating them on first use."""
+    cert_dir = CommonUtilities.get_cache_dir("kubelet-simulator")
+    cert_file = os.path.join(cert_dir, "tls.crt")
+    key_file = os.path.join(cert_dir, "tls.key")
+    with CommonUtilities.file_lock(os.path.join(cert_dir, ".lock")):
+        if not (os.path.exists(cert_file) and os.path.exists(key_file)):
+            if not shutil.which("openssl"):
+                raise RuntimeError("openssl is needed to create the kubelet simulator certificate")
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "365",
+                 "-subj", "/CN=kubelet-simulator", "-keyout", key_file, "-out", cert_file],
+                check=True, capture_output=True
+            )
+    return cert_file, key_file
+
+
+class KubeletSimulator:
+    def __init__(self, nodes: int, pods_per_node: int = 30, containers_per_pod: int = 2,
+                 base_port: int = 20000, latency_ms: float = 0):
+        self.nodes = nodes
+        self.pods_per_node = pods_per_node
+        self.containers_per_pod = containers_per_pod
+        self.base_port = base_port
+        self.latency_ms = latency_ms
+        self.started = time.time()
+        self.requests = 0
+
+    def get_node_name(self, index: int) -> str:
+        return f"{NODE_PREFIX}-{index:05d}"
+
+    def render(self, index: int) -> str:
+        """Render the ``/metrics/resource`` exposition of one node."""
+        now = time.time()
+        timestamp = int(now * 1000)
+        uptime = now - self.started
+        node = self.get_node_name(index)
+
+        containers, pods = [], []
+        for p in range(self.pods_per_node):
+            pod = f'namespace="{NAMESPACE}",pod="{node}-pod-{p}"'
+            pods.append((pod, 0.01 * self.containers_per_pod, 16 * 2**20 * self.containers_per_pod))
+            for c in range(self.containers_per_pod):
+                containers.append((f'container="c{c}",{pod}', 0.01, 16 * 2**20))
+
+        lines = ["# TYPE container_cpu_usage_seconds_total counter"]
+        lines += [f"container_cpu_usage_seconds_total{{{labels}}} {cores * uptime:.6f} {timestamp}"
+                  for labels, cores, _ in containers]
+        lines.append("# TYPE container_memory_working_set_bytes gauge")
+        lines += [f"container_memory_working_set_bytes{{{labels}}} {memory} {timestamp}"
+                  for labels, _, memory in containers]
+        lines.append("# TYPE container_start_time_seconds gauge")
+        lines += [f"container_start_time_seconds{{{labels}}} {self.started:.3f} {timestamp}"
+                  for labels, _, _ in containers]
+        lines.append("# TYPE node_cpu_usage_seconds_total counter")
+        lines.append(f"node_cpu_usage_seconds_total {0.1 + 0.01 * len(containers) * uptime:.6f} {timestamp}")
+        lines.append("# TYPE node_memory_working_set_bytes gauge")
+        lines.append(f"node_memory_working_set_bytes {2**30 + 16 * 2**20 * len(containers)} {timestamp}")
+        lines.append("# TYPE pod_cpu_usage_seconds_total counter")
+        lines += [f"pod_cpu_usage_seconds_total{{{labels}}} {cores * uptime:.6f} {timestamp}" for labels, cores, _ in pods]
+        lines.append("# TYPE pod_memory_working_set_bytes gauge")
+        lines += [f"pod_memory_working_set_bytes{{{labels}}} {memory} {timestamp}" for labels, _, memory in pods]
+        lines.append("# TYPE scrape_error gauge")
+        lines.append("scrape_error 0")
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, index: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                path = request.split(b" ", 2)[1].decode() if request.count(b" ") >= 2 else "/"
+                self.requests += 1
+                if self.latency_ms:
+                    await asyncio.sleep(self.latency_ms / 1000)
+                if path.startswith("/metrics/resource"):
+                    status, body = "200 OK", self.render(index)
+                elif path.startswith("/healthz"):
+                    status, body = "200 OK", "ok"
+                else:
+                    status, body = "404 Not Found", "not found\n"
+                payload = body.encode()
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                             f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "0.0.0.0", ready: Optional[asyncio.Event] = None,
+                    stop: Optional[asyncio.Event] = None) -> None:
+        """Listen on one TLS port per node until ``stop`` is set (or forever)."""
+        try:
+            import resource
+            soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+            # One listener per node plus metrics-server's connections to each
+            wanted = min(hard, max(soft, self.nodes * 3 + 256))
+            resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+        except (ImportError, ValueError, OSError):
+            pass
+
+        cert_file, key_file = get_certificate()
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert_file, key_file)
+
+        servers = []
+        for index in range(self.nodes):
+            handler = (lambda i: lambda r, w: self._handle(i, r, w))(index)
+            servers.append(await asyncio.start_server(handler, host, self.base_port + index, ssl=context))
+        if ready:
+            ready.set()
+        try:
+            await (stop.wait() if stop else asyncio.Event().wait())
+        finally:
+            for server in servers:
+                server.close()
+
+    def get_node_manifests(self, address: str) -> List[Dict[str, Any]]:
+        """Get the Node objects that point metrics-server at the simulated kubelets."""
+        manifests = []
+        for index in range(self.nodes):
+            name = self.get_node_name(index)
+            manifests.append({
+                "apiVersion": "v1",
+                "kind": "Node",
+                "metadata": {"name": name, "labels": {"kubernetes.io/hostname": name, "kubernetes.io/os": "linux",
+                                                      SIMULATED_TAINT: "true"}},
+                "spec": {"taints": [{"key": SIMULATED_TAINT, "value": "true", "effect": "NoSchedule"}]},
+                "status": {
+                    "addresses": [{"type": "InternalIP", "address": address}, {"type": "Hostname", "address": name}],
+                    "daemonEndpoints": {"kubeletEndpoint": {"Port": self.base_port + index}},
+                    "capacity": {"cpu": "4", "memory": "16Gi", "pods": "110"},
+                    "allocatable": {"cpu": "4", "memory": "16Gi", "pods": "110"},
+                    "conditions": [{"type": "Ready", "status": "True", "reason": "KubeletReady",
+                                    "message": "simulated"}],
+                },
+            })
+        return manifests
+
+    def register(self, kubeconfig: str, address: str) -> None:
+        """Create the simulated Node objects in the cluster of a kubeconfig."""
+        from kubernetes import client, config as k8s_config
+        import yaml
+
+        core = client.CoreV1Api(k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig)))
+        existing = {node.metadata.name for node in core.list_node(label_selector=SIMULATED_TAINT).items}
+        for manifest in self.get_node_manifests(address):
+            if manifest["metadata"]["name"] not in existing:
+                core.create_node(manifest)
+
+    def unregister(self, kubeconfig: str) -> None:
+        """Delete every simulated Node object."""
+        from kubernetes import client, config as k8s_config
+        import yaml
+
+        core = client.CoreV1Api(k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig)))
+        core.delete_collection_node(label_selector=SIMULATED_TAINT)
+
+
+def main():
+    """Serve simulated kubelets from the command line."""
+    parser = argparse.ArgumentParser(description="Simulated kubelet /metrics/resource endpoints")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Serve the simulated kubelets")
+    serve_parser.add_argument("--nodes", type=int, required=True)
+    serve_parser.add_argument("--pods-per-node", type=int, default=30)
+    serve_parser.add_argument("--containers-per-pod", type=int, default=2)
+    serve_parser.add_argument("--base-port", type=int, default=20000)
+    serve_parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response")
+    serve_parser.add_argument("--kubeconfig", help="Register the simulated Nodes in this cluster while serving")
+    serve_parser.add_argument("--address", help="Address the Nodes advertise (required with --kubeconfig)")
+    args = parser.parse_args()
+
+    simulator = KubeletSimulator(args.nodes, args.pods_per_node, args.containers_per_pod,
+                                 args.base_port, args.latency_ms)
+    kubeconfig = None
+    try:
+        if args.kubeconfig:
+            if not args.address:
+                parser.error("--address is required with --kubeconfig")
+            with open(args.kubeconfig, "r") as f:
+                kubeconfig = f.read()
+            simulator.register(kubeconfig, args.address)
+        print(f"Serving {args.nodes} kubelets on ports {args.base_port}-{args.base_port + args.nodes - 1}",
+              file=sys.stderr)
+        asyncio.run(simulator.serve())
+    except KeyboardInterrupt:
+        pass
+    except (RuntimeError, OSError) as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if kubeconfig:
+            simulator.unregister(kubeconfig)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+In-process readiness checks for Kubernetes clusters.
+
+``NodeReadiness`` replaces ``kubectl wait --for=condition=Ready nodes --all``.
+It watches Node objects through the API using the cluster's own kubeconfig
+rather than the current context, backs off exponentially while the API server
+comes up, and reports how long each node took to become Ready.
+
+``MetricsApiReadiness`` gates on the resource metrics API actually serving:
+the ``v1beta1.metrics.k8s.io`` APIService must report Available and a
+``nodes`` metrics query must return data, which a Ready metrics-server pod
+alone does not guarantee. It reports the time to the first metrics.
+
+The waits run at apply time as ``python -m utilities readiness nodes`` or
+``readiness metrics`` with the kubeconfig on stdin and print a JSON report on
+stdout.
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import pulumi
+import pulumi_command as command
+import yaml
+
+from .common_utilities import CommonUtilities
+
+
+def parse_duration(value: str) -> float:
+    """Parse a duration such as ``300s``, ``5m`` or ``1h`` into seconds."""
+    value = str(value).strip()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def _node_ready_seconds(node) -> Optional[float]:
+    """Get seconds from node creation to its Ready condition, or None if not Ready."""
+    for condition in (node.status and node.status.conditions) or []:
+        if condition.type == "Ready" and condition.status == "True":
+            delta = condition.last_transition_time - node.metadata.creation_timestamp
+            return max(delta.total_seconds(), 0.0)
+    return None
+
+
+def _is_ready(node, since: Optional[datetime] = None) -> bool:
+    """Check a node's Ready condition, optionally requiring a heartbeat after ``since``."""
+    for condition in (node.status and node.status.conditions) or []:
+        if condition.type == "Ready" and condition.status == "True":
+            return since is None or (condition.last_heartbeat_time is not None and condition.last_heartbeat_time >= since)
+    return False
+
+
+def _all_ready(nodes: Dict[str, Any], expected_nodes: int, since: Optional[datetime] = None) -> bool:
+    if not nodes or len(nodes) < expected_nodes:
+        return False
+    return all(_is_ready(node, since) for node in nodes.values())
+
+
+def wait_for_nodes_ready(
+    kubeconfig: str,
+    timeout: float = 300,
+    expected_nodes: int = 1,
+    initial_backoff: float = 1.0,
+    max_backoff: float = 15.0,
+    since: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Wait until at least ``expected_nodes`` nodes exist and all are Ready.
+
+    Pass ``since`` for clusters restarted from existing state, whose stored
+    Ready conditions are stale until each kubelet reports in again.
+
+    Returns a report with per-node time-to-ready (seconds from node creation
+    to its Ready transition) and the total time spent waiting.
+    """
+    from kubernetes import client, config as k8s_config, watch
+    from kubernetes.client.rest import ApiException
+    from urllib3.exceptions import HTTPError
+
+    api_client = k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig))
+    core = client.CoreV1Api(api_client)
+
+    start = time.monotonic()
+    deadline = start + timeout
+    backoff = initial_backoff
+    nodes: Dict[str, Any] = {}
+
+    while not _all_ready(nodes, expected_nodes, since):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            pending = sorted(n for n, node in nodes.items() if not _is_ready(node, since))
+            raise TimeoutError(
+                f"Timed out after {timeout:.0f}s waiting for {expected_nodes} Ready node(s); "
+                f"seen {len(nodes)}, not ready: {', '.join(pending) or 'none'}"
+            )
+
+        try:
+            node_list = core.list_node(_request_timeout=min(remaining, 30))
+            nodes = {node.metadata.name: node for node in node_list.items}
+            backoff = initial_backoff
+            if _all_ready(nodes, expected_nodes, since):
+                break
+
+            stream = watch.Watch()
+            for event in stream.stream(
+                core.list_node,
+                resource_version=node_list.metadata.resource_version,
+                timeout_seconds=max(1, int(deadline - time.monotonic())),
+            ):
+                node = event["object"]
+                if event["type"] == "DELETED":
+                    nodes.pop(node.metadata.name, None)
+                else:
+                    nodes[node.metadata.name] = node
+                if _all_ready(nodes, expected_nodes, since):
+                    stream.stop()
+            continue
+        except ApiException as e:
+            # 410 Gone means our resource version expired; relist right away
+            if e.status == 410:
+                continue
+            if e.status and e.status < 500 and e.status not in (401, 403, 429):
+                raise
+            print(f"API server not ready ({e.status} {e.reason}), retrying in {backoff:.0f}s", file=sys.stderr)
+        except (HTTPError, OSError) as e:
+            print(f"API server unreachable ({e.__class__.__name__}), retrying in {backoff:.0f}s", file=sys.stderr)
+
+        time.sleep(min(backoff, max(deadline - time.monotonic(), 0)))
+        backoff = min(backoff * 2, max_backoff)
+
+    return {
+        "nodes": {name: round(_node_ready_seconds(node), 3) for name, node in sorted(nodes.items())},
+        "wait_seconds": round(time.monotonic() - start, 3),
+    }
+
+
+def _api_service_available(api_service) -> bool:
+    for condition in (api_service.status and api_service.status.conditions) or []:
+        if condition.type == "Available":
+            return condition.status == "True"
+    return False
+
+
+def wait_for_metrics_api(
+    kubeconfig: str,
+    timeout: float = 300,
+    min_nodes: int = 1,
+    api_service: str = "v1beta1.metrics.k8s.io",
+    initial_backoff: float = 1.0,
+    max_backoff: float = 15.0,
+) -> Dict[str, Any]:
+    """Wait until the metrics API is Available and serves metrics for ``min_nodes`` nodes.
+
+    Returns when the APIService became Available and when the first complete
+    node metrics arrived, in seconds since the wait started.
+    """
+    from kubernetes import client, config as k8s_config
+    from kubernetes.client.rest import ApiException
+    from urllib3.exceptions import HTTPError
+
+    api_client = k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig))
+    registration = client.ApiregistrationV1Api(api_client)
+    custom = client.CustomObjectsApi(api_client)
+    version, _, group = api_service.partition(".")
+
+    start = time.monotonic()
+    deadline = start + timeout
+    backoff = initial_backoff
+    available_seconds = None
+    status = "APIService not found"
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Timed out after {timeout:.0f}s waiting for the metrics API: {status}")
+
+        try:
+            if available_seconds is None:
+                if _api_service_available(registration.read_api_service(api_service, _request_timeout=min(remaining, 30))):
+                    available_seconds = time.monotonic() - start
+                else:
+                    status = f"{api_service} not Available"
+            if available_seconds is not None:
+                metrics = custom.list_cluster_custom_object(group, version, "nodes", _request_timeout=min(remaining, 30))
+                reporting = [item for item in metrics.get("items", []) if item.get("usage")]
+                if len(reporting) >= min_nodes:
+                    return {
+                        "api_available_seconds": round(available_seconds, 3),
+                        "time_to_first_metrics_seconds": round(time.monotonic() - start, 3),
+                        "nodes_with_metrics": len(reporting),
+                    }
+                status = f"metrics for {len(reporting)}/{min_nodes} node(s)"
+        except ApiException as e:
+            # 404 until the APIService exists, 503 while the aggregated API is not serving
+            if e.status and e.status < 500 and e.status not in (401, 403, 404, 429):
+                raise
+            status = f"{e.status} {e.reason}"
+        except (HTTPError, OSError) as e:
+            status = f"API server unreachable ({e.__class__.__name__})"
+
+        print(f"Metrics API not ready ({status}), retrying in {backoff:.0f}s", file=sys.stderr)
+        time.sleep(min(backoff, max(deadline - time.monotonic(), 0)))
+        backoff = min(backoff * 2, max_backoff)
+
+
+class NodeReadiness(pulumi.ComponentResource):
+    """Wait for every node of a cluster to become Ready.
+
+    ``node_ready_seconds`` maps node names to their time-to-ready and
+    ``wait_seconds`` is how long the wait itself took; export them from the
+    stack to track bootstrap latency.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kubeconfig: pulumi.Input[str],
+        expected_nodes: int = 1,
+        timeout: str = "300s",
+        opts: Optional[pulumi.ResourceOptions] = None,
+    ):
+        super().__init__("utilities:readiness:NodeReadiness", name, {}, opts)
+
+        self.command = command.local.Command(
+            f"{name}-wait",
+            create=CommonUtilities.get_utility_command(
+                "readiness", "nodes",
+                "--expected-nodes", str(expected_nodes),
+                "--timeout", str(timeout),
+            ),
+            dir=CommonUtilities.get_pulumi_root(),
+            stdin=kubeconfig,
+            opts=pulumi.ResourceOptions(parent=self)
+        )
+
+        report = self.command.stdout.apply(json.loads)
+        self.node_ready_seconds = report.apply(lambda r: r["nodes"])
+        self.wait_seconds = report.apply(lambda r: r["wait_seconds"])
+
+        self.register_outputs({
+            "node_ready_seconds": self.node_ready_seconds,
+            "wait_seconds": self.wait_seconds,
+        })
+
+
+class MetricsApiReadiness(pulumi.ComponentResource):
+    """Wait for the resource metrics API to serve metrics for the cluster's nodes.
+
+    Make HPA and dashboard resources depend on this instead of sleeping.
+    ``time_to_first_metrics`` is seconds from the start of the wait to the
+    first complete node metrics; ``is_ready`` is True once the wait passed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kubeconfig: pulumi.Input[str],
+        min_nodes: int = 1,
+        timeout: str = "300s",
+        opts: Optional[pulumi.ResourceOptions] = None,
+    ):
+        super().__init__("utilities:readiness:MetricsApiReadiness", name, {}, opts)
+
+        self.command = command.local.Command(
+            f"{name}-wait",
+            create=CommonUtilities.get_utility_command(
+                "readiness", "metrics",
+                "--min-nodes", str(min_nodes),
+                "--timeout", str(timeout),
+            ),
+            dir=CommonUtilities.get_pulumi_root(),
+            stdin=kubeconfig,
+            opts=pulumi.ResourceOptions(parent=self)
+        )
+
+        report = self.command.stdout.apply(json.loads)
+        self.api_available_seconds = report.apply(lambda r: r["api_available_seconds"])
+        self.time_to_first_metrics = report.apply(lambda r: r["time_to_first_metrics_seconds"])
+        self.is_ready = report.apply(lambda r: r["nodes_with_metrics"] >= min_nodes)
+
+        self.register_outputs({
+            "api_available_seconds": self.api_available_seconds,
+            "time_to_first_metrics": self.time_to_first_metrics,
+        })
+
+
+def main():
+    """Run a readiness check with the kubeconfig read from stdin."""
+    parser = argparse.ArgumentParser(description="Cluster readiness checks")
+    subparsers = parser.add_subparsers(dest="check", required=True)
+    nodes_parser = subparsers.add_parser("nodes", help="Wait for all nodes to be Ready")
+    nodes_parser.add_argument("--expected-nodes", type=int, default=1)
+    nodes_parser.add_argument("--timeout", default="300s")
+    metrics_parser = subparsers.add_parser("metrics", help="Wait for the metrics API to serve node metrics")
+    metrics_parser.add_argument("--min-nodes", type=int, default=1)
+    metrics_parser.add_argument("--timeout", default="300s")
+    args = parser.parse_args()
+
+    kubeconfig = sys.stdin.read()
+    try:
+        if args.check == "nodes":
+            report = wait_for_nodes_ready(kubeconfig, parse_duration(args.timeout), args.expected_nodes)
+        else:
+            report = wait_for_metrics_api(kubeconfig, parse_duration(args.timeout), args.min_nodes)
+    except TimeoutError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    if args.check == "nodes":
+        for node, seconds in report["nodes"].items():
+            print(f"{node} Ready after {seconds:.1f}s", file=sys.stderr)
+    else:
+        print(f"Metrics for {report['nodes_with_metrics']} node(s) after "
+              f"{report['time_to_first_metrics_seconds']:.1f}s", file=sys.stderr)
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Local pull-through registry mirrors shared by every cluster on a host.
+
+One ``registry:2`` container runs in proxy mode per upstream registry, with its
+storage under the shared cache directory. Cluster nodes reach the mirrors by
+container name: Kind nodes on the ``kind`` network (wired in through a
+containerd config patch) and K3s nodes on their cluster network, which the
+mirrors are connected to (wired in through a ``registries.yaml``). The
+mirrors are also published on loopback ports for use from the host.
+
+An image layer is then pulled from upstream once per host instead of once
+per node per cluster, and once the mirrors are warm, clusters come up
+without reaching the upstream registries at all.
+
+Run it at apply time as ``python -m utilities registry_mirror``:
+
+    ensure [--k3s-registries FILE]   start the mirrors (and write a K3s registries.yaml)
+    status                           show the mirrors
+    stop                             remove the mirror containers, keeping their storage
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, Any, List, Optional
+
+import yaml
+
+from .common_utilities import CommonUtilities
+from .container_runtime import ContainerRuntime
+from .image_cache import ImageCache
+
+
+REGISTRY_IMAGE = "registry:2"
+KIND_NETWORK = "kind"
+MIRROR_LABEL = "io.iac-mono-repo.registry-mirror"
+
+# Upstream registry -> (proxied URL, host port on 127.0.0.1)
+DEFAULT_MIRRORS = {
+    "docker.io": ("https://registry-1.docker.io", 5001),
+    "registry.k8s.io": ("https://registry.k8s.io", 5002),
+    "ghcr.io": ("https://ghcr.io", 5003),
+    "quay.io": ("https://quay.io", 5004),
+}
+
+
+def get_container_name(registry: str) -> str:
+    """Get the mirror container name for an upstream registry."""
+    return f"registry-mirror-{registry.replace('.', '-')}"
+
+
+def get_kind_containerd_patches(registries: Optional[List[str]] = None) -> List[str]:
+    """Get containerd config patches pointing Kind nodes at the mirrors."""
+    patches = []
+    for registry in registries or DEFAULT_MIRRORS:
+        patches.append(
+            f'[plugins."io.containerd.grpc.v1.cri".registry.mirrors."{registry}"]\n'
+            f'  endpoint = ["http://{get_container_name(registry)}:5000"]'
+        )
+    return patches
+
+
+def get_k3s_registries(registries: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Get a K3s ``registries.yaml`` document pointing at the mirrors."""
+    return {
+        "mirrors": {
+            registry: {"endpoint": [f"http://{get_container_name(registry)}:5000"]}
+            for registry in registries or DEFAULT_MIRRORS
+        }
+    }
+
+
+def get_k3s_registries_file() -> str:
+    """Get the path the K3s ``registries.yaml`` is written to."""
+    return os.path.join(CommonUtilities.get_cache_dir("registry-mirror"), "k3s-registries.yaml")
+
+
+class RegistryMirror:
+    def __init__(self, storage_dir: Optional[str] = None, runtime: Optional[ContainerRuntime] = None):
+        self.storage_dir = storage_dir or CommonUtilities.get_cache_dir("registry-mirror")
+        self.runtime = runtime or ContainerRuntime()
+
+    def _state(self, name: str) -> Optional[str]:
+        result = self.runtime.run("inspect", "--format", "{{.State.Status}}", name)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def _ensure_network(self) -> None:
+        # Kind reuses an existing "kind" network, so creating it first is safe
+        if self.runtime.run("network", "inspect", KIND_NETWORK).returncode != 0:
+            self.runtime.run("network", "create", KIND_NETWORK)
+
+    def ensure(self, registries: Optional[List[str]] = None) -> List[str]:
+        """Start any mirror that is not running; returns the mirrors that were started."""
+        registries = list(registries or DEFAULT_MIRRORS)
+        started = []
+        with CommonUtilities.file_lock(os.path.join(self.storage_dir, ".lock")):
+            ImageCache(runtime=self.runtime).ensure_local(REGISTRY_IMAGE)
+            self._ensure_network()
+
+            for registry in registries:
+                name = get_container_name(registry)
+                state = self._state(name)
+                if state == "running":
+                    continue
+                if state is not None:
+                    result = self.runtime.run("start", name)
+                else:
+                    upstream, port = DEFAULT_MIRRORS[registry]
+                    storage = os.path.join(self.storage_dir, registry)
+                    os.makedirs(storage, exist_ok=True)
+                    result = self.runtime.run(
+                        "run", "--detach", "--restart=always", "--name", name,
+                        "--network", KIND_NETWORK, "--publish", f"127.0.0.1:{port}:5000",
+                        "--label", f"{MIRROR_LABEL}={registry}",
+                        "-v", f"{storage}:/var/lib/registry",
+                        "-e", f"REGISTRY_PROXY_REMOTEURL={upstream}",
+                        REGISTRY_IMAGE
+                    )
+                if result.returncode != 0:
+                    raise RuntimeError(f"Failed to start the {registry} mirror: {result.stderr.strip()}")
+                started.append(registry)
+        return started
+
+    def connect(self, network: str, registries: Optional[List[str]] = None) -> None:
+        """Attach the mirrors to another network so its containers can reach them by name."""
+        for registry in registries or DEFAULT_MIRRORS:
+            result = self.runtime.run("network", "connect", network, get_container_name(registry))
+            if result.returncode != 0 and "already exists" not in result.stderr:
+                raise RuntimeError(f"Failed to connect the {registry} mirror to {network}: {result.stderr.strip()}")
+
+    def write_k3s_registries(self, path: str, registries: Optional[List[str]] = None) -> None:
+        """Write a K3s ``registries.yaml`` pointing at the mirrors."""
+        tmp_file = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            yaml.safe_dump(get_k3s_registries(registries), f, default_flow_style=False)
+        os.replace(tmp_file, path)
+
+    def status(self) -> List[Dict[str, str]]:
+        """Get the mirror containers and their state."""
+        result = self.runtime.run("ps", "-a", "--filter", f"label={MIRROR_LABEL}",
+                                  "--format", "{{.Names}}\t{{.Status}}")
+        mirrors = []
+        for line in result.stdout.splitlines():
+            name, _, status = line.partition("\t")
+            mirrors.append({"name": name, "status": status})
+        return mirrors
+
+    def stop(self) -> None:
+        """Remove the mirror containers; their storage is kept for the next start."""
+        self.runtime.delete_many([mirror["name"] for mirror in self.status()])
+
+
+def main():
+    """Manage the registry mirrors from the command line."""
+    parser = argparse.ArgumentParser(description="Local pull-through registry mirrors")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    ensure_parser = subparsers.add_parser("ensure", help="Start the mirrors")
+    ensure_parser.add_argument("--k3s-registries", help="Also write a K3s registries.yaml to this path")
+    subparsers.add_parser("status", help="Show the mirrors")
+    subparsers.add_parser("stop", help="Remove the mirror containers")
+    args = parser.parse_args()
+
+    mirror = RegistryMirror()
+    try:
+        if args.action == "ensure":
+            for registry in mirror.ensure():
+                print(f"Started the {registry} mirror", file=sys.stderr)
+            if args.k3s_registries:
+                mirror.write_k3s_registries(args.k3s_registries)
+        elif args.action == "stop":
+            mirror.stop()
+        else:
+            for entry in mirror.status():
+                print(f"{entry['name']}\t{entry['status']}")
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Node-count-aware container sizing for cluster addons.
+
+Addons such as metrics-server do work per node, so a fixed request that fits
+a three-node cluster gets the pod OOMKilled or CPU-starved at fifty nodes.
+Like the Kubernetes addon-resizer ("pod nanny"), a sizing policy computes
+requests as a base plus an increment per node. Memory limits equal memory
+requests; CPU gets no limit, since CPU throttling shows up as scrape lag.
+"""
+
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .common_utilities import CommonUtilities
+
+
+def parse_cpu(value: str) -> float:
+    """Parse a CPU quantity such as ``500m``, ``0.5m`` or ``1`` into millicores."""
+    value = str(value).strip()
+    if value.endswith("m"):
+        return float(value[:-1])
+    return float(value) * 1000
+
+
+@dataclass
+class ResourceSizingPolicy:
+    base_cpu: Optional[str] = "40m"
+    cpu_per_node: Optional[str] = "0.5m"
+    base_memory: Optional[str] = "40Mi"
+    memory_per_node: Optional[str] = "4Mi"
+
+    def get_resources(self, node_count: int) -> Dict[str, Dict[str, str]]:
+        """Get container ``requests`` and ``limits`` for a cluster of ``node_count`` nodes."""
+        node_count = max(node_count or 1, 1)
+        cpu = parse_cpu(self.base_cpu or "0") + parse_cpu(self.cpu_per_node or "0") * node_count
+        memory = (CommonUtilities.parse_memory(self.base_memory or "0")
+                  + CommonUtilities.parse_memory(self.memory_per_node or "0") * node_count)
+        memory_mi = f"{math.ceil(memory / 2**20)}Mi"
+        return {
+            "requests": {"cpu": f"{math.ceil(cpu)}m", "memory": memory_mi},
+            "limits": {"memory": memory_mi},
+        }
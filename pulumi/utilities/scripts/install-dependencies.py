@@ -72,6 +72,7 @@ def main():
     packages = [
         "packages/kind-cluster",
         "packages/grafana-helm", 
+        "packages/prometheus-helm",
         "packages/metrics-server-helm",
         "utilities"
     ]
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark K3s boot time with airgap image tarballs against pulling images
+Usage: python k3s-airgap-benchmark.py [--environment ENV] [--iterations N] [--output FILE]
+
+Each iteration boots the cluster from the given environment config twice,
+once pulling system images from their registries and once importing them from
+the airgap directory, and times each boot until every node is Ready and every
+kube-system pod is Running and Ready. Node volumes are deleted after every
+boot, so each pull-based boot pulls its images from scratch.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+# Add the k3s-cluster package and the pulumi directory to the Python path
+pulumi_dir = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, pulumi_dir)
+sys.path.insert(0, os.path.join(pulumi_dir, 'packages', 'k3s-cluster'))
+
+import yaml
+from k3s_cluster import K3sCluster, K3sClusterConfig
+from utilities.k3s_airgap import K3sAirgap
+from utilities.k3s_nodes import K3sNodes
+from utilities.readiness import wait_for_nodes_ready
+
+
+def wait_for_system_pods(kubeconfig: str, timeout: float) -> None:
+    """Wait until every kube-system pod is Running with all containers ready (or Succeeded)."""
+    from kubernetes import client, config as k8s_config
+
+    core = client.CoreV1Api(k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig)))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pods = core.list_namespaced_pod("kube-system").items
+        if pods and all(
+            pod.status.phase == "Succeeded"
+            or (pod.status.phase == "Running" and all(c.ready for c in pod.status.container_statuses or []))
+            for pod in pods
+        ):
+            return
+        time.sleep(1)
+    raise TimeoutError(f"kube-system pods not ready within {timeout:.0f}s")
+
+
+def boot(nodes: K3sNodes, config: K3sClusterConfig, timeout: float) -> float:
+    """Create the cluster and return seconds until nodes and system pods are ready."""
+    spec = K3sCluster.build_k3s_config(config)["spec"]
+    spec["name"] = config.cluster_name
+    start = time.monotonic()
+    try:
+        nodes.create(spec)
+        kubeconfig = nodes.get_kubeconfig(config.cluster_name, timeout)
+        wait_for_nodes_ready(kubeconfig, timeout, expected_nodes=len(spec["nodes"]))
+        wait_for_system_pods(kubeconfig, max(timeout - (time.monotonic() - start), 1))
+        return time.monotonic() - start
+    finally:
+        nodes.delete(config.cluster_name)
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "mean": round(statistics.mean(samples), 2),
+        "min": round(min(samples), 2),
+        "max": round(max(samples), 2),
+        "samples": [round(s, 2) for s in samples],
+    }
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Benchmark K3s airgap boot against pulling images")
+    parser.add_argument("--environment", default="nonprod", help="k3s-cluster config to boot")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    base = K3sClusterConfig.from_environment(args.environment)
+    base = dataclasses.replace(base, cluster_name="k3s-airgap-bench", port_mappings=None,
+                               extra_port_mappings=None, registry_mirror=False)
+    pulled = dataclasses.replace(base, airgap=False)
+    airgapped = dataclasses.replace(base, airgap=True)
+
+    K3sAirgap().prepare(base.kubernetes_version, base.airgap_images, K3sCluster.get_node_image(base))
+    nodes = K3sNodes()
+
+    results = {"pull": [], "airgap": []}
+    for i in range(args.iterations):
+        for label, config in (("pull", pulled), ("airgap", airgapped)):
+            results[label].append(boot(nodes, config, args.timeout))
+            print(f"[{i + 1}/{args.iterations}] {label:<7} {results[label][-1]:.1f}s", flush=True)
+
+    summary = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "nodes": len(K3sCluster.build_k3s_config(base)["spec"].get("nodes", [])),
+        "pull_seconds": summarize(results["pull"]),
+        "airgap_seconds": summarize(results["airgap"]),
+        "speedup": round(statistics.mean(results["pull"]) / statistics.mean(results["airgap"]), 2),
+    }
+
+    print(f"\n{'':<8}{'MEAN':>8}{'MIN':>8}{'MAX':>8}")
+    for label in ("pull", "airgap"):
+        r = summary[f"{label}_seconds"]
+        print(f"{label:<8}{r['mean']:>7.1f}s{r['min']:>7.1f}s{r['max']:>7.1f}s")
+    print(f"\nairgap boot is {summary['speedup']}x faster than pulling")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
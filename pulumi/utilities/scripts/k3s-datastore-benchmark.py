@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark K3s API latency per datastore backend
+Usage: python k3s-datastore-benchmark.py [--datastores sqlite,etcd,external-etcd,postgres] [--servers N]
+                                         [--workers N] [--duration SECONDS] [--output FILE]
+
+For each backend a cluster is booted from the given environment config, then
+concurrent workers create and list ConfigMaps for a fixed duration while a
+watch measures how long each created object takes to arrive as a watch event.
+Latency p50/p99 per operation is reported per backend, and the cluster is
+deleted again. sqlite only supports one server, so it always runs with one.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Add the k3s-cluster package and the pulumi directory to the Python path
+pulumi_dir = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, pulumi_dir)
+sys.path.insert(0, os.path.join(pulumi_dir, 'packages', 'k3s-cluster'))
+
+import yaml
+from k3s_cluster import K3sCluster, K3sClusterConfig
+from utilities.k3s_nodes import K3sNodes
+from utilities.readiness import wait_for_nodes_ready
+
+
+NAMESPACE = "default"
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_load(kubeconfig: str, workers: int, duration: float) -> dict:
+    """Run create/list load with a concurrent watch and get latencies in milliseconds."""
+    from kubernetes import client, config as k8s_config, watch
+
+    api_client = k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig))
+    core = client.CoreV1Api(api_client)
+    run_id = uuid.uuid4().hex[:8]
+    label = f"benchmark={run_id}"
+
+    samples = {"create": [], "list": [], "watch": []}
+    created_at = {}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def watcher():
+        w = watch.Watch()
+        for event in w.stream(core.list_namespaced_config_map, NAMESPACE, label_selector=label):
+            if event["type"] == "ADDED":
+                arrived = time.perf_counter()
+                with lock:
+                    started = created_at.pop(event["object"].metadata.name, None)
+                    if started is not None:
+                        samples["watch"].append((arrived - started) * 1000)
+            if stop.is_set():
+                w.stop()
+
+    def worker(worker_id: int):
+        sequence = 0
+        while not stop.is_set():
+            name = f"bench-{run_id}-{worker_id}-{sequence}"
+            sequence += 1
+            body = client.V1ConfigMap(metadata=client.V1ObjectMeta(name=name, labels={"benchmark": run_id}),
+                                      data={"payload": "x" * 512})
+            start = time.perf_counter()
+            with lock:
+                created_at[name] = start
+            core.create_namespaced_config_map(NAMESPACE, body)
+            create_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            core.list_namespaced_config_map(NAMESPACE, label_selector=label, limit=100)
+            list_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                samples["create"].append(create_ms)
+                samples["list"].append(list_ms)
+
+    watch_thread = threading.Thread(target=watcher, daemon=True)
+    watch_thread.start()
+    time.sleep(1)  # Let the watch establish before the first create
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(worker, i) for i in range(workers)]
+        time.sleep(duration)
+        stop.set()
+        for future in futures:
+            future.result()
+    # One more object wakes the watch so it sees the stop flag
+    core.create_namespaced_config_map(NAMESPACE, client.V1ConfigMap(
+        metadata=client.V1ObjectMeta(name=f"bench-{run_id}-stop", labels={"benchmark": run_id})))
+    watch_thread.join(timeout=10)
+    core.delete_collection_namespaced_config_map(NAMESPACE, label_selector=label)
+
+    return {
+        op: {"count": len(values), "p50_ms": round(percentile(values, 50), 1), "p99_ms": round(percentile(values, 99), 1)}
+        for op, values in samples.items() if values
+    }
+
+
+def run_backend(base: K3sClusterConfig, datastore: str, servers: int, workers: int,
+                duration: float, timeout: float) -> dict:
+    """Boot a cluster on one datastore, load it and delete it."""
+    config = dataclasses.replace(base, cluster_name=f"k3s-ds-{datastore}", datastore=datastore,
+                                 nodes=1 if datastore == "sqlite" else servers,
+                                 port_mappings=None, extra_port_mappings=None)
+    spec = K3sCluster.build_k3s_config(config)["spec"]
+    spec["name"] = config.cluster_name
+    nodes = K3sNodes()
+    try:
+        start = time.monotonic()
+        nodes.create(spec)
+        kubeconfig = nodes.get_kubeconfig(config.cluster_name, timeout)
+        wait_for_nodes_ready(kubeconfig, timeout, expected_nodes=len(spec["nodes"]))
+        boot_seconds = time.monotonic() - start
+        return {
+            "datastore": datastore,
+            "servers": config.nodes,
+            "boot_seconds": round(boot_seconds, 1),
+            "latency": run_load(kubeconfig, workers, duration),
+        }
+    finally:
+        nodes.delete(config.cluster_name)
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="K3s datastore API-latency benchmark")
+    parser.add_argument("--environment", default="nonprod", help="k3s-cluster config to start from")
+    parser.add_argument("--datastores", default="sqlite,etcd,external-etcd,postgres")
+    parser.add_argument("--servers", type=int, default=3, help="Servers for backends that support several")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent load workers")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of load per backend")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    base = K3sClusterConfig.from_environment(args.environment)
+    results = []
+    for datastore in args.datastores.split(","):
+        print(f"Benchmarking {datastore}...", flush=True)
+        results.append(run_backend(base, datastore, args.servers, args.workers, args.duration, args.timeout))
+
+    print(f"\n{'DATASTORE':<14}{'SERVERS':>8}{'BOOT':>8}  {'CREATE p50/p99':>16}  {'LIST p50/p99':>16}  {'WATCH p50/p99':>16}")
+    for r in results:
+        cols = []
+        for op in ("create", "list", "watch"):
+            lat = r["latency"].get(op)
+            cols.append(f"{lat['p50_ms']:.0f}/{lat['p99_ms']:.0f}ms" if lat else "-")
+        print(f"{r['datastore']:<14}{r['servers']:>8}{r['boot_seconds']:>7.1f}s  "
+              f"{cols[0]:>16}  {cols[1]:>16}  {cols[2]:>16}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"timestamp": datetime.now(timezone.utc).isoformat(), "workers": args.workers,
+                       "duration_seconds": args.duration, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
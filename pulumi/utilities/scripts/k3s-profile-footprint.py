@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Measure the steady-state footprint of each K3s profile
+Usage: python k3s-profile-footprint.py [--profiles minimal-ci,dev,prod-like] [--settle SECONDS]
+                                       [--samples N] [--output FILE]
+
+For each profile a cluster is booted from the given environment config, left
+to settle once every node is Ready, and then sampled with the container
+runtime's ``stats``: memory (RSS as the runtime accounts it) and CPU per node
+container, averaged over the samples. The table shows the per-cluster totals
+and how many such clusters fit into this host's memory. Each cluster is
+deleted again after it was measured.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+# Add the k3s-cluster package and the pulumi directory to the Python path
+pulumi_dir = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, pulumi_dir)
+sys.path.insert(0, os.path.join(pulumi_dir, 'packages', 'k3s-cluster'))
+
+from k3s_cluster import K3S_PROFILES, K3sCluster, K3sClusterConfig
+from utilities.container_runtime import ContainerRuntime
+from utilities.k3s_nodes import K3sNodes
+from utilities.readiness import wait_for_nodes_ready
+
+
+def host_memory_bytes() -> int:
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+
+def sample_stats(runtime: ContainerRuntime, names: list, samples: int, interval: float) -> dict:
+    """Get mean memory (MiB) and CPU (%) per container over a number of samples."""
+    memory = {name: [] for name in names}
+    cpu = {name: [] for name in names}
+    for i in range(samples):
+        for name, stats in runtime.stats(names).items():
+            if name not in memory:
+                continue
+            memory[name].append(stats["memory_bytes"] / 2**20)
+            cpu[name].append(stats["cpu_percent"])
+        if i < samples - 1:
+            time.sleep(interval)
+    return {
+        name: {"memory_mib": round(statistics.mean(memory[name]), 1), "cpu_percent": round(statistics.mean(cpu[name]), 2)}
+        for name in names if memory[name]
+    }
+
+
+def measure(base: K3sClusterConfig, profile: str, args) -> dict:
+    """Boot a cluster with one profile, let it settle and sample its nodes."""
+    config = dataclasses.replace(base, cluster_name=f"k3s-fp-{profile}", profile=profile,
+                                 port_mappings=None, extra_port_mappings=None)
+    spec = K3sCluster.build_k3s_config(config)["spec"]
+    spec["name"] = config.cluster_name
+    nodes = K3sNodes()
+    try:
+        names = nodes.create(spec)
+        kubeconfig = nodes.get_kubeconfig(config.cluster_name, args.timeout)
+        wait_for_nodes_ready(kubeconfig, args.timeout, expected_nodes=len(spec["nodes"]))
+        time.sleep(args.settle)
+        per_node = sample_stats(nodes.runtime, names, args.samples, args.interval)
+        return {
+            "profile": profile,
+            "nodes": len(names),
+            "limits": K3sCluster.get_node_resources(config),
+            "memory_mib": round(sum(n["memory_mib"] for n in per_node.values()), 1),
+            "cpu_percent": round(sum(n["cpu_percent"] for n in per_node.values()), 2),
+            "per_node": per_node,
+        }
+    finally:
+        nodes.delete(config.cluster_name)
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="K3s profile memory/CPU footprint")
+    parser.add_argument("--environment", default="nonprod", help="k3s-cluster config to start from")
+    parser.add_argument("--profiles", default=",".join(K3S_PROFILES))
+    parser.add_argument("--settle", type=float, default=120, help="Seconds to wait after all nodes are Ready")
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=3, help="Seconds between samples")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    base = K3sClusterConfig.from_environment(args.environment)
+    results = []
+    for profile in args.profiles.split(","):
+        print(f"Measuring {profile}...", flush=True)
+        results.append(measure(base, profile, args))
+
+    host_mib = host_memory_bytes() / 2**20
+    print(f"\n{'PROFILE':<12}{'NODES':>6}{'MEMORY':>12}{'CPU':>9}{'PER HOST':>10}")
+    for r in results:
+        per_host = int(host_mib // r["memory_mib"]) if r["memory_mib"] else 0
+        r["clusters_per_host"] = per_host
+        print(f"{r['profile']:<12}{r['nodes']:>6}{r['memory_mib']:>8.0f} MiB{r['cpu_percent']:>8.1f}%{per_host:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"timestamp": datetime.now(timezone.utc).isoformat(), "environment": args.environment,
+                       "host_memory_mib": round(host_mib), "settle_seconds": args.settle,
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
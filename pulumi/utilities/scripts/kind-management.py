@@ -1,137 +1,355 @@
 #!/usr/bin/env python3
 """
 Kind cluster management script
-Usage: python kind-management.py [create|delete|list] [cluster-name]
+Usage: python kind-management.py [create|delete|list] [cluster-name ...] [--manifest FILE] [--workers N]
+       python kind-management.py list [--details] [--wide]   (both: wide table with an API server column)
 """
 
+import argparse
 import subprocess
 import sys
 import json
-from typing import List, Dict, Any
+import os
+import re
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
 
+# Add the pulumi directory to the Python path for the shared utilities
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
-def run_command(command: str) -> tuple[bool, str, str]:
+from utilities.container_runtime import detect_runtime
+
+
+DEFAULT_WORKERS = 4
+CLUSTER_LABEL = "io.x-k8s.kind.cluster"
+ROLE_LABEL = "io.x-k8s.kind.role"
+
+
+@dataclass
+class ClusterResult:
+    name: str
+    action: str
+    success: bool
+    duration: float
+    stderr: str = ""
+
+
+def run_command(command: str, input: Optional[str] = None) -> tuple[bool, str, str]:
     """Run a command and return (success, stdout, stderr)."""
     try:
         result = subprocess.run(
-            command, 
-            shell=True, 
-            check=True, 
-            capture_output=True, 
-            text=True
+            command,
+            shell=True,
+            check=True,
+            capture_output=True,
+            text=True,
+            input=input
         )
         return True, result.stdout, result.stderr
     except subprocess.CalledProcessError as e:
         return False, e.stdout, e.stderr
 
 
-def list_clusters() -> List[Dict[str, Any]]:
-    """List all Kind clusters."""
+def get_cluster_names() -> List[str]:
+    """Get the names of all Kind clusters."""
     success, stdout, stderr = run_command("kind get clusters")
     if not success:
         print(f"Error listing clusters: {stderr}")
         return []
-    
-    clusters = []
-    for cluster_name in stdout.strip().split('\n'):
-        if cluster_name:
-            # Get cluster info
-            success, info_stdout, info_stderr = run_command(f"kind get kubeconfig --name {cluster_name}")
-            if success:
-                clusters.append({
-                    "name": cluster_name,
-                    "kubeconfig": info_stdout.strip()
-                })
-    
+    # kind prints "No kind clusters found." on stderr and nothing on stdout
+    return [name for name in stdout.strip().split('\n') if name]
+
+
+def get_node_summary() -> Dict[str, Dict[str, Any]]:
+    """Summarize node containers for every Kind cluster with one runtime query.
+
+    Kind labels each node container with its cluster and role, so a single
+    ``ps`` over those labels gives node count, container state and age for
+    all clusters at once.
+    """
+    runtime = detect_runtime().name
+    if runtime == "podman":
+        fields = ['{{index .Labels "%s"}}' % CLUSTER_LABEL, '{{index .Labels "%s"}}' % ROLE_LABEL]
+    else:
+        fields = ['{{.Label "%s"}}' % CLUSTER_LABEL, '{{.Label "%s"}}' % ROLE_LABEL]
+    fields += ["{{.State}}", "{{.RunningFor}}"]
+    command = f"{runtime} ps -a --filter label={CLUSTER_LABEL} --format '{chr(9).join(fields)}'"
+
+    success, stdout, stderr = run_command(command)
+    if not success:
+        print(f"Error querying {runtime} for Kind nodes: {stderr}")
+        return {}
+
+    summary: Dict[str, Dict[str, Any]] = {}
+    for line in stdout.strip().split('\n'):
+        parts = line.split('\t')
+        if len(parts) != 4:
+            continue
+        cluster_name, role, state, age = parts
+        entry = summary.setdefault(cluster_name, {"nodes": 0, "states": {}, "age": ""})
+        entry["nodes"] += 1
+        entry["states"][state] = entry["states"].get(state, 0) + 1
+        if role == "control-plane" and not entry["age"]:
+            entry["age"] = age
+
+    return summary
+
+
+def list_clusters(details: bool = False, wide: bool = False, workers: int = DEFAULT_WORKERS) -> List[Dict[str, Any]]:
+    """List all Kind clusters.
+
+    Only names are fetched by default. ``details`` adds each cluster's
+    kubeconfig, fetched concurrently, and ``wide`` adds node count, container
+    state and age from a single batched container-runtime query.
+    """
+    clusters = [{"name": name} for name in get_cluster_names()]
+    if not clusters:
+        return clusters
+
+    if details:
+        def fetch_kubeconfig(cluster):
+            success, stdout, stderr = run_command(f"kind get kubeconfig --name {cluster['name']}")
+            cluster["kubeconfig"] = stdout.strip() if success else None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(clusters)))) as executor:
+            list(executor.map(fetch_kubeconfig, clusters))
+
+    if wide:
+        summary = get_node_summary()
+        for cluster in clusters:
+            entry = summary.get(cluster["name"], {"nodes": 0, "states": {}, "age": ""})
+            cluster["nodes"] = entry["nodes"]
+            cluster["state"] = ",".join(
+                f"{state}" if count == entry["nodes"] else f"{state}:{count}"
+                for state, count in sorted(entry["states"].items())
+            ) or "unknown"
+            cluster["age"] = entry["age"]
+
     return clusters
 
 
-def create_cluster(name: str, config: Dict[str, Any] = None) -> bool:
+def get_api_server(kubeconfig: Optional[str]) -> Optional[str]:
+    """Get the API server endpoint from a kubeconfig."""
+    for line in (kubeconfig or "").splitlines():
+        line = line.strip()
+        if line.startswith("server:"):
+            return line.split(":", 1)[1].strip()
+    return None
+
+
+def print_clusters(clusters: List[Dict[str, Any]], wide: bool = False) -> None:
+    """Print the cluster listing."""
+    if not wide:
+        print("Available Kind clusters:")
+        for cluster in clusters:
+            suffix = ""
+            if "kubeconfig" in cluster:
+                server = get_api_server(cluster["kubeconfig"])
+                suffix = f" ({server})" if server else " (kubeconfig unavailable)"
+            print(f"  - {cluster['name']}{suffix}")
+        return
+
+    # With --details the API server becomes a column of the wide table
+    details = any("kubeconfig" in c for c in clusters)
+    name_width = max([len("CLUSTER")] + [len(c["name"]) for c in clusters])
+    state_width = max([len("STATE")] + [len(c["state"]) for c in clusters])
+    age_width = max([len("AGE")] + [len(c["age"]) for c in clusters])
+    header = f"{'CLUSTER':<{name_width}}  {'NODES':>5}  {'STATE':<{state_width}}  "
+    print(f"{header}{'AGE':<{age_width}}  API SERVER" if details else f"{header}AGE")
+    for c in clusters:
+        line = f"{c['name']:<{name_width}}  {c['nodes']:>5}  {c['state']:<{state_width}}  "
+        if details:
+            server = get_api_server(c.get("kubeconfig")) or "(kubeconfig unavailable)"
+            print(f"{line}{c['age']:<{age_width}}  {server}")
+        else:
+            print(f"{line}{c['age']}".rstrip())
+
+
+def get_published_ports() -> set:
+    """Get the host ports already published by Kind node containers, running or not."""
+    runtime = detect_runtime().name
+    success, stdout, _ = run_command(f"{runtime} ps -a --filter label={CLUSTER_LABEL} --format '{{{{.Ports}}}}'")
+    if not success:
+        return set()
+    return {int(port) for port in re.findall(r":(\d+)->", stdout)}
+
+
+def _port_free(port: int) -> bool:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("0.0.0.0", port))
+        except OSError:
+            return False
+    return True
+
+
+def allocate_host_ports(count: int, used: set, start: int = 30000) -> List[int]:
+    """Get the first port of ``count`` free host port pairs, from ``start`` on.
+
+    A pair is free when neither port is published by another Kind cluster,
+    claimed earlier in ``used`` or bound on the host; allocated ports are
+    added to ``used``.
+    """
+    ports = []
+    port = start
+    while len(ports) < count:
+        if port + 1 > 65535:
+            raise RuntimeError("No free host ports left for Kind port mappings")
+        if all(p not in used and _port_free(p) for p in (port, port + 1)):
+            ports.append(port)
+            used.update((port, port + 1))
+        port += 2
+    return ports
+
+
+def default_config(name: str, host_port: int = 30000) -> Dict[str, Any]:
+    """Get the default Kind configuration for a cluster.
+
+    NodePorts 30000 and 30001 are published on ``host_port`` and the next
+    port; pick a free pair with ``allocate_host_ports``.
+    """
+    return {
+        "kind": "Cluster",
+        "apiVersion": "kind.x-k8s.io/v1alpha4",
+        "name": name,
+        "nodes": [
+            {
+                "role": "control-plane",
+                "image": "kindest/node:v1.28.0",
+                "extraPortMappings": [
+                    {"containerPort": 30000, "hostPort": host_port, "protocol": "TCP"},
+                    {"containerPort": 30001, "hostPort": host_port + 1, "protocol": "TCP"},
+                ]
+            }
+        ]
+    }
+
+
+def create_cluster(name: str, config: Dict[str, Any] = None) -> ClusterResult:
     """Create a Kind cluster."""
+    start = time.monotonic()
     if config:
-        # Create config file
-        config_file = f"/tmp/kind-config-{name}.yaml"
-        with open(config_file, 'w') as f:
-            json.dump(config, f, indent=2)
-        
-        command = f"kind create cluster --name {name} --config {config_file}"
+        command = f"kind create cluster --name {name} --config -"
+        success, stdout, stderr = run_command(command, input=json.dumps(config, indent=2))
     else:
-        command = f"kind create cluster --name {name}"
-    
-    success, stdout, stderr = run_command(command)
-    if success:
-        print(f"✓ Created cluster: {name}")
-        return True
-    else:
-        print(f"✗ Failed to create cluster: {stderr}")
-        return False
+        success, stdout, stderr = run_command(f"kind create cluster --name {name}")
 
+    return ClusterResult(name, "create", success, time.monotonic() - start, stderr.strip())
 
-def delete_cluster(name: str) -> bool:
+
+def delete_cluster(name: str) -> ClusterResult:
     """Delete a Kind cluster."""
+    start = time.monotonic()
     success, stdout, stderr = run_command(f"kind delete cluster --name {name}")
-    if success:
-        print(f"✓ Deleted cluster: {name}")
-        return True
-    else:
-        print(f"✗ Failed to delete cluster: {stderr}")
-        return False
+    return ClusterResult(name, "delete", success, time.monotonic() - start, stderr.strip())
+
+
+def load_manifest(path: str) -> List[Dict[str, Any]]:
+    """Load cluster entries from a manifest file.
+
+    The manifest is either a JSON list whose items are cluster names or
+    ``{"name": ..., "config": {...}}`` objects, or a plain text file with one
+    cluster name per line (``#`` starts a comment).
+    """
+    with open(path, 'r') as f:
+        content = f.read()
+
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        data = [line.split('#', 1)[0].strip() for line in content.splitlines()]
+        data = [name for name in data if name]
+
+    if not isinstance(data, list):
+        raise ValueError(f"Manifest must be a list of clusters: {path}")
+
+    entries = []
+    for item in data:
+        if isinstance(item, str):
+            entries.append({"name": item, "config": None})
+        elif isinstance(item, dict) and "name" in item:
+            entries.append({"name": item["name"], "config": item.get("config")})
+        else:
+            raise ValueError(f"Invalid manifest entry: {item!r}")
+    return entries
+
+
+def run_batch(action: str, entries: List[Dict[str, Any]], workers: int) -> List[ClusterResult]:
+    """Run create/delete for every entry through a bounded worker pool."""
+    host_ports = {}
+    if action == "create":
+        # Ports already published by any Kind cluster are skipped, not just the ones of this batch
+        defaults = [i for i, entry in enumerate(entries) if not entry["config"]]
+        if defaults:
+            host_ports = dict(zip(defaults, allocate_host_ports(len(defaults), get_published_ports())))
+
+    def run_entry(indexed):
+        index, entry = indexed
+        if action == "create":
+            config = entry["config"] or default_config(entry["name"], host_ports[index])
+            result = create_cluster(entry["name"], config)
+        else:
+            result = delete_cluster(entry["name"])
+        mark = "✓" if result.success else "✗"
+        print(f"{mark} {action} {result.name} ({result.duration:.1f}s)", flush=True)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(entries)))) as executor:
+        return list(executor.map(run_entry, enumerate(entries)))
+
+
+def print_results(results: List[ClusterResult], wall_time: float) -> None:
+    """Print a per-cluster result table."""
+    name_width = max([len("CLUSTER")] + [len(r.name) for r in results])
+    print()
+    print(f"{'CLUSTER':<{name_width}}  {'ACTION':<6}  {'STATUS':<6}  {'TIME':>8}  STDERR")
+    for r in results:
+        status = "ok" if r.success else "failed"
+        stderr = "" if r.success else (r.stderr.splitlines()[-1] if r.stderr else "")
+        print(f"{r.name:<{name_width}}  {r.action:<6}  {status:<6}  {r.duration:>7.1f}s  {stderr}".rstrip())
+
+    failed = sum(1 for r in results if not r.success)
+    print(f"\n{len(results) - failed}/{len(results)} succeeded in {wall_time:.1f}s wall time")
 
 
 def main():
     """Main function."""
-    if len(sys.argv) < 2:
-        print("Usage: python kind-management.py [create|delete|list] [cluster-name]")
-        sys.exit(1)
-    
-    action = sys.argv[1]
-    
-    if action == "list":
-        clusters = list_clusters()
+    parser = argparse.ArgumentParser(description="Kind cluster management script")
+    parser.add_argument("action", choices=["create", "delete", "list"])
+    parser.add_argument("names", nargs="*", metavar="cluster-name")
+    parser.add_argument("--manifest", help="File listing clusters to create or delete")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Maximum clusters processed concurrently (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--details", action="store_true",
+                        help="list: also fetch each cluster's kubeconfig")
+    parser.add_argument("--wide", action="store_true",
+                        help="list: show node count, container state and age")
+    args = parser.parse_args()
+
+    if args.action == "list":
+        clusters = list_clusters(details=args.details, wide=args.wide, workers=args.workers)
         if clusters:
-            print("Available Kind clusters:")
-            for cluster in clusters:
-                print(f"  - {cluster['name']}")
+            print_clusters(clusters, wide=args.wide)
         else:
             print("No Kind clusters found")
-    
-    elif action == "create":
-        if len(sys.argv) < 3:
-            print("Usage: python kind-management.py create <cluster-name>")
-            sys.exit(1)
-        
-        cluster_name = sys.argv[2]
-        
-        # Default configuration
-        config = {
-            "kind": "Cluster",
-            "apiVersion": "kind.x-k8s.io/v1alpha4",
-            "name": cluster_name,
-            "nodes": [
-                {
-                    "role": "control-plane",
-                    "image": "kindest/node:v1.28.0",
-                    "extraPortMappings": [
-                        {"containerPort": 30000, "hostPort": 30000, "protocol": "TCP"},
-                        {"containerPort": 30001, "hostPort": 30001, "protocol": "TCP"},
-                    ]
-                }
-            ]
-        }
-        
-        create_cluster(cluster_name, config)
-    
-    elif action == "delete":
-        if len(sys.argv) < 3:
-            print("Usage: python kind-management.py delete <cluster-name>")
-            sys.exit(1)
-        
-        cluster_name = sys.argv[2]
-        delete_cluster(cluster_name)
-    
-    else:
-        print(f"Unknown action: {action}")
-        print("Available actions: create, delete, list")
+        return
+
+    entries = [{"name": name, "config": None} for name in args.names]
+    if args.manifest:
+        entries.extend(load_manifest(args.manifest))
+
+    if not entries:
+        print(f"Usage: python kind-management.py {args.action} <cluster-name> [<cluster-name> ...] [--manifest FILE]")
+        sys.exit(1)
+
+    start = time.monotonic()
+    results = run_batch(args.action, entries, args.workers)
+    print_results(results, time.monotonic() - start)
+
+    if not all(r.success for r in results):
         sys.exit(1)
 
 
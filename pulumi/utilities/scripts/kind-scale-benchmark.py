@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark Kind cluster creation and API latency as the node count grows
+Usage: python kind-scale-benchmark.py [--nodes 5,10,20,35,50] [--control-planes N] [--output FILE]
+
+For each node count a cluster is created from the given environment config
+(its node pools are replaced by one pool of the requested size), timed until
+every node is Ready, probed with a burst of API requests and deleted again.
+The results show where local scale testing stops being realistic: when create
+time or API latency starts climbing faster than the node count.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# Add the kind-cluster package and the pulumi directory to the Python path
+pulumi_dir = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, pulumi_dir)
+sys.path.insert(0, os.path.join(pulumi_dir, 'packages', 'kind-cluster'))
+
+import yaml
+from kind_cluster import KindCluster, KindClusterConfig
+from utilities.readiness import wait_for_nodes_ready
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure_api_latency(kubeconfig: str, requests: int) -> dict:
+    """Time list-nodes, list-pods and /readyz requests, in milliseconds."""
+    from kubernetes import client, config as k8s_config
+
+    api_client = k8s_config.new_client_from_config_dict(yaml.safe_load(kubeconfig))
+    core = client.CoreV1Api(api_client)
+    probes = {
+        "list_nodes": lambda: core.list_node(),
+        "list_pods": lambda: core.list_pod_for_all_namespaces(),
+        "readyz": lambda: api_client.call_api("/readyz", "GET", auth_settings=["BearerToken"],
+                                              _preload_content=False),
+    }
+
+    latency = {}
+    for probe, call in probes.items():
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - start) * 1000)
+        latency[probe] = {"p50_ms": round(percentile(samples, 50), 1), "p99_ms": round(percentile(samples, 99), 1)}
+    return latency
+
+
+def run_size(base: KindClusterConfig, total_nodes: int, control_planes: int, requests: int, timeout: float) -> dict:
+    """Create a cluster with ``total_nodes`` nodes, measure it and delete it."""
+    workers = max(total_nodes - control_planes, 0)
+    pool = dict((base.node_pools or [{"name": "bench"}])[-1], count=workers)
+    config = dataclasses.replace(
+        base,
+        cluster_name=f"scale-bench-{total_nodes}",
+        nodes=control_planes,
+        worker_nodes=0,
+        node_pools=[pool] if workers else [],
+        port_mappings=None,
+        extra_port_mappings=None,
+    )
+    kind_config = KindCluster.build_kind_config(config)
+    name = config.cluster_name
+
+    try:
+        start = time.monotonic()
+        subprocess.run(["kind", "create", "cluster", "--name", name, "--config", "-"],
+                       input=json.dumps(kind_config), text=True, check=True, capture_output=True)
+        create_seconds = time.monotonic() - start
+
+        kubeconfig = subprocess.run(["kind", "get", "kubeconfig", "--name", name],
+                                    capture_output=True, text=True, check=True).stdout
+        report = wait_for_nodes_ready(kubeconfig, timeout, expected_nodes=KindCluster.count_nodes(config))
+        ready_seconds = time.monotonic() - start
+
+        return {
+            "nodes": KindCluster.count_nodes(config),
+            "control_planes": control_planes,
+            "create_seconds": round(create_seconds, 1),
+            "all_ready_seconds": round(ready_seconds, 1),
+            "slowest_node_ready_seconds": max(report["nodes"].values()),
+            "api_latency": measure_api_latency(kubeconfig, requests),
+        }
+    finally:
+        subprocess.run(["kind", "delete", "cluster", "--name", name], capture_output=True)
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Kind scaling benchmark")
+    parser.add_argument("--environment", default="scale", help="kind-cluster config to start from")
+    parser.add_argument("--nodes", default="5,10,20,35,50", help="Comma-separated total node counts")
+    parser.add_argument("--control-planes", type=int, default=None,
+                        help="Control-plane nodes (default: from the config)")
+    parser.add_argument("--requests", type=int, default=50, help="API requests per latency probe")
+    parser.add_argument("--timeout", type=float, default=900, help="Seconds to wait for nodes to be Ready")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    base = KindClusterConfig.from_environment(args.environment)
+    control_planes = args.control_planes or max(base.nodes or 1, 1)
+    sizes = [int(n) for n in args.nodes.split(",")]
+
+    results = []
+    for total_nodes in sizes:
+        print(f"Creating {total_nodes}-node cluster...", flush=True)
+        try:
+            results.append(run_size(base, total_nodes, control_planes, args.requests, args.timeout))
+        except (subprocess.CalledProcessError, TimeoutError) as e:
+            stderr = getattr(e, "stderr", "") or str(e)
+            print(f"✗ {total_nodes} nodes failed: {stderr.strip().splitlines()[-1] if stderr.strip() else e}")
+            results.append({"nodes": total_nodes, "error": str(e)})
+
+    print(f"\n{'NODES':>5}  {'CREATE':>8}  {'READY':>8}  {'NODES p50/p99':>16}  {'PODS p50/p99':>16}  {'READYZ p50/p99':>16}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['nodes']:>5}  failed")
+            continue
+        lat = r["api_latency"]
+        cols = [f"{lat[p]['p50_ms']:.0f}/{lat[p]['p99_ms']:.0f}ms" for p in ("list_nodes", "list_pods", "readyz")]
+        print(f"{r['nodes']:>5}  {r['create_seconds']:>7.1f}s  {r['all_ready_seconds']:>7.1f}s  "
+              f"{cols[0]:>16}  {cols[1]:>16}  {cols[2]:>16}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"timestamp": datetime.now(timezone.utc).isoformat(), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold Kind cluster creation against restoring from a snapshot
+Usage: python kind-snapshot-benchmark.py [--config FILE] [--iterations N] [--output FILE]
+
+Each iteration creates the cluster from scratch and waits for every node to
+be Ready, then deletes it, restores it from the snapshot (taken once after the
+first cold create) and waits again. The snapshot is removed at the end unless
+--keep-snapshot is given.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# Add the pulumi directory to the Python path for the shared utilities
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from utilities.kind_snapshot import KindSnapshot, get_snapshot_key
+from utilities.readiness import wait_for_nodes_ready
+
+
+DEFAULT_CONFIG = {
+    "kind": "Cluster",
+    "apiVersion": "kind.x-k8s.io/v1alpha4",
+    "name": "snapshot-bench",
+    "nodes": [
+        {"role": "control-plane", "image": "kindest/node:v1.28.0"},
+        {"role": "worker", "image": "kindest/node:v1.28.0"},
+    ],
+}
+
+
+def get_kubeconfig(name: str) -> str:
+    return subprocess.run(["kind", "get", "kubeconfig", "--name", name],
+                          capture_output=True, text=True, check=True).stdout
+
+
+def cold_create(kind_config: dict) -> float:
+    """Create the cluster from scratch and return seconds until all nodes are Ready."""
+    start = time.monotonic()
+    subprocess.run(["kind", "create", "cluster", "--name", kind_config["name"], "--config", "-"],
+                   input=json.dumps(kind_config), text=True, check=True, capture_output=True)
+    wait_for_nodes_ready(get_kubeconfig(kind_config["name"]), expected_nodes=len(kind_config["nodes"]))
+    return time.monotonic() - start
+
+
+def restore(snapshots: KindSnapshot, key: str) -> float:
+    """Restore the cluster and return seconds until all nodes report Ready again."""
+    start = time.monotonic()
+    snapshots.restore(key)
+    return time.monotonic() - start
+
+
+def delete(name: str) -> None:
+    subprocess.run(["kind", "delete", "cluster", "--name", name], check=True, capture_output=True)
+
+
+def summarize(samples: list) -> dict:
+    return {
+        "mean": round(statistics.mean(samples), 2),
+        "min": round(min(samples), 2),
+        "max": round(max(samples), 2),
+        "samples": [round(s, 2) for s in samples],
+    }
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="Benchmark cold create against snapshot restore")
+    parser.add_argument("--config", help="Kind config (JSON) to benchmark")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--keep-snapshot", action="store_true")
+    args = parser.parse_args()
+
+    kind_config = DEFAULT_CONFIG
+    if args.config:
+        with open(args.config, 'r') as f:
+            kind_config = json.load(f)
+
+    name = kind_config["name"]
+    key = get_snapshot_key(kind_config)
+    snapshots = KindSnapshot()
+    snapshots.delete(key)
+
+    cold, restored = [], []
+    try:
+        for i in range(args.iterations):
+            cold.append(cold_create(kind_config))
+            print(f"[{i + 1}/{args.iterations}] cold create: {cold[-1]:.1f}s", flush=True)
+            if i == 0:
+                snapshot = snapshots.save(name, key)
+                print(f"snapshot captured in {snapshot['capture_seconds']:.1f}s", flush=True)
+            delete(name)
+
+            restored.append(restore(snapshots, key))
+            print(f"[{i + 1}/{args.iterations}] restore:     {restored[-1]:.1f}s", flush=True)
+            delete(name)
+    finally:
+        subprocess.run(["kind", "delete", "cluster", "--name", name], capture_output=True)
+        if not args.keep_snapshot:
+            snapshots.delete(key)
+
+    results = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "nodes": len(kind_config["nodes"]),
+        "cold_create_seconds": summarize(cold),
+        "restore_seconds": summarize(restored),
+        "speedup": round(statistics.mean(cold) / statistics.mean(restored), 2),
+    }
+
+    print(f"\n{'':<12}{'MEAN':>8}{'MIN':>8}{'MAX':>8}")
+    for label, field in [("cold create", "cold_create_seconds"), ("restore", "restore_seconds")]:
+        r = results[field]
+        print(f"{label:<12}{r['mean']:>7.1f}s{r['min']:>7.1f}s{r['max']:>7.1f}s")
+    print(f"\nrestore is {results['speedup']}x faster than cold create")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Load-test metrics-server sizing against simulated kubelets
+Usage: python metrics-server-load-test.py [--nodes N] [--pods-per-node P] [--resolution 15s]
+                                          [--kubelet-request-timeout 10s] [--duration SECONDS] [--output FILE]
+
+A throwaway single-server K3s cluster (minimal-ci profile) provides the API
+server. The kubelet simulator serves ``/metrics/resource`` for the requested
+number of synthetic nodes and registers them as Node objects. metrics-server
+then runs as a container next to the cluster, with the image, arguments and
+memory limit that ``MetricsServerSimple`` would deploy for that node count.
+
+While it runs, the harness records:
+- the memory of the metrics-server container over time;
+- the duration of metrics-server's scrape cycles and kubelet requests, from its
+  own ``/metrics``;
+- the latency of ``metrics.k8s.io`` node and pod list requests.
+
+The cluster is deleted at the end.
+"""
+
+import argparse
+import asyncio
+import base64
+import dataclasses
+import http.client
+import json
+import os
+import re
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+# Add the package directories and the pulumi directory to the Python path
+pulumi_dir = os.path.join(os.path.dirname(__file__), '..', '..')
+sys.path.insert(0, pulumi_dir)
+sys.path.insert(0, os.path.join(pulumi_dir, 'packages', 'k3s-cluster'))
+sys.path.insert(0, os.path.join(pulumi_dir, 'packages', 'metrics-server-simple'))
+
+import yaml
+from k3s_cluster import K3sCluster, K3sClusterConfig
+from metrics_server_simple import MetricsServerSimple, MetricsServerSimpleConfig
+from utilities import CommonUtilities, ImageCache
+from utilities.container_runtime import ContainerSpec
+from utilities.k3s_nodes import CLUSTER_LABEL, K3sNodes, get_network_name, get_node_name
+from utilities.kubelet_simulator import KubeletSimulator
+
+
+CLUSTER_NAME = "ms-load-test"
+CONFIG_DIR = "/etc/metrics-server"
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def get_gateway(nodes: K3sNodes, network: str) -> str:
+    """Get the host's address on the cluster network, where the simulator listens."""
+    for template in ("{{(index .IPAM.Config 0).Gateway}}", "{{(index .Subnets 0).Gateway}}"):
+        result = nodes.runtime.run("network", "inspect", "--format", template, network)
+        if result.returncode == 0 and result.stdout.strip():
+            return result.stdout.strip()
+    raise RuntimeError(f"Cannot find the gateway of {network}; pass --address")
+
+
+class MetricsServerClient:
+    """Talks to metrics-server directly, authenticated with the cluster admin's client certificate."""
+
+    def __init__(self, kubeconfig: str, address: str, work_dir: str):
+        user = yaml.safe_load(kubeconfig)["users"][0]["user"]
+        cert_file = os.path.join(work_dir, "client.crt")
+        key_file = os.path.join(work_dir, "client.key")
+        with open(cert_file, "wb") as f:
+            f.write(base64.b64decode(user["client-certificate-data"]))
+        with open(key_file, "wb") as f:
+            f.write(base64.b64decode(user["client-key-data"]))
+        self.context = ssl._create_unverified_context()
+        self.context.load_cert_chain(cert_file, key_file)
+        self.host, _, port = address.rpartition(":")
+        self.port = int(port)
+
+    def get(self, path: str) -> tuple:
+        """GET a path; returns (status, body, milliseconds)."""
+        connection = http.client.HTTPSConnection(self.host, self.port, context=self.context, timeout=60)
+        start = time.perf_counter()
+        try:
+            connection.request("GET", path)
+            response = connection.getresponse()
+            body = response.read()
+            return response.status, body, (time.perf_counter() - start) * 1000
+        finally:
+            connection.close()
+
+
+def histogram_mean(metrics: str, name: str) -> float:
+    """Get the mean of a Prometheus histogram across all its label sets, in milliseconds."""
+    sums = [float(v) for v in re.findall(rf"^{name}_sum(?:{{[^}}]*}})? (\S+)", metrics, re.M)]
+    counts = [float(v) for v in re.findall(rf"^{name}_count(?:{{[^}}]*}})? (\S+)", metrics, re.M)]
+    return round(sum(sums) / sum(counts) * 1000, 1) if sum(counts) else 0.0
+
+
+def start_simulator(simulator: KubeletSimulator):
+    """Serve the simulated kubelets from a background event loop; returns a stop function."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    ready, stop = asyncio.Event(), asyncio.Event()
+    future = asyncio.run_coroutine_threadsafe(simulator.serve(ready=ready, stop=stop), loop)
+    while not ready.is_set():
+        if future.done():
+            future.result()
+        time.sleep(0.1)
+
+    def stop_simulator():
+        loop.call_soon_threadsafe(stop.set)
+        future.result(timeout=30)
+        loop.call_soon_threadsafe(loop.stop)
+    return stop_simulator
+
+
+def run_metrics_server(nodes: K3sNodes, config: MetricsServerSimpleConfig, kubeconfig: str, work_dir: str) -> str:
+    """Start metrics-server next to the cluster; returns the container name."""
+    # Inside the cluster network the API server is reached by the first server's name
+    server = get_node_name(CLUSTER_NAME, "server", 0)
+    internal = re.sub(r"https://[^\s]+:\d+", f"https://{server}:6443", kubeconfig)
+    with open(os.path.join(work_dir, "kubeconfig"), "w") as f:
+        f.write(internal)
+    os.chmod(os.path.join(work_dir, "kubeconfig"), 0o644)
+
+    kubeconfig_path = f"{CONFIG_DIR}/kubeconfig"
+    args = MetricsServerSimple._get_container_args(config) + [
+        f"--kubeconfig={kubeconfig_path}",
+        f"--authentication-kubeconfig={kubeconfig_path}",
+        f"--authorization-kubeconfig={kubeconfig_path}",
+    ]
+    memory = CommonUtilities.parse_memory(config.get_resources()["limits"]["memory"])
+    name = f"{CLUSTER_NAME}-metrics-server"
+    ImageCache(runtime=nodes.runtime).ensure_local(config.image)
+    nodes.runtime.create_many([ContainerSpec(
+        name=name,
+        image=config.image,
+        options=["--network", get_network_name(CLUSTER_NAME), "--publish", "127.0.0.1::4443",
+                 "--label", f"{CLUSTER_LABEL}={CLUSTER_NAME}", "-v", f"{work_dir}:{CONFIG_DIR}:ro",
+                 "--memory", str(memory), "--memory-swap", str(memory)],
+        command=args,
+    )])
+    return name
+
+
+def main():
+    """Main function."""
+    parser = argparse.ArgumentParser(description="metrics-server load test against simulated kubelets")
+    parser.add_argument("--environment", default="nonprod", help="k3s-cluster config to start from")
+    parser.add_argument("--nodes", type=int, default=500, help="Simulated nodes")
+    parser.add_argument("--pods-per-node", type=int, default=30)
+    parser.add_argument("--containers-per-pod", type=int, default=2)
+    parser.add_argument("--base-port", type=int, default=20000)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Simulated kubelet response delay")
+    parser.add_argument("--address", help="Address metrics-server reaches this host at (default: network gateway)")
+    parser.add_argument("--resolution", default="15s", help="metric_resolution")
+    parser.add_argument("--kubelet-request-timeout", help="kubelet_request_timeout")
+    parser.add_argument("--size-for", type=int, help="Node count to size metrics-server for (default: --nodes)")
+    parser.add_argument("--duration", type=float, default=180, help="Seconds to sample once metrics flow")
+    parser.add_argument("--interval", type=float, default=15, help="Seconds between samples")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    base = K3sClusterConfig.from_environment(args.environment)
+    cluster_config = dataclasses.replace(base, cluster_name=CLUSTER_NAME, profile="minimal-ci", nodes=1,
+                                         worker_nodes=0, datastore="sqlite", port_mappings=None,
+                                         extra_port_mappings=None)
+    ms_config = MetricsServerSimpleConfig(metric_resolution=args.resolution,
+                                          kubelet_request_timeout=args.kubelet_request_timeout,
+                                          node_count=args.size_for or args.nodes)
+    spec = K3sCluster.build_k3s_config(cluster_config)["spec"]
+    spec["name"] = CLUSTER_NAME
+
+    nodes = K3sNodes()
+    simulator = KubeletSimulator(args.nodes, args.pods_per_node, args.containers_per_pod,
+                                 args.base_port, args.latency_ms)
+    stop_simulator = None
+    try:
+        with tempfile.TemporaryDirectory(prefix="ms-load-test-") as work_dir:
+            os.chmod(work_dir, 0o755)
+            print(f"Booting {CLUSTER_NAME}...", flush=True)
+            nodes.create(spec)
+            kubeconfig = nodes.get_kubeconfig(CLUSTER_NAME, args.timeout)
+
+            print(f"Serving {args.nodes} simulated kubelets...", flush=True)
+            stop_simulator = start_simulator(simulator)
+            simulator.register(kubeconfig, args.address or get_gateway(nodes, get_network_name(CLUSTER_NAME)))
+
+            print("Starting metrics-server...", flush=True)
+            name = run_metrics_server(nodes, ms_config, kubeconfig, work_dir)
+            port = nodes.runtime.run("port", name, "4443/tcp", check=True).stdout.split()[0]
+            client = MetricsServerClient(kubeconfig, port, work_dir)
+
+            # Wait until every simulated node has metrics
+            start = time.monotonic()
+            node_count = 0
+            while node_count < args.nodes:
+                if time.monotonic() - start > args.timeout:
+                    raise TimeoutError(f"Only {node_count}/{args.nodes} nodes had metrics after {args.timeout:.0f}s")
+                try:
+                    status, body, _ = client.get("/apis/metrics.k8s.io/v1beta1/nodes")
+                    if status == 200:
+                        items = json.loads(body)["items"]
+                        node_count = sum(1 for item in items if item["metadata"]["name"].startswith("sim-node"))
+                except (OSError, http.client.HTTPException, ValueError):
+                    pass
+                time.sleep(2)
+            time_to_metrics = time.monotonic() - start
+            print(f"All {args.nodes} nodes have metrics after {time_to_metrics:.1f}s", flush=True)
+
+            memory, latency = [], {"nodes": [], "pods": []}
+            deadline = time.monotonic() + args.duration
+            while True:
+                memory.append(nodes.runtime.stats([name])[name]["memory_bytes"] / 2**20)
+                for resource in latency:
+                    status, _, ms = client.get(f"/apis/metrics.k8s.io/v1beta1/{resource}")
+                    if status == 200:
+                        latency[resource].append(ms)
+                print(f"  memory {memory[-1]:.0f} MiB, nodes list {latency['nodes'][-1] if latency['nodes'] else 0:.0f}ms",
+                      flush=True)
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(args.interval)
+
+            _, metrics, _ = client.get("/metrics")
+            metrics = metrics.decode()
+            container = nodes.runtime.inspect_many([name])[0] or {}
+
+        result = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "nodes": args.nodes,
+            "pods_per_node": args.pods_per_node,
+            "args": MetricsServerSimple._get_container_args(ms_config),
+            "resources": ms_config.get_resources(),
+            "time_to_metrics_seconds": round(time_to_metrics, 1),
+            "memory_mib": {"first": round(memory[0], 1), "peak": round(max(memory), 1), "last": round(memory[-1], 1)},
+            "oom_killed": bool(container.get("State", {}).get("OOMKilled")),
+            "restarts": container.get("RestartCount", 0),
+            "scrape_cycle_ms": histogram_mean(metrics, "metrics_server_manager_tick_duration_seconds"),
+            "kubelet_request_ms": histogram_mean(metrics, "metrics_server_kubelet_request_duration_seconds"),
+            "api_latency_ms": {
+                resource: {"p50": round(percentile(values, 50), 1), "p99": round(percentile(values, 99), 1)}
+                for resource, values in latency.items() if values
+            },
+        }
+    finally:
+        if stop_simulator:
+            stop_simulator()
+        nodes.delete(CLUSTER_NAME)
+
+    limit = result["resources"]["limits"]["memory"]
+    print(f"\nmetrics-server for {args.nodes} nodes x {args.pods_per_node} pods (limit {limit})")
+    print(f"  memory        {result['memory_mib']['first']:.0f} -> {result['memory_mib']['last']:.0f} MiB "
+          f"(peak {result['memory_mib']['peak']:.0f} MiB){'  OOMKilled' if result['oom_killed'] else ''}")
+    print(f"  scrape cycle  {result['scrape_cycle_ms']:.0f}ms mean, kubelet request {result['kubelet_request_ms']:.1f}ms mean")
+    for resource, lat in result["api_latency_ms"].items():
+        print(f"  {resource:<13} p50 {lat['p50']:.0f}ms, p99 {lat['p99']:.0f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,9 @@ setup(
     install_requires=[
         "pulumi>=3.0.0",
         "pulumi-kubernetes>=4.0.0",
+        "pulumi-command>=0.9.0",
+        "pyyaml>=6.0",
+        "kubernetes>=28.1.0",
     ],
     python_requires=">=3.8",
     classifiers=[